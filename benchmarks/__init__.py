@@ -0,0 +1,44 @@
+"""
+In-process benchmarks for the Penfolio API.
+
+Run them from the project root, e.g. ``python -m benchmarks.async_throughput``.
+Each benchmark runs against a throwaway test database, never ``db.sqlite3``.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "penfolio.settings")
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Creates (and afterwards destroys) the test databases, like ``manage.py test``."""
+    setup_django()
+    from django.db import connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.test.runner import DiscoverRunner
+
+    # Use on-disk SQLite files: shared-cache in-memory databases lock whole
+    # tables and can't take concurrent writers from worker threads.
+    tmpdir = tempfile.mkdtemp(prefix="penfolio-bench-")
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        if settings_dict["ENGINE"].endswith("sqlite3") and not settings_dict["TEST"].get("NAME"):
+            settings_dict["TEST"]["NAME"] = os.path.join(tmpdir, f"{alias}.sqlite3")
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    # Like `manage.py test`: system checks import the URLconf, which is what
+    # loads every model module and connects its signals.
+    runner.run_checks(None)
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
@@ -0,0 +1,129 @@
+"""
+Compares concurrent-request throughput of the sync (WSGI) routes under
+``/api/`` with the async (ASGI) routes under ``/api/async/``.
+
+The WSGI side is modelled as ``--workers`` requests in flight at a time, which
+is what a gunicorn deployment with that many sync workers can serve. The ASGI
+side runs every client on one event loop.
+
+Scenarios:
+    list    paginated journal listing (ORM bound)
+    covert  covert listing, one PBKDF2 PIN check per request (CPU bound)
+    upload  accepting an image upload (spool to disk + enqueue); the
+            background pool then pays ``--latency`` seconds of simulated
+            Cloudinary round trip per image
+
+Usage:
+    python -m benchmarks.async_throughput --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from benchmarks import test_database
+
+PIN = "1234"
+
+
+def _seed(journals: int):
+    from django.contrib.auth.models import User
+    from ninja_jwt.tokens import RefreshToken
+
+    from journals_api.models.journals_model import Journal
+
+    user = User.objects.create_user("bench", "bench@example.com", "Bench-pass1!")
+    user.user_profile.set_pin(PIN)
+    Journal.objects.for_owner(user).bulk_create(
+        Journal(owner=user, title=f"Entry {i}", content="lorem ipsum " * 50,
+                mood_tag="COVERT" if i % 5 == 0 else "MERRY")
+        for i in range(journals)
+    )
+    return str(RefreshToken.for_user(user).access_token)
+
+
+def _request_args(scenario: str, prefix: str):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    if scenario == "list":
+        return "get", (f"{prefix}/journals/?page_size=20",), {}
+    if scenario == "covert":
+        return "post", (f"{prefix}/journals/covert",), {
+            "data": {"pin": PIN}, "content_type": "application/json"}
+    return "post", (f"{prefix}/journals/upload-image",), {
+        "data": {"file": SimpleUploadedFile("a.png", b"\x89PNG" + b"0" * 1024, "image/png")}}
+
+
+def _auth(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _fake_upload(latency: float):
+    def upload(file, **kwargs):
+        time.sleep(latency)
+        return {"secure_url": "https://example.invalid/image.png"}
+    return upload
+
+
+def run_wsgi(scenario: str, token: str, requests: int, workers: int) -> float:
+    from django.test import Client
+
+    def one(_):
+        client = Client()
+        method, args, kwargs = _request_args(scenario, "/api")
+        response = getattr(client, method)(*args, headers=_auth(token), **kwargs)
+        assert 200 <= response.status_code < 300, response.content
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(requests)))
+    return time.perf_counter() - start
+
+
+def run_asgi(scenario: str, token: str, requests: int, concurrency: int) -> float:
+    from django.test import AsyncClient
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        client = AsyncClient()
+
+        async def one():
+            async with semaphore:
+                method, args, kwargs = _request_args(scenario, "/api/async")
+                response = await getattr(client, method)(*args, headers=_auth(token), **kwargs)
+                assert 200 <= response.status_code < 300, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent ASGI clients")
+    parser.add_argument("--workers", type=int, default=4, help="WSGI requests in flight (gunicorn workers)")
+    parser.add_argument("--journals", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated upload round trip, seconds")
+    parser.add_argument("--scenario", choices=["list", "covert", "upload"], action="append")
+    options = parser.parse_args()
+
+    with test_database():
+        token = _seed(options.journals)
+        with mock.patch("cloudinary.uploader.upload", _fake_upload(options.latency)):
+            print(f"{'scenario':<8} {'wsgi req/s':>12} {'asgi req/s':>12} {'speedup':>8}")
+            for scenario in options.scenario or ["list", "covert", "upload"]:
+                wsgi = options.requests / run_wsgi(scenario, token, options.requests, options.workers)
+                asgi = options.requests / run_asgi(scenario, token, options.requests, options.concurrency)
+                print(f"{scenario:<8} {wsgi:>12.1f} {asgi:>12.1f} {asgi / wsgi:>7.2f}x")
+
+            # Let background uploads finish before the test database goes away.
+            from journals_api import uploads
+            uploads.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Load benchmark over every journal and auth route, on synthetic data.
+
+Seeds ``--users`` users with ``--journals`` entries each (see
+``journals_api.synthetic``), then drives each route ``--requests`` times in
+two modes:
+
+    serial      one in-process client, one request at a time
+    concurrent  ``--concurrency`` clients on threads, like that many WSGI
+                workers (each with its own database connection)
+
+and reports throughput, p50/p95/p99 latency and failed requests per route.
+Requests rotate over the synthetic users. Cloudinary is stubbed out for
+image uploads.
+
+Results can be saved as a baseline (``--save-baseline``) and are compared
+with it on later runs: a route whose p95 or failure count grows by more than
+``--tolerance`` is flagged and the command exits with status 1.
+A baseline is only compared with runs of the same data set and request
+counts.
+
+Usage:
+    python -m benchmarks.load --requests 50 --concurrency 4
+    python -m benchmarks.load --route list --route search --save-baseline
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from benchmarks import test_database
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "load.json"
+PREFIXES = {"sync": "/api", "async": "/api/async"}
+# p95 changes smaller than this are timer noise, whatever the percentage.
+NOISE_FLOOR_MS = 1.0
+
+
+class Context:
+    """Per-run state shared by the routes: the users, their tokens and journals."""
+
+    def __init__(self, users):
+        from django.db.models import Q
+        from ninja_jwt.tokens import RefreshToken
+
+        from journals_api.models.journals_model import Journal
+
+        self.users = []
+        for user in users:
+            refresh = RefreshToken.for_user(user)
+            journals = Journal.objects.for_owner(user)
+            self.users.append({
+                "user": user,
+                "auth": {"Authorization": f"Bearer {refresh.access_token}"},
+                "journals": list(journals.filter(~Q(mood_tag="COVERT")).values_list("id", flat=True)),
+                "covert": list(journals.filter(mood_tag="COVERT").values_list("id", flat=True)),
+            })
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            return next(self._counter)
+
+    def user(self, n: int):
+        return self.users[n % len(self.users)]
+
+    def fresh_journals(self, user, count: int):
+        """Creates throwaway journals (outside the timed requests) for delete routes."""
+        from journals_api import counters, rollups
+        from journals_api.models.journals_model import Journal
+
+        journals = Journal.objects.for_owner(user).bulk_create(
+            Journal(owner=user, title="Disposable", content="Delete me.", mood_tag="MERRY")
+            for _ in range(count)
+        )
+        counters.rebuild([user.id])
+        rollups.rebuild([user.id])
+        return [journal.id for journal in journals]
+
+
+def _json(data):
+    return {"data": json.dumps(data), "content_type": "application/json"}
+
+
+def _pick(ids, n):
+    return ids[n % len(ids)]
+
+
+# Each route takes (context, request number, user) and returns
+# (method, path, client kwargs, expected status, authenticated).
+def _home(ctx, n, u):
+    return "get", "/", {}, 200, False
+
+
+def _register(ctx, n, u):
+    from journals_api import synthetic
+
+    name = f"load-{os.getpid()}-{n}"
+    body = {"username": name, "email": f"{name}@example.com", "password": synthetic.DEFAULT_PASSWORD}
+    return "post", "/auth/register", _json(body), 200, False
+
+
+def _login(ctx, n, u):
+    from journals_api import synthetic
+
+    body = {"username": u["user"].username, "password": synthetic.DEFAULT_PASSWORD}
+    return "post", "/auth/login", _json(body), 200, False
+
+
+def _token_refresh(ctx, n, u):
+    from ninja_jwt.tokens import RefreshToken
+
+    return "post", "/auth/token/refresh", _json({"refresh": str(RefreshToken.for_user(u["user"]))}), 200, False
+
+
+def _profile(ctx, n, u):
+    return "get", "/auth/profile", {}, 200, True
+
+
+def _set_pin(ctx, n, u):
+    from journals_api import synthetic
+
+    # The same PIN, so the covert routes keep working.
+    return "post", "/auth/profile/set-pin", _json({"pin": synthetic.DEFAULT_PIN}), 200, True
+
+
+def _list(ctx, n, u):
+    return "get", "/journals/?page_size=20", {}, 200, True
+
+
+def _list_cursor(ctx, n, u):
+    return "get", "/journals/?page_size=20&cursor=&view=summary", {}, 200, True
+
+
+def _list_covert(ctx, n, u):
+    return "post", "/journals/covert", _json({"unlock_token": u["unlock_token"]}), 200, True
+
+
+def _covert_unlock(ctx, n, u):
+    from journals_api import synthetic
+
+    return "post", "/journals/covert/unlock", _json({"pin": synthetic.DEFAULT_PIN}), 200, True
+
+
+def _get(ctx, n, u):
+    return "get", f"/journals/{_pick(u['journals'], n)}", {}, 200, True
+
+
+def _reveal(ctx, n, u):
+    journal_id = _pick(u["covert"], n)
+    return "post", f"/journals/{journal_id}/reveal", _json({"unlock_token": u["unlock_token"]}), 200, True
+
+
+def _create(ctx, n, u):
+    body = {"title": f"Load {n}", "content": "Written under load. " * 20, "mood_tag": "MERRY"}
+    return "post", "/journals/", _json(body), 200, True
+
+
+def _update(ctx, n, u):
+    body = {"title": f"Edited {n}", "mood_tag": "GLOOMY" if n % 2 else "MERRY"}
+    return "put", f"/journals/{_pick(u['journals'], n)}", _json(body), 200, True
+
+
+def _delete(ctx, n, u):
+    return "delete", f"/journals/{u['disposable'].pop()}", {}, 204, True
+
+
+def _sync(ctx, n, u):
+    return "get", "/journals/sync?limit=100", {}, 200, True
+
+
+def _export(ctx, n, u):
+    return "post", "/journals/export", _json({"format": "ndjson"}), 200, True
+
+
+def _import(ctx, n, u):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    records = "\n".join(
+        json.dumps({"title": f"Imported {n}.{i}", "content": "From another app.", "mood_tag": "MERRY"})
+        for i in range(10)
+    )
+    return "post", "/journals/import", {"data": {"file": SimpleUploadedFile("a.ndjson", records.encode())}}, 200, True
+
+
+def _heatmap(ctx, n, u):
+    return "get", "/journals/stats/heatmap", {}, 200, True
+
+
+def _moods(ctx, n, u):
+    return "get", "/journals/stats/moods", {}, 200, True
+
+
+def _gaps(ctx, n, u):
+    return "get", "/journals/stats/gaps", {}, 200, True
+
+
+def _bulk_create(ctx, n, u):
+    items = [{"title": f"Bulk {n}.{i}", "content": "Batch entry.", "mood_tag": "MERRY"} for i in range(10)]
+    return "post", "/journals/bulk", _json({"items": items}), 200, True
+
+
+def _bulk_update(ctx, n, u):
+    ids = u["journals"]
+    items = [{"id": _pick(ids, n * 10 + i), "mood_tag": "GLOOMY" if n % 2 else "MERRY"} for i in range(10)]
+    return "put", "/journals/bulk", _json({"items": items}), 200, True
+
+
+def _bulk_delete(ctx, n, u):
+    ids = [u["disposable"].pop() for _ in range(10)]
+    return "delete", "/journals/bulk", _json({"ids": ids}), 200, True
+
+
+def _search(ctx, n, u):
+    from journals_api import synthetic
+
+    return "get", f"/journals/search/?q={_pick(synthetic.WORDS, n)}", {}, 200, True
+
+
+def _upload_image(ctx, n, u):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    image = SimpleUploadedFile("a.png", b"\x89PNG" + n.to_bytes(8, "big") + b"0" * 1024, "image/png")
+    return "post", "/journals/upload-image", {"data": {"file": image}}, 202, True
+
+
+def _upload_stats(ctx, n, u):
+    return "get", "/journals/upload-image/stats", {}, 200, True
+
+
+def _upload_status(ctx, n, u):
+    return "get", f"/journals/upload-image/{u['upload_job']}", {}, 200, True
+
+
+# name -> (route, journals to pre-create per request for delete routes)
+ROUTES = {
+    "home": (_home, 0),
+    "register": (_register, 0),
+    "login": (_login, 0),
+    "token_refresh": (_token_refresh, 0),
+    "profile": (_profile, 0),
+    "set_pin": (_set_pin, 0),
+    "list": (_list, 0),
+    "list_cursor": (_list_cursor, 0),
+    "list_covert": (_list_covert, 0),
+    "covert_unlock": (_covert_unlock, 0),
+    "get": (_get, 0),
+    "reveal": (_reveal, 0),
+    "create": (_create, 0),
+    "update": (_update, 0),
+    "delete": (_delete, 1),
+    "sync": (_sync, 0),
+    "export": (_export, 0),
+    "import": (_import, 0),
+    "heatmap": (_heatmap, 0),
+    "moods": (_moods, 0),
+    "gaps": (_gaps, 0),
+    "bulk_create": (_bulk_create, 0),
+    "bulk_update": (_bulk_update, 0),
+    "bulk_delete": (_bulk_delete, 10),
+    "search": (_search, 0),
+    "upload_image": (_upload_image, 0),
+    "upload_stats": (_upload_stats, 0),
+    "upload_status": (_upload_status, 0),
+}
+
+
+def _prepare(ctx: Context, route: str, requests: int):
+    from journals_api import covert
+    from journals_api.models.upload_model import ImageUploadJob
+    from journals_api.models.user_model import UserProfile
+
+    per_request = ROUTES[route][1]
+    share = math.ceil(requests / len(ctx.users))
+    for u in ctx.users:
+        # set_pin rehashes the PIN, which revokes earlier unlock tokens.
+        u["unlock_token"] = covert.issue_unlock_token(UserProfile.objects.get(user=u["user"]))
+        u["disposable"] = ctx.fresh_journals(u["user"], share * per_request) if per_request else []
+        if route == "upload_status" and "upload_job" not in u:
+            u["upload_job"] = ImageUploadJob.objects.create(owner=u["user"], digest="0" * 64).id
+
+
+def percentile(timings, p: float) -> float:
+    """Nearest-rank percentile of sorted ``timings``."""
+    return timings[max(0, math.ceil(p / 100 * len(timings)) - 1)]
+
+
+def run_route(ctx: Context, route: str, prefix: str, requests: int, concurrency: int, warmup: int = 0):
+    from django.db import connections
+    from django.test import Client
+
+    func = ROUTES[route][0]
+    local = threading.local()
+
+    def one(_):
+        if not hasattr(local, "client"):
+            local.client = Client(raise_request_exception=False)
+        n = ctx.next()
+        u = ctx.user(n)
+        method, path, kwargs, expected, authenticated = func(ctx, n, u)
+        if authenticated:
+            kwargs["headers"] = u["auth"]
+        started = time.perf_counter()
+        response = getattr(local.client, method)(prefix + path, **kwargs)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        error = None
+        if response.status_code != expected:
+            body = b"" if response.streaming else response.content.strip()
+            if response.status_code >= 500 and body:
+                # The last line of a debug traceback names the exception.
+                body = body.splitlines()[-1]
+            error = f"{method.upper()} {path}: {response.status_code} {body[:120].decode(errors='replace')}"
+        return elapsed, error
+
+    def worker(count):
+        try:
+            return [one(i) for i in range(count)]
+        finally:
+            connections.close_all()
+
+    _prepare(ctx, route, requests + warmup)
+    for i in range(warmup):
+        one(i)
+    shares = [len(range(i, requests, concurrency)) for i in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        outcomes = [one(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(itertools.chain.from_iterable(pool.map(worker, shares)))
+    wall = time.perf_counter() - started
+
+    timings = sorted(elapsed for elapsed, _ in outcomes)
+    errors = [error for _, error in outcomes if error]
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput": round(requests / wall, 1),
+        "p50": round(percentile(timings, 50) * 1000, 3),
+        "p95": round(percentile(timings, 95) * 1000, 3),
+        "p99": round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def _environment():
+    from django.db import connection
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": connection.vendor,
+    }
+
+
+def load_baseline(path: Path):
+    try:
+        with open(path) as fileobj:
+            return json.load(fileobj)
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, tolerance: float):
+    """
+    Returns ``{key: p95 change}`` and the keys that regressed: p95 grew beyond
+    ``tolerance`` (and by more than ``NOISE_FLOOR_MS``), or the number of
+    failed requests did.
+    """
+    changes, regressions = {}, []
+    for key, result in results.items():
+        before = baseline["results"].get(key)
+        if not before:
+            continue
+        change = result["p95"] / before["p95"] - 1
+        changes[key] = change
+        slower = change > tolerance and result["p95"] - before["p95"] > NOISE_FLOOR_MS
+        if slower or result["errors"] > before["errors"] * (1 + tolerance):
+            regressions.append(key)
+    return changes, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--journals", type=int, default=200, help="journals per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=50, help="requests per route and mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients in the concurrent mode")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per route and mode")
+    parser.add_argument("--api", choices=sorted(PREFIXES), default="sync")
+    parser.add_argument("--route", choices=sorted(ROUTES), action="append", dest="routes")
+    parser.add_argument("--mode", choices=["serial", "concurrent"], action="append", dest="modes")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth over the baseline")
+    options = parser.parse_args()
+
+    config = {
+        "users": options.users,
+        "journals": options.journals,
+        "seed": options.seed,
+        "requests": options.requests,
+        "concurrency": options.concurrency,
+        "warmup": options.warmup,
+        "api": options.api,
+    }
+    routes = options.routes or list(ROUTES)
+    modes = options.modes or ["serial", "concurrent"]
+
+    with test_database():
+        from journals_api import synthetic, uploads
+
+        users = synthetic.generate(options.users, options.journals, seed=options.seed, prefix="load")["users"]
+        ctx = Context(users)
+        results = {}
+        # Failed requests are counted in the results; don't print their tracebacks.
+        logging.disable(logging.CRITICAL)
+        upload = mock.patch("cloudinary.uploader.upload", return_value={"secure_url": "https://example.invalid/a.png"})
+        with upload:
+            print(f"{'route':<14} {'mode':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+            for route in routes:
+                for mode in modes:
+                    concurrency = options.concurrency if mode == "concurrent" else 1
+                    result = run_route(
+                        ctx, route, PREFIXES[options.api], options.requests, concurrency, options.warmup,
+                    )
+                    results[f"{route}:{mode}"] = result
+                    print(f"{route:<14} {mode:<10} {result['throughput']:>9.1f} {result['p50']:>9.2f} "
+                          f"{result['p95']:>9.2f} {result['p99']:>9.2f} {result['errors']:>7}")
+                    if result["first_error"]:
+                        print(f"  first error: {result['first_error']}")
+            # Let background uploads finish before the test database goes away.
+            uploads.shutdown(wait=True)
+        environment = _environment()
+
+    baseline = load_baseline(options.baseline)
+    regressions = []
+    if options.save_baseline:
+        if baseline and baseline["config"] == config:
+            # Keep routes that weren't run this time.
+            results = {**baseline["results"], **results}
+        options.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(options.baseline, "w") as fileobj:
+            json.dump({"config": config, "environment": environment, "results": results}, fileobj, indent=2)
+            fileobj.write("\n")
+        print(f"\nSaved baseline to {options.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {options.baseline}; run with --save-baseline to create one.")
+    elif baseline["config"] != config:
+        print(f"\nBaseline {options.baseline} was recorded with {baseline['config']}; not comparing.")
+    else:
+        if baseline.get("environment") != environment:
+            print(f"\nNote: the baseline was recorded on {baseline.get('environment')}.")
+        changes, regressions = compare(results, baseline, options.tolerance)
+        print(f"\np95 against the baseline (tolerance {options.tolerance:+.0%}):")
+        for key, change in changes.items():
+            flag = "  REGRESSION" if key in regressions else ""
+            print(f"  {key:<26} {change:+7.1%}{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
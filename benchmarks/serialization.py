@@ -0,0 +1,105 @@
+"""
+Measures how long the list endpoint spends turning one page of journals into
+a response body: schema validation plus rendering, without the database.
+
+    before  model instances with ``is_covert`` set in a loop, rendered by
+            Ninja's JSONRenderer (the previous list path)
+    after   ``.values()`` rows flagged by ``flag_covert_rows``, rendered by
+            ``API_RENDERER`` (ORJSONRenderer by default)
+
+Both run through the real ``list_journals`` operation's response handling.
+
+Usage:
+    python -m benchmarks.serialization --items 100 --repeat 500
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import setup_django
+
+
+def _rows(count: int):
+    from django.utils import timezone
+
+    now = timezone.now()
+    return [
+        {"id": i, "title": f"Entry {i}", "content": "lorem ipsum " * 50,
+         "date_added": now, "mood_tag": "MERRY"}
+        for i in range(count)
+    ]
+
+
+def _list_operation():
+    from penfolio.urls import api
+
+    from journals_api.v1.journal_api import router
+
+    operation = next(op for op in router.path_operations["/"].operations if "GET" in op.methods)
+    operation.api = api
+    return operation
+
+
+def _time_page(operation, renderer, make_items, repeat: int):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from journals_api.v1.utils import create_api_response
+
+    request = RequestFactory().get("/api/journals/")
+    operation.api.renderer = renderer
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = {"items": make_items(), "count": None, "next_cursor": None}
+        operation._result_to_response(request, create_api_response(data), HttpResponse())
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="journals per page")
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.utils.module_loading import import_string
+    from ninja.renderers import JSONRenderer
+
+    from journals_api.models.journals_model import Journal
+    from journals_api.v1.utils import flag_covert_rows
+
+    rows = _rows(args.items)
+
+    def instances():
+        journals = [Journal(owner_id=1, **row) for row in rows]
+        for journal in journals:
+            journal.is_covert = (journal.mood_tag == "COVERT")
+        return journals
+
+    def values_rows():
+        return flag_covert_rows([dict(row) for row in rows])
+
+    operation = _list_operation()
+    original_renderer = operation.api.renderer
+    try:
+        results = {
+            "before": _time_page(operation, JSONRenderer(), instances, args.repeat),
+            "after": _time_page(operation, import_string(settings.API_RENDERER)(), values_rows, args.repeat),
+        }
+    finally:
+        operation.api.renderer = original_renderer
+
+    print(f"{'path':<8} {'median ms':>10} {'p95 ms':>8}   per {args.items} items")
+    for name, timings in results.items():
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{name:<8} {statistics.median(timings) * 1000:>10.3f} {p95 * 1000:>8.3f}")
+    speedup = statistics.median(results["before"]) / statistics.median(results["after"])
+    print(f"speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
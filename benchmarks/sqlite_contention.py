@@ -0,0 +1,133 @@
+"""
+SQLite write/read contention across processes, before and after tuning.
+
+Seeds ``--users`` synthetic users, then for each configuration forks
+``--writers`` processes that create journals (``POST /api/journals/``) and
+``--readers`` processes that list them (``GET /api/journals/``), like that
+many single-threaded WSGI workers sharing the database file, for
+``--duration`` seconds:
+
+    default  SQLite's defaults: rollback journal, deferred transactions,
+             Python's 5 s busy timeout
+    tuned    ``SQLITE_PRAGMAS`` (WAL, synchronous=NORMAL, mmap, cache size,
+             busy timeout) and ``"transaction_mode": "IMMEDIATE"``, as in
+             ``penfolio/settings.py``
+
+and reports throughput, p50/p95 latency and failed requests per role.
+
+Usage:
+    python -m benchmarks.sqlite_contention --writers 4 --readers 4 --duration 10
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+
+from benchmarks import test_database
+
+CONFIGURATIONS = {
+    "default": ({"journal_mode": "DELETE"}, {}),
+    "tuned": (None, {"transaction_mode": "IMMEDIATE"}),  # None: SQLITE_PRAGMAS as configured
+}
+
+
+def _configure(pragmas, options):
+    """Points the settings at a configuration; connections opened afterwards use it."""
+    from django.conf import settings
+    from django.db import connection, connections
+
+    connections.close_all()
+    settings.SQLITE_TUNING = True
+    settings.SQLITE_PRAGMAS = pragmas
+    connection.settings_dict["OPTIONS"] = options
+    # journal_mode is stored in the database file: switch it once, up front.
+    connection.ensure_connection()
+    connections.close_all()
+
+
+def _worker(role, auth, deadline, results):
+    from django.test import Client
+
+    client = Client(raise_request_exception=False)
+    latencies, errors, n = [], 0, 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        if role == "writer":
+            body = {"title": f"Contended {n}", "content": "Written under contention. " * 20, "mood_tag": "MERRY"}
+            response = client.post("/api/journals/", json.dumps(body), content_type="application/json", headers=auth)
+        else:
+            response = client.get("/api/journals/?page_size=20", headers=auth)
+        latencies.append(time.perf_counter() - started)
+        errors += response.status_code != 200
+        n += 1
+    results.put((role, latencies, errors))
+
+
+def run(users, writers: int, readers: int, duration: float) -> dict:
+    from django.db import connections
+
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    deadline = time.monotonic() + duration
+    roles = ["writer"] * writers + ["reader"] * readers
+    processes = [
+        context.Process(target=_worker, args=(role, users[n % len(users)], deadline, results))
+        for n, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    report = {}
+    for role in ("writer", "reader"):
+        latencies = sorted(t for r, ts, _ in collected if r == role for t in ts)
+        if not latencies:
+            continue
+        report[role] = {
+            "throughput": len(latencies) / duration,
+            "p50": latencies[len(latencies) // 2] * 1000,
+            "p95": latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+            "errors": sum(e for r, _, e in collected if r == role),
+            "requests": len(latencies),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--journals", type=int, default=100, help="journals per user before the run")
+    parser.add_argument("--writers", type=int, default=4, help="writer processes")
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per configuration")
+    parser.add_argument("--configuration", choices=sorted(CONFIGURATIONS), action="append", dest="configurations")
+    options = parser.parse_args()
+
+    with test_database():
+        from django.conf import settings
+        from ninja_jwt.tokens import RefreshToken
+
+        from journals_api import synthetic
+
+        users = synthetic.generate(options.users, options.journals, seed=42, prefix="contention")["users"]
+        auth = [{"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"} for user in users]
+        tuned_pragmas = settings.SQLITE_PRAGMAS
+        # Failed requests are counted; don't print their tracebacks.
+        logging.disable(logging.CRITICAL)
+
+        print(f"{'configuration':<14} {'role':<7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+        for name in options.configurations or list(CONFIGURATIONS):
+            pragmas, db_options = CONFIGURATIONS[name]
+            _configure(tuned_pragmas if pragmas is None else pragmas, db_options)
+            report = run(auth, options.writers, options.readers, options.duration)
+            for role, result in report.items():
+                print(f"{name:<14} {role:<7} {result['throughput']:>9.1f} {result['p50']:>9.2f} "
+                      f"{result['p95']:>9.2f} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
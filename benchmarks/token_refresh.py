@@ -0,0 +1,110 @@
+"""
+Refresh token latency as the token blacklist tables grow.
+
+Seeds the outstanding/blacklisted token tables with historical tokens (half
+of them blacklisted, a quarter expired) in steps up to ``--tokens``, and at
+each size times:
+
+    before  the previous refresh path: ``RefreshToken(raw)`` (blacklist
+            membership query), ``blacklist()`` (get_or_create of both rows),
+            then the user lookup and the new token
+    after   ``refresh_tokens.rotate``: one claim insert, user joined
+    replay  a reused token rejected by ``rotate`` (in-memory after the first)
+
+and finally how long ``prune_expired`` takes to clear the expired tokens.
+
+Usage:
+    python -m benchmarks.token_refresh --tokens 1000000 --steps 4
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import test_database
+
+
+def _seed(user, start: int, count: int, batch_size: int = 10_000):
+    from django.utils import timezone
+    from ninja_jwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    now = timezone.now()
+    for offset in range(start, start + count, batch_size):
+        tokens = OutstandingToken.objects.bulk_create(
+            OutstandingToken(
+                user=user,
+                jti=f"historical-{n}",
+                token="historical",
+                created_at=now,
+                # A quarter expired a day ago, the rest expire within the week.
+                expires_at=now + timezone.timedelta(days=-1 if n % 4 == 0 else 7),
+            )
+            for n in range(offset, min(offset + batch_size, start + count))
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in tokens[::2])
+
+
+def _before(raw_token: str):
+    from django.contrib.auth.models import User
+    from ninja_jwt.tokens import RefreshToken
+
+    from journals_api.authentication import tokens_for_user
+
+    refresh = RefreshToken(raw_token)
+    refresh.blacklist()
+    return tokens_for_user(User.objects.get(id=refresh.payload["user_id"]))
+
+
+def _time(func, tokens):
+    timings = []
+    for token in tokens:
+        started = time.perf_counter()
+        try:
+            func(token)
+        except Exception:
+            pass
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1_000_000, help="historical tokens at the last step")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=200, help="refreshes timed per path and step")
+    args = parser.parse_args()
+
+    with test_database():
+        from django.contrib.auth.models import User
+        from ninja_jwt.token_blacklist.models import OutstandingToken
+
+        from journals_api import refresh_tokens
+        from journals_api.authentication import tokens_for_user
+
+        user = User.objects.create_user("bench", "bench@example.com", "Bench-pass1!")
+        print(f"{'tokens':>10} {'path':<7} {'median ms':>10} {'p95 ms':>8}")
+        seeded = 0
+        for step in range(1, args.steps + 1):
+            target = args.tokens * step // args.steps
+            _seed(user, seeded, target - seeded)
+            seeded = target
+
+            fresh = [str(tokens_for_user(user)) for _ in range(args.repeat * 2)]
+            refresh_tokens.recently_blacklisted.clear()
+            results = {
+                "before": _time(_before, fresh[:args.repeat]),
+                "after": _time(refresh_tokens.rotate, fresh[args.repeat:]),
+                "replay": _time(refresh_tokens.rotate, fresh[args.repeat:]),
+            }
+            for path, (median, p95) in results.items():
+                print(f"{seeded:>10} {path:<7} {median:>10.3f} {p95:>8.3f}")
+
+        total = OutstandingToken.objects.count()
+        started = time.perf_counter()
+        pruned = refresh_tokens.prune_expired()
+        elapsed = time.perf_counter() - started
+        print(f"\nprune_expired: {pruned} of {total} tokens in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,4 +16,9 @@ if [[ "$CREATE_SUPERUSER" == "True" ]]; then
     python manage.py createsuperuser --no-input
 fi
 
-gunicorn penfolio.wsgi
\ No newline at end of file
+# Set SERVER_MODE=asgi to serve the async routes (/api/async/) natively.
+if [[ "$SERVER_MODE" == "asgi" ]]; then
+    gunicorn penfolio.asgi:application -k uvicorn.workers.UvicornWorker
+else
+    gunicorn penfolio.wsgi
+fi
\ No newline at end of file
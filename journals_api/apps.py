@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JournalsApiConfig(AppConfig):
+    name = 'journals_api'
+
+    def ready(self):
+        # Connects the auth cache, response cache and token blacklist
+        # invalidation receivers, the query recorder, the SQLite tuning and
+        # the search trigger upkeep before any database connection is opened.
+        from . import (authentication, query_budget, refresh_tokens,  # noqa: F401
+                       response_cache, search_index, sqlite_tuning)
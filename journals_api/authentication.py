@@ -0,0 +1,146 @@
+"""
+JWT authentication classes used by the journal and auth routers.
+
+`CachedJWTAuth` keeps recently authenticated users (with their profile) in
+Django's cache, keyed by user id, so a steady stream of requests from the same
+user doesn't reload the ``User`` and ``UserProfile`` rows every time. Entries
+are dropped whenever either row is saved or deleted, and expire after
+``AUTH_USER_CACHE_TTL`` seconds regardless.
+
+With ``AUTH_USER_CACHE_STATELESS`` the database is skipped entirely and the
+user is rebuilt from the token's user id. Tokens carry nothing else about the
+user (they are only signed, not encrypted), so such a user has no username or
+email; views that show them load the row.
+"""
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from ninja_jwt.authentication import AsyncJWTAuth as BaseAsyncJWTAuth
+from ninja_jwt.authentication import JWTAuth
+from ninja_jwt.exceptions import AuthenticationFailed, InvalidToken
+from ninja_jwt.settings import api_settings
+from ninja_jwt.tokens import RefreshToken
+
+from .models.user_model import UserProfile
+
+def tokens_for_user(user) -> RefreshToken:
+    """Issues a refresh token (and, through it, an access token) for ``user``."""
+    return RefreshToken.for_user(user)
+
+
+def _cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def _cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """Drops the cached user/profile for ``user_id``."""
+    _cache().delete(_cache_key(user_id))
+
+
+def cached_user(user_id):
+    """The cached user (with their profile) for ``user_id``, or None."""
+    return _cache().get(_cache_key(user_id))
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as exc:
+        raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+
+
+def _stateless_user(validated_token) -> User:
+    """A ``User`` with only the token's user id. Its profile is loaded lazily if used."""
+    user = User(id=_user_id(validated_token), is_active=True)
+    # Behave like a row loaded from the database, so it can be used in
+    # filters and relations.
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+def _check_active(user):
+    if user is None:
+        raise AuthenticationFailed(_("User not found"))
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"))
+    return user
+
+
+class CachedJWTAuth(JWTAuth):
+    """
+    JWT authentication backed by a per-user cache (see module docstring).
+    """
+
+    def get_user(self, validated_token):
+        if settings.AUTH_USER_CACHE_STATELESS:
+            return _stateless_user(validated_token)
+
+        user_id = _user_id(validated_token)
+        key = _cache_key(user_id)
+        user = _cache().get(key)
+        if user is None:
+            user = (
+                self.user_model.objects.select_related("user_profile")
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            if user is not None:
+                _cache().set(key, user, settings.AUTH_USER_CACHE_TTL)
+
+        return _check_active(user)
+
+
+class AsyncJWTAuth(BaseAsyncJWTAuth):
+    """
+    JWT authentication for async routers.
+
+    Token validation is pure CPU work and runs inline; the user lookup uses the
+    same cache as `CachedJWTAuth` and, on a miss, the async ORM. The user's
+    profile is joined in the same query so handlers can read
+    ``request.auth.user_profile`` without triggering a lazy (sync-only) lookup.
+    """
+
+    async def authenticate(self, request, token):
+        request.user = AnonymousUser()
+        validated_token = self.get_validated_token(token)
+        user = await self.aget_user(validated_token)
+        request.user = user
+        return user
+
+    async def aget_user(self, validated_token):
+        if settings.AUTH_USER_CACHE_STATELESS:
+            return _stateless_user(validated_token)
+
+        user_id = _user_id(validated_token)
+        key = _cache_key(user_id)
+        user = await _cache().aget(key)
+        if user is None:
+            user = await (
+                self.user_model.objects.select_related("user_profile")
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .afirst()
+            )
+            if user is not None:
+                await _cache().aset(key, user, settings.AUTH_USER_CACHE_TTL)
+
+        return _check_active(user)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
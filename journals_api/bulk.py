@@ -0,0 +1,150 @@
+"""
+Batch create/update/delete for journal entries.
+
+Each function validates every entry first, then applies the valid ones in a
+single transaction with one ``bulk_create``/``bulk_update``/filtered delete,
+one counter and rollup adjustment per mood (and day) and one streak update.
+Results are returned per entry, in request order, so a client can tell which
+entries were rejected.
+"""
+from collections import Counter
+from typing import Any, Dict, List
+
+from django.utils import timezone
+
+from . import counters, etags, rollups, shards, streaks, sync
+from .models.journals_model import Journal
+from .utils import update_streak_for_dates
+
+COVERT = "COVERT"
+UPDATABLE_FIELDS = ("title", "content", "mood_tag")
+
+
+def _has_pin(user) -> bool:
+    try:
+        return bool(user.user_profile.pin)
+    except AttributeError:
+        return False
+
+
+def _result(index: int, status: str, journal=None, error: str = None, id: int = None) -> Dict[str, Any]:
+    if journal is not None:
+        journal.is_covert = (journal.mood_tag == COVERT)
+        id = journal.id
+    return {"index": index, "id": id, "status": status, "error": error, "journal": journal}
+
+
+def _summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    failed = sum(1 for result in results if result["error"] is not None)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+
+def bulk_create_journals(user, items) -> Dict[str, Any]:
+    """Creates journals from a list of `JournalCreateSchema`."""
+    with shards.atomic(user):
+        has_pin = _has_pin(user)
+        results = [None] * len(items)
+        journals, indexes = [], []
+        for index, item in enumerate(items):
+            data = item.dict()
+            if data["mood_tag"] == COVERT and not has_pin:
+                results[index] = _result(index, "error", error="A PIN must be set in your profile to create a Covert journal.")
+                continue
+            journals.append(Journal(owner=user, **data))
+            indexes.append(index)
+
+        if journals:
+            Journal.objects.for_owner(user).bulk_create(journals)
+            for mood_tag, created in Counter(journal.mood_tag for journal in journals).items():
+                counters.adjust(user.id, mood_tag, created)
+            rollups.journals_created(user.id, journals)
+            etags.bump_journals_version(user.id)
+            update_streak_for_dates(user, {journal.date_added.date() for journal in journals})
+
+        for index, journal in zip(indexes, journals):
+            results[index] = _result(index, "created", journal)
+        return _summary(results)
+
+
+def bulk_update_journals(user, items) -> Dict[str, Any]:
+    """Applies a list of `JournalBulkUpdateItemSchema` to the user's journals."""
+    with shards.atomic(user):
+        existing = Journal.objects.for_owner(user).select_for_update().in_bulk([item.id for item in items])
+        has_pin = _has_pin(user)
+        results = [None] * len(items)
+        updated, indexes, fields, seen = [], [], set(), set()
+        deltas, day_deltas = Counter(), Counter()
+        for index, item in enumerate(items):
+            journal = existing.get(item.id)
+            if journal is None:
+                results[index] = _result(index, "not_found", id=item.id, error="Journal not found.")
+                continue
+            changes = item.dict(exclude_unset=True, exclude={"id"})
+            if changes.get("mood_tag") == COVERT and journal.mood_tag != COVERT and not has_pin:
+                results[index] = _result(index, "error", id=item.id, error="A PIN must be set in your profile to set a journal as Covert.")
+                continue
+            if journal.id in seen:
+                results[index] = _result(index, "error", id=item.id, error="Journal appears more than once in this batch.")
+                continue
+
+            if "mood_tag" in changes and changes["mood_tag"] != journal.mood_tag:
+                deltas[journal.mood_tag] -= 1
+                deltas[changes["mood_tag"]] += 1
+                day = journal.date_added.date()
+                day_deltas[day, journal.mood_tag] -= 1
+                day_deltas[day, changes["mood_tag"]] += 1
+            for attr, value in changes.items():
+                setattr(journal, attr, value)
+            fields.update(journal.changed_fields)
+            updated.append(journal)
+            indexes.append(index)
+            seen.add(journal.id)
+
+        # Items that resend the stored values are reported but not written.
+        changed = [journal for journal in updated if journal.changed_fields]
+        if changed:
+            # bulk_update doesn't apply auto_now.
+            now = timezone.now()
+            for journal in changed:
+                journal.updated_at = now
+            Journal.objects.for_owner(user).bulk_update(
+                changed, [field for field in UPDATABLE_FIELDS if field in fields] + ["updated_at"]
+            )
+            for mood_tag, delta in deltas.items():
+                counters.adjust(user.id, mood_tag, delta)
+            rollups.apply(user.id, day_deltas)
+            etags.bump_journals_version(user.id)
+
+        for index, journal in zip(indexes, updated):
+            results[index] = _result(index, "updated", journal)
+        return _summary(results)
+
+
+def bulk_delete_journals(user, ids: List[int]) -> Dict[str, Any]:
+    """Deletes the user's journals with the given ids."""
+    with shards.atomic(user):
+        rows = (
+            Journal.objects.for_owner(user).select_for_update()
+            .filter(id__in=ids)
+            .values_list("id", "mood_tag", "date_added")
+        )
+        moods, day_deltas = {}, Counter()
+        for journal_id, mood_tag, date_added in rows:
+            moods[journal_id] = mood_tag
+            day_deltas[date_added.date(), mood_tag] -= 1
+        if moods:
+            Journal.objects.for_owner(user).filter(id__in=list(moods)).delete()
+            sync.record_deletions(user.id, moods)
+            etags.bump_journals_version(user.id)
+            for mood_tag, deleted in Counter(moods.values()).items():
+                counters.adjust(user.id, mood_tag, -deleted)
+            rollups.apply(user.id, day_deltas)
+            streaks.journals_deleted(user.id, {day for day, _ in day_deltas})
+
+        results = []
+        for index, journal_id in enumerate(ids):
+            if moods.pop(journal_id, None) is not None:
+                results.append(_result(index, "deleted", id=journal_id))
+            else:
+                results.append(_result(index, "not_found", id=journal_id, error="Journal not found."))
+        return _summary(results)
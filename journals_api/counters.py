@@ -0,0 +1,97 @@
+"""
+Per-user journal counters.
+
+`JournalCounter` holds one row per (owner, mood tag). The journal endpoints
+adjust it in the same transaction as the journal write, and list endpoints
+read their page counts from it instead of running COUNT(*) over the journal
+table. Writes that bypass the endpoints (admin, shell, raw SQL) can make the
+counters drift; ``manage.py rebuild_journal_counters`` recomputes them.
+"""
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from . import shards
+from .models.counter_model import JournalCounter
+from .models.journals_model import Journal
+
+COVERT = "COVERT"
+
+
+def adjust(owner_id: int, mood_tag: str, delta: int):
+    """Adds ``delta`` to the owner's counter for ``mood_tag``."""
+    if not delta:
+        return
+    counters = JournalCounter.objects.for_owner(owner_id).filter(mood_tag=mood_tag)
+    if counters.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic(using=counters.db):
+            counters.create(owner_id=owner_id, mood_tag=mood_tag, count=delta)
+    except IntegrityError:
+        # Created concurrently; the row exists now.
+        counters.update(count=F("count") + delta)
+
+
+def journal_created(owner_id: int, mood_tag: str):
+    adjust(owner_id, mood_tag, 1)
+
+
+def journal_deleted(owner_id: int, mood_tag: str):
+    adjust(owner_id, mood_tag, -1)
+
+
+def journal_mood_changed(owner_id: int, old_mood_tag: str, new_mood_tag: str):
+    if old_mood_tag == new_mood_tag:
+        return
+    adjust(owner_id, old_mood_tag, -1)
+    adjust(owner_id, new_mood_tag, 1)
+
+
+def _counters_for(owner, mood_tag: Optional[str], exclude_covert: bool):
+    counters = JournalCounter.objects.for_owner(owner)
+    if mood_tag:
+        return counters.filter(mood_tag=mood_tag)
+    if exclude_covert:
+        return counters.exclude(mood_tag=COVERT)
+    return counters
+
+
+def journal_count(owner, mood_tag: Optional[str] = None, exclude_covert: bool = False) -> int:
+    """
+    Number of the owner's journals with ``mood_tag``, or all of them
+    (optionally without covert ones) when no mood is given.
+    """
+    total = _counters_for(owner, mood_tag, exclude_covert).aggregate(total=Sum("count"))["total"]
+    return total or 0
+
+
+async def ajournal_count(owner, mood_tag: Optional[str] = None, exclude_covert: bool = False) -> int:
+    """Async counterpart of `journal_count`."""
+    total = (await _counters_for(owner, mood_tag, exclude_covert).aaggregate(total=Sum("count")))["total"]
+    return total or 0
+
+
+def rebuild(owner_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes counters from the journal table, for the given owners or for
+    everyone, on each owner's shard. Returns the number of counter rows written.
+    """
+    written = 0
+    for alias, ids in shards.partition(owner_ids):
+        journals = Journal.objects.using(alias)
+        counters = JournalCounter.objects.using(alias)
+        if ids is not None:
+            journals = journals.filter(owner_id__in=ids)
+            counters = counters.filter(owner_id__in=ids)
+
+        rows = [
+            JournalCounter(owner_id=row["owner_id"], mood_tag=row["mood_tag"], count=row["count"])
+            for row in journals.order_by().values("owner_id", "mood_tag").annotate(count=Count("id"))
+        ]
+        with transaction.atomic(using=alias):
+            counters.delete()
+            JournalCounter.objects.using(alias).bulk_create(rows, batch_size=1000)
+        written += len(rows)
+    return written
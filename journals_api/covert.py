@@ -0,0 +1,38 @@
+"""
+Short-lived covert unlock tokens.
+
+Checking a PIN runs the full password hasher, so clients unlock once with the
+PIN and then send the returned token to the covert list/reveal endpoints.
+Verifying a token is a single HMAC.
+
+A token is signed for one user and carries a fingerprint of the stored PIN
+hash, so it stops working as soon as the PIN changes. It only grants access
+to covert journals; it can't be used as an API access token.
+"""
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SALT = "journals_api.covert-unlock"
+
+
+def _pin_fingerprint(profile) -> str:
+    return salted_hmac(SALT, profile.pin).hexdigest()[:16]
+
+
+def issue_unlock_token(profile) -> str:
+    """Returns an unlock token for ``profile``. The PIN must already be verified."""
+    return signing.dumps({"u": profile.user_id, "p": _pin_fingerprint(profile)}, salt=SALT, compress=True)
+
+
+def check_unlock_token(profile, token: str) -> bool:
+    """True if ``token`` was issued for ``profile``'s current PIN and hasn't expired."""
+    if not profile.pin or not token:
+        return False
+    try:
+        claims = signing.loads(token, salt=SALT, max_age=settings.COVERT_UNLOCK_TOKEN_LIFETIME)
+    except signing.BadSignature:
+        return False
+    return claims.get("u") == profile.user_id and constant_time_compare(
+        claims.get("p", ""), _pin_fingerprint(profile)
+    )
@@ -0,0 +1,130 @@
+"""
+ETag / Last-Modified support for journal reads.
+
+Every write to a user's journals bumps ``UserProfile.journals_version`` in
+the same transaction, so a (user, version) pair identifies the state of all
+their journals without hashing response bodies.
+
+Unconditional requests take the version from the profile the auth class
+already loaded, so they cost no extra query. A cached profile may lag behind
+the database, which can only produce an outdated ETag (a later cache miss),
+never a wrong 304: conditional requests compare against a fresh read of the
+version, made before the view runs its own queries.
+"""
+from typing import Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from . import response_cache
+from .authentication import invalidate_cached_user
+from .models.user_model import UserProfile
+
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def bump_journals_version(user_id: int):
+    """Marks the user's journals as changed. Call in the writing transaction."""
+    UserProfile.objects.filter(user_id=user_id).update(
+        journals_version=F("journals_version") + 1,
+        journals_modified_at=timezone.now(),
+    )
+    # update() skips the post_save receiver that drops the cached profile.
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+    response_cache.invalidate(user_id, response_cache.JOURNALS)
+
+
+def _is_conditional(request) -> bool:
+    return "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+
+
+def _cached_stamp(user) -> Tuple[int, Optional[object]]:
+    try:
+        profile = user.user_profile
+    except UserProfile.DoesNotExist:
+        return 0, None
+    return profile.journals_version, profile.journals_modified_at
+
+
+def _fresh_stamp(user) -> Tuple[int, Optional[object]]:
+    stamp = UserProfile.objects.filter(user=user).values_list("journals_version", "journals_modified_at").first()
+    return stamp or (0, None)
+
+
+def _etag(user, version: int) -> str:
+    return f'W/"journals-{user.id}-{version}"'
+
+
+def _matches(request, etag: str, modified_at) -> bool:
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match.
+        opaque = etag[2:]
+        return any(tag == "*" or tag.removeprefix("W/") == opaque for tag in parse_etags(if_none_match))
+
+    if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return (
+        if_modified_since is not None
+        and modified_at is not None
+        and int(modified_at.timestamp()) <= if_modified_since
+    )
+
+
+def _apply(response: HttpResponse, user, version: int, modified_at) -> str:
+    etag = _etag(user, version)
+    response["ETag"] = etag
+    if modified_at is not None:
+        response["Last-Modified"] = http_date(modified_at.timestamp())
+    # Per-user data: private, and clients must revalidate before reuse.
+    response["Cache-Control"] = "private, no-cache"
+    return etag
+
+
+def _not_modified(response: HttpResponse) -> HttpResponseNotModified:
+    not_modified = HttpResponseNotModified()
+    for header in VALIDATOR_HEADERS:
+        if header in response:
+            not_modified[header] = response[header]
+    return not_modified
+
+
+def conditional_response(request, response: HttpResponse) -> Optional[HttpResponseNotModified]:
+    """
+    Sets the validators on ``response`` (the operation's temporal response).
+    Returns a 304 response when the client's copy is still current.
+    """
+    user = request.auth
+    if _is_conditional(request):
+        version, modified_at = _fresh_stamp(user)
+    else:
+        version, modified_at = _cached_stamp(user)
+
+    etag = _apply(response, user, version, modified_at)
+    if _is_conditional(request) and _matches(request, etag, modified_at):
+        return _not_modified(response)
+    return None
+
+
+async def aconditional_response(request, response: HttpResponse) -> Optional[HttpResponseNotModified]:
+    """Async counterpart of `conditional_response`."""
+    user = request.auth
+    if _is_conditional(request) or not User.user_profile.is_cached(user):
+        # Stateless auth doesn't preload the profile; read just the stamp.
+        stamp = await (
+            UserProfile.objects.filter(user=user)
+            .values_list("journals_version", "journals_modified_at")
+            .afirst()
+        )
+        version, modified_at = stamp or (0, None)
+    else:
+        version, modified_at = _cached_stamp(user)
+
+    etag = _apply(response, user, version, modified_at)
+    if _is_conditional(request) and _matches(request, etag, modified_at):
+        return _not_modified(response)
+    return None
+
@@ -0,0 +1,148 @@
+"""
+Streaming export of a user's journals.
+
+Rows are read with ``iterator(chunk_size=JOURNAL_EXPORT_CHUNK_SIZE)`` (or
+``aiterator`` for async views) and encoded one at a time, so memory use
+doesn't grow with the number of entries.
+
+Two formats are supported:
+
+    ndjson  one JSON object per line
+    zip     one Markdown file per journal, with a front matter block holding
+            the metadata; ZIP entries are written with data descriptors, which
+            lets the archive be streamed without seeking
+"""
+import json
+import re
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models.journals_model import Journal
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "zip": ("application/zip", "zip"),
+}
+EXPORT_FIELDS = ("id", "title", "content", "date_added", "updated_at", "mood_tag")
+
+
+def export_queryset(user, include_covert: bool):
+    journals = Journal.objects.for_owner(user)
+    if not include_covert:
+        journals = journals.exclude(mood_tag="COVERT")
+    return journals.order_by("date_added", "id").values(*EXPORT_FIELDS)
+
+
+def filename(export_format: str) -> str:
+    return f"penfolio-export-{timezone.now():%Y%m%d}.{FORMATS[export_format][1]}"
+
+
+class _ExportEncoder(DjangoJSONEncoder):
+    """Keeps microseconds, which `DjangoJSONEncoder` drops, so entries import back unchanged."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def ndjson_record(row) -> bytes:
+    return (json.dumps(row, cls=_ExportEncoder, ensure_ascii=False) + "\n").encode()
+
+
+def markdown_document(row) -> str:
+    """A journal as Markdown with a front matter block, as read back by the importer."""
+    return (
+        "---\n"
+        f"id: {row['id']}\n"
+        f"title: {json.dumps(row['title'], ensure_ascii=False)}\n"
+        f"date_added: {row['date_added'].isoformat()}\n"
+        f"mood_tag: {row['mood_tag']}\n"
+        "---\n\n"
+        f"{row['content']}\n"
+    )
+
+
+def _markdown_name(row) -> str:
+    slug = re.sub(r"[^\w-]+", "-", row["title"].lower()).strip("-")[:50] or "untitled"
+    return f"{row['date_added']:%Y-%m-%d}-{row['id']}-{slug}.md"
+
+
+class _ChunkBuffer:
+    """Write-only, non-seekable file object that hands back what was written."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class MarkdownZipWriter:
+    """Builds a ZIP of Markdown files entry by entry, returning bytes as it goes."""
+
+    def __init__(self):
+        self._buffer = _ChunkBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, row) -> bytes:
+        info = zipfile.ZipInfo(_markdown_name(row), date_time=row["date_added"].timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self._zip.writestr(info, markdown_document(row))
+        return self._buffer.drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._buffer.drain()
+
+
+def stream_export(rows: Iterable, export_format: str) -> Iterator[bytes]:
+    if export_format == "ndjson":
+        for row in rows:
+            yield ndjson_record(row)
+        return
+
+    writer = MarkdownZipWriter()
+    for row in rows:
+        yield writer.add(row)
+    yield writer.close()
+
+
+async def astream_export(rows, export_format: str):
+    """Async counterpart of `stream_export`, for rows from ``aiterator()``."""
+    if export_format == "ndjson":
+        async for row in rows:
+            yield ndjson_record(row)
+        return
+
+    writer = MarkdownZipWriter()
+    async for row in rows:
+        yield writer.add(row)
+    yield writer.close()
+
+
+def export_rows(user, include_covert: bool):
+    return export_queryset(user, include_covert).iterator(chunk_size=settings.JOURNAL_EXPORT_CHUNK_SIZE)
+
+
+def aexport_rows(user, include_covert: bool):
+    return export_queryset(user, include_covert).aiterator(chunk_size=settings.JOURNAL_EXPORT_CHUNK_SIZE)
@@ -0,0 +1,18 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# PBKDF2 checks are CPU bound. Running them on a small dedicated pool keeps the
+# event loop responsive and caps how many cores hashing can take at once.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PASSWORD_HASHER_WORKERS", 4),
+    thread_name_prefix="password-hasher",
+)
+
+
+async def run_hasher(func, *args, **kwargs):
+    """Runs a password/PIN hashing callable on the bounded hasher pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
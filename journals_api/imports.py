@@ -0,0 +1,203 @@
+"""
+Streaming bulk import of journals, the counterpart of `export`.
+
+Accepts the two export formats:
+
+    ndjson  one JSON object per line
+    zip     Markdown files, optionally with a front matter block (``title``,
+            ``date_added``, ``mood_tag``); without one the title comes from a
+            leading ``# heading`` or the file name
+
+Records are parsed one at a time, validated against `JournalImportSchema`
+and inserted ``JOURNAL_IMPORT_BATCH_SIZE`` at a time, each batch in its own
+transaction with its counter, rollup and version updates. Only the current batch and
+the first ``JOURNAL_IMPORT_MAX_ERRORS`` errors are kept in memory, so large
+archives import in bounded memory. Streaks are recomputed once at the end.
+"""
+import json
+import os
+import zipfile
+from collections import Counter
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from pydantic import ValidationError
+
+from . import counters, etags, rollups, shards
+from .models.journals_model import Journal
+from .schemas.journal_schemas import JournalImportSchema
+from .utils import recompute_streak
+
+COVERT = "COVERT"
+FRONT_MATTER = "---"
+
+# (source, data, error): where the record came from, the parsed fields, or
+# why it couldn't be parsed.
+ParsedRecord = Tuple[str, Optional[Dict[str, Any]], Optional[str]]
+
+
+def detect_format(fileobj) -> str:
+    fmt = "zip" if zipfile.is_zipfile(fileobj) else "ndjson"
+    fileobj.seek(0)
+    return fmt
+
+
+def parse_ndjson(fileobj) -> Iterator[ParsedRecord]:
+    for number, line in enumerate(fileobj, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        source = f"line {number}"
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield source, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(data, dict):
+            yield source, None, "Expected a JSON object."
+            continue
+        yield source, data, None
+
+
+def parse_markdown(text: str, name: str) -> Dict[str, Any]:
+    """Reads a Markdown file as written by `export.markdown_document`."""
+    data = {}
+    lines = text.split("\n")
+    if lines and lines[0].strip() == FRONT_MATTER and FRONT_MATTER in (line.strip() for line in lines[1:]):
+        end = next(i for i, line in enumerate(lines[1:], start=1) if line.strip() == FRONT_MATTER)
+        for line in lines[1:end]:
+            key, _, value = line.partition(":")
+            value = value.strip()
+            if value.startswith('"'):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    value = value.strip('"')
+            data[key.strip()] = value
+        lines = lines[end + 1:]
+        if lines and not lines[0].strip():
+            lines = lines[1:]
+    elif lines and lines[0].startswith("# "):
+        data["title"] = lines[0][2:].strip()
+        lines = lines[1:]
+
+    data.setdefault("title", os.path.splitext(os.path.basename(name))[0])
+    data.setdefault("mood_tag", "MERRY")
+    # The exporter ends every file with a newline after the content.
+    content = "\n".join(lines)
+    data["content"] = content[:-1] if content.endswith("\n") else content
+    data.pop("id", None)
+    return data
+
+
+def parse_markdown_zip(fileobj) -> Iterator[ParsedRecord]:
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith((".md", ".markdown")):
+                continue
+            try:
+                with archive.open(info) as member:
+                    text = member.read().decode("utf-8")
+            except (zipfile.BadZipFile, UnicodeDecodeError) as exc:
+                yield info.filename, None, f"Unreadable file: {exc}"
+                continue
+            yield info.filename, parse_markdown(text, info.filename), None
+
+
+def parse_records(fileobj, fmt: Optional[str] = None) -> Iterator[ParsedRecord]:
+    fmt = fmt or detect_format(fileobj)
+    return parse_markdown_zip(fileobj) if fmt == "zip" else parse_ndjson(fileobj)
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _build_journal(user, data: Dict[str, Any], has_pin: bool):
+    """Returns ``((journal, original date_added), error)`` for one parsed record."""
+    try:
+        item = JournalImportSchema.model_validate(data)
+    except ValidationError as exc:
+        return None, _validation_message(exc)
+
+    fields = item.dict()
+    if fields["mood_tag"] == COVERT and not has_pin:
+        return None, "A PIN must be set in your profile to create a Covert journal."
+    date_added = fields.pop("date_added")
+    if date_added is not None:
+        if timezone.is_naive(date_added):
+            date_added = timezone.make_aware(date_added)
+        # Drop the record's own offset: rollups and streaks bucket entries by
+        # their UTC day.
+        date_added = date_added.astimezone(dt_timezone.utc)
+    return (Journal(owner=user, **fields), date_added), None
+
+
+def _insert_batch(user, batch):
+    with shards.atomic(user):
+        journals = [journal for journal, _ in batch]
+        Journal.objects.for_owner(user).bulk_create(journals)
+        # date_added is auto_now_add, which bulk_create overwrites; restore the
+        # original dates with one UPDATE.
+        dated = []
+        for journal, date_added in batch:
+            if date_added is not None:
+                journal.date_added = date_added
+                dated.append(journal)
+        if dated:
+            Journal.objects.for_owner(user).bulk_update(dated, ["date_added"])
+        for mood_tag, created in Counter(journal.mood_tag for journal in journals).items():
+            counters.adjust(user.id, mood_tag, created)
+        rollups.journals_created(user.id, journals)
+        etags.bump_journals_version(user.id)
+
+
+def import_journals(user, records, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Imports parsed records (see `parse_records`) for ``user``."""
+    batch_size = batch_size or settings.JOURNAL_IMPORT_BATCH_SIZE
+    try:
+        has_pin = bool(user.user_profile.pin)
+    except AttributeError:
+        has_pin = False
+
+    created = failed = 0
+    errors = []
+    batch = []
+    for index, (source, data, error) in enumerate(records):
+        entry = None
+        if error is None:
+            entry, error = _build_journal(user, data, has_pin)
+        if error is not None:
+            failed += 1
+            if len(errors) < settings.JOURNAL_IMPORT_MAX_ERRORS:
+                errors.append({"index": index, "source": source, "error": error})
+            continue
+
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            _insert_batch(user, batch)
+            created += len(batch)
+            batch = []
+
+    if batch:
+        _insert_batch(user, batch)
+        created += len(batch)
+    if created:
+        recompute_streak(user)
+
+    return {
+        "created": created,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+
+
+def import_file(user, fileobj, fmt: Optional[str] = None, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    return import_journals(user, parse_records(fileobj, fmt), batch_size)
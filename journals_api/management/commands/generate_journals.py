@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from journals_api import synthetic
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic users and journals for load testing and benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Users to create.")
+        parser.add_argument("--journals", type=int, default=100, help="Journals per user.")
+        parser.add_argument("--covert-ratio", type=float, default=0.1, help="Share of covert journals.")
+        parser.add_argument("--gloomy-ratio", type=float, default=0.35, help="Share of gloomy journals.")
+        parser.add_argument("--days", type=int, default=365, help="Spread entries over this many past days.")
+        parser.add_argument("--seed", type=int, help="Random seed, for a reproducible data set.")
+        parser.add_argument("--prefix", default="synthetic", help="Usernames are <prefix>-<n>.")
+        parser.add_argument("--password", default=synthetic.DEFAULT_PASSWORD, help="Password of every user (default: %(default)s).")
+        parser.add_argument("--pin", default=synthetic.DEFAULT_PIN, help="Covert PIN of every user (default: %(default)s).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Journals inserted per transaction.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["journals"] < 0 or options["days"] < 1:
+            raise CommandError("--users and --days must be positive and --journals not negative.")
+        try:
+            result = synthetic.generate(
+                options["users"],
+                options["journals"],
+                covert_ratio=options["covert_ratio"],
+                gloomy_ratio=options["gloomy_ratio"],
+                days=options["days"],
+                seed=options["seed"],
+                prefix=options["prefix"],
+                password=options["password"],
+                pin=options["pin"],
+                batch_size=options["batch_size"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        users = result["users"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} user(s) ({users[0].username} .. {users[-1].username}) "
+            f"and {result['journals']} journal(s)."
+        ))
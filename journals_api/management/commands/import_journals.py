@@ -0,0 +1,41 @@
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journals_api import imports
+
+
+class Command(BaseCommand):
+    help = "Imports journals for a user from an NDJSON file or a ZIP of Markdown files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User who will own the imported journals.")
+        parser.add_argument("path", help="NDJSON file or ZIP archive of Markdown files.")
+        parser.add_argument(
+            "--format", choices=("ndjson", "zip"), dest="fmt",
+            help="Archive format (detected from the file when omitted).",
+        )
+        parser.add_argument("--batch-size", type=int, help="Entries inserted per transaction.")
+
+    def handle(self, *args, username, path, fmt=None, batch_size=None, **options):
+        try:
+            user = User.objects.select_related("user_profile").get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"User '{username}' does not exist.")
+
+        try:
+            with open(path, "rb") as fileobj:
+                result = imports.import_file(user, fileobj, fmt, batch_size)
+        except OSError as exc:
+            raise CommandError(f"Could not read {path}: {exc}")
+        except zipfile.BadZipFile:
+            raise CommandError(f"{path} is not a valid ZIP file.")
+
+        for error in result["errors"]:
+            self.stderr.write(f"{error['source']}: {error['error']}")
+        if result["errors_truncated"]:
+            self.stderr.write("(further errors omitted)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} journal(s), {result['failed']} record(s) rejected."
+        ))
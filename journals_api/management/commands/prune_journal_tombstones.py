@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from journals_api import sync
+
+
+class Command(BaseCommand):
+    help = "Deletes journal tombstones older than JOURNAL_TOMBSTONE_RETENTION."
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} journal tombstone(s)."))
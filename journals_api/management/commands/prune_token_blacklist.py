@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from journals_api import refresh_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired refresh tokens from the outstanding and blacklisted token tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Tokens deleted per transaction.")
+
+    def handle(self, *args, batch_size=10_000, **options):
+        deleted = refresh_tokens.prune_expired(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired token(s)."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from journals_api import shards
+from journals_api.models.user_model import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves users' journals to the shard they are placed on by JOURNAL_SHARDS, "
+        "e.g. users from before sharding or after adding a shard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only rebalance this user (may be repeated).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the moves without making them.")
+
+    def handle(self, *args, user_ids=None, dry_run=False, **options):
+        if not shards.enabled():
+            raise CommandError("JOURNAL_SHARDS is empty; there is nothing to rebalance onto.")
+        profiles = UserProfile.objects.order_by("user_id")
+        if user_ids:
+            profiles = profiles.filter(user_id__in=user_ids)
+
+        users = moved = 0
+        for user_id, current in list(profiles.values_list("user_id", "journal_shard")):
+            source = current or DEFAULT_DB_ALIAS
+            target = shards.place(user_id)
+            if source == target:
+                continue
+            users += 1
+            if dry_run:
+                self.stdout.write(f"User {user_id}: {source} -> {target}")
+                continue
+            count = shards.move_owner(user_id, target)
+            moved += count
+            self.stdout.write(f"User {user_id}: {source} -> {target} ({count} journal(s))")
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Would move {users} user(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Moved {users} user(s), {moved} journal(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from journals_api import counters
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-user journal counters from the journal table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only rebuild this user's counters (may be repeated).",
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        written = counters.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} journal counter(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from journals_api import rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily journal rollups used by the stats endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only rebuild this user's rollups (may be repeated).",
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        written = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily rollup(s)."))
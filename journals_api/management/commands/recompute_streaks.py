@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from journals_api import streaks
+from journals_api.models.user_model import UserProfile
+
+
+def _recompute_batch(user_ids):
+    try:
+        return streaks.recompute(user_ids)
+    finally:
+        # Each worker thread opens its own connection; don't leak it.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Recomputes every user's journaling streak from their journal dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids",
+            help="Only recompute this user's streak (may be repeated).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Users per query.")
+        parser.add_argument("--workers", type=int, default=4, help="Batches recomputed in parallel.")
+
+    def handle(self, *args, user_ids=None, batch_size=500, workers=4, **options):
+        profiles = UserProfile.objects.order_by("user_id")
+        if user_ids:
+            profiles = profiles.filter(user_id__in=user_ids)
+        all_ids = list(profiles.values_list("user_id", flat=True))
+        batches = [all_ids[i:i + batch_size] for i in range(0, len(all_ids), batch_size)]
+
+        if workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                written = sum(pool.map(_recompute_batch, batches))
+        else:
+            written = sum(streaks.recompute(batch) for batch in batches)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {written} streak(s)."))
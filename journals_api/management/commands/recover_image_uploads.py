@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from journals_api import uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Requeues image upload jobs left pending or running by a restart, fails those whose "
+        "spooled file is gone and deletes spool files no job refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=600, metavar="SECONDS",
+            help="Only touch jobs and files unchanged for this long, so running servers keep "
+                 "theirs (default: 600). Use 0 when no server is running.",
+        )
+
+    def handle(self, *args, older_than=600, **options):
+        result = uploads.recover_jobs(stale_after=timedelta(seconds=older_than))
+        # The requeued jobs run on this process's pool; wait for them.
+        uploads.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Requeued {result['requeued']} job(s), failed {result['failed']}, "
+            f"removed {result['removed']} spool file(s)."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from journals_api import response_cache
+
+
+class Command(BaseCommand):
+    help = "Prints the response cache hits, misses and hit rate per endpoint group."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, reset=False, **options):
+        for namespace, counts in response_cache.stats().items():
+            self.stdout.write(
+                f"{namespace}: {counts['hits']} hit(s), {counts['misses']} miss(es), "
+                f"hit rate {counts['hit_rate']:.1%}"
+            )
+        if reset:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['owner', 'mood_tag', '-date_added', '-id'], name='journal_owner_mood_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['owner', '-date_added', '-id'], name='journal_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(condition=models.Q(('mood_tag', 'COVERT')), fields=['owner', '-date_added', '-id'], name='journal_covert_date_idx'),
+        ),
+    ]
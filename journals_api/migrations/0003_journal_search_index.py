@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from journals_api import search_index
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(search_index.SQLITE_FTS_TABLE)
+        for statement in search_index.SQLITE_FTS_TRIGGERS.values():
+            schema_editor.execute(statement)
+        schema_editor.execute("INSERT INTO journals_api_journal_fts(journals_api_journal_fts) VALUES ('rebuild')")
+    elif vendor == "postgresql":
+        schema_editor.execute(search_index.POSTGRES_SEARCH_INDEX)
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for name in search_index.SQLITE_FTS_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute("DROP TABLE IF EXISTS journals_api_journal_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS journals_api_journal_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0002_journal_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
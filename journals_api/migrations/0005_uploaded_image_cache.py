@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0004_image_upload_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageuploadjob',
+            name='deduplicated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='imageuploadjob',
+            name='digest',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='UploadedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('secure_url', models.URLField(max_length=500)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_images', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'last_used_at'], name='uploaded_image_lru_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'digest'), name='uploaded_image_owner_digest_uniq'), models.UniqueConstraint(condition=models.Q(('owner__isnull', True)), fields=('digest',), name='uploaded_image_global_digest_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    Journal = apps.get_model('journals_api', 'Journal')
+    JournalCounter = apps.get_model('journals_api', 'JournalCounter')
+    rows = Journal.objects.order_by().values('owner_id', 'mood_tag').annotate(count=Count('id'))
+    JournalCounter.objects.bulk_create(
+        [JournalCounter(owner_id=row['owner_id'], mood_tag=row['mood_tag'], count=row['count']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0005_uploaded_image_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mood_tag', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'mood_tag'), name='journal_counter_owner_mood_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+from journals_api import search_index
+
+
+def backfill_updated_at(apps, schema_editor):
+    Journal = apps.get_model('journals_api', 'Journal')
+    Journal.objects.update(updated_at=F('date_added'))
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # Adding updated_at rebuilds the journal table on SQLite, dropping the
+    # search triggers.
+    search_index.reinstall_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0006_journal_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='journal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='journal_owner_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='journaltombstone',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='journaltombstone',
+            index=models.Index(fields=['owner', 'deleted_at'], name='journal_tombstone_owner_idx'),
+        ),
+    ]
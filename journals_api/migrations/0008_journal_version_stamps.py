@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0007_journal_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='journals_modified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='journals_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
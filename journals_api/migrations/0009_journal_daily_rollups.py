@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Journal = apps.get_model('journals_api', 'Journal')
+    JournalDailyRollup = apps.get_model('journals_api', 'JournalDailyRollup')
+    rows = (
+        Journal.objects.order_by()
+        .annotate(day=TruncDate('date_added', tzinfo=datetime.timezone.utc))
+        .values('owner_id', 'day', 'mood_tag')
+        .annotate(count=Count('id'))
+    )
+    JournalDailyRollup.objects.bulk_create(
+        [JournalDailyRollup(owner_id=row['owner_id'], day=row['day'], mood_tag=row['mood_tag'], count=row['count']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0008_journal_version_stamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('mood_tag', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day', 'mood_tag'), name='journal_rollup_owner_day_mood_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
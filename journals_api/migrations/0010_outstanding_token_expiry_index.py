@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# ninja_jwt's OutstandingToken has no index on expires_at, which the expired
+# token pruning (journals_api.refresh_tokens.prune_expired) filters on.
+INDEX = "token_blacklist_outstandingtoken_expires_idx"
+TABLE = "token_blacklist_outstandingtoken"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0009_journal_daily_rollups'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"CREATE INDEX IF NOT EXISTS {INDEX} ON {TABLE} (expires_at)",
+            reverse_sql=f"DROP INDEX IF EXISTS {INDEX}",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0010_outstanding_token_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='journal_shard',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from journals_api import search_index
+
+# The per-owner tables, whose rows live on their owner's shard (see
+# journals_api.shards): a database constraint can't reach a user on another
+# database, so their owner foreign keys have none, sharded or not.
+OWNER_MODELS = ('journal', 'journalcounter', 'journaldailyrollup', 'journaltombstone')
+
+
+def drop_owner_constraints(apps, schema_editor):
+    # Databases migrated by an earlier 0011 with JOURNAL_SHARDS set already
+    # lack the constraints, so only drop the ones that exist.
+    connection = schema_editor.connection
+    for model_name in OWNER_MODELS:
+        model = apps.get_model('journals_api', model_name)
+        old_field = model._meta.get_field('owner')
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        if not any(c['foreign_key'] and c['columns'] == [old_field.column] for c in constraints.values()):
+            continue
+        new_field = old_field.clone()
+        new_field.db_constraint = False
+        new_field.remote_field.model = old_field.remote_field.model
+        new_field.set_attributes_from_name('owner')
+        new_field.model = model
+        schema_editor.alter_field(model, old_field, new_field)
+    # Dropping the journal table's constraint rebuilds it on SQLite, which
+    # drops the search triggers.
+    search_index.reinstall_triggers(connection)
+
+
+def owner_field(related_name):
+    return models.ForeignKey(
+        db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name, to=settings.AUTH_USER_MODEL,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journals_api', '0011_journal_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_owner_constraints, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AlterField(model_name='journal', name='owner', field=owner_field('journals')),
+                migrations.AlterField(model_name='journalcounter', name='owner', field=owner_field('journal_counters')),
+                migrations.AlterField(model_name='journaldailyrollup', name='owner', field=owner_field('journal_rollups')),
+                migrations.AlterField(model_name='journaltombstone', name='owner', field=owner_field('journal_tombstones')),
+            ],
+        ),
+    ]
@@ -0,0 +1,6 @@
+# Import every model module so Django registers the models (and their signal
+# receivers) as soon as the app loads.
+from .counter_model import JournalCounter, JournalDailyRollup
+from .journals_model import Journal, JournalTombstone
+from .upload_model import ImageUploadJob, UploadedImage
+from .user_model import UserProfile
@@ -0,0 +1,54 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+from .managers import OwnerManager
+
+
+class JournalCounter(models.Model):
+    """
+    Number of journals a user has with a given mood tag, kept in step with the
+    journal table so list endpoints don't need a COUNT(*) per page.
+    Maintained by `journals_api.counters`.
+    """
+    # Stored with the owner's journals (see Journal.owner).
+    owner: 'User' = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='journal_counters', db_constraint=False,
+    )
+    mood_tag = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    objects = OwnerManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'mood_tag'], name='journal_counter_owner_mood_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}/{self.mood_tag}: {self.count}"
+
+
+class JournalDailyRollup(models.Model):
+    """
+    Number of journals a user wrote on a day (UTC) with a given mood tag, so
+    the stats endpoints never scan the journal table.
+    Maintained by `journals_api.rollups`.
+    """
+    # Stored with the owner's journals (see Journal.owner).
+    owner: 'User' = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='journal_rollups', db_constraint=False,
+    )
+    day = models.DateField()
+    mood_tag = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    objects = OwnerManager()
+
+    class Meta:
+        constraints = [
+            # Also serves the per-owner date range scans of the stats endpoints.
+            models.UniqueConstraint(fields=['owner', 'day', 'mood_tag'], name='journal_rollup_owner_day_mood_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}/{self.day}/{self.mood_tag}: {self.count}"
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 
-class Journal(models.Model):
+from .managers import OwnerManager
+from .tracking import DirtyFieldsMixin
+
+class Journal(DirtyFieldsMixin, models.Model):
     """
     Represents a single journal entry in the application.
     """
@@ -13,18 +16,69 @@ class Journal(models.Model):
         GLOOMY = 'GL', 'Gloomy'
         COVERT = 'CO', 'Covert'
 
-    owner: 'User' = models.ForeignKey(User, on_delete=models.CASCADE, related_name='journals')
+    # No database constraint: journals may live on another database (shard)
+    # than their owner (see journals_api.shards).
+    owner: 'User' = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='journals', db_constraint=False,
+    )
     title = models.CharField(max_length=200)
     content = models.TextField()
     date_added = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     mood_tag = models.CharField(
         max_length=2,
         choices=MoodTag.choices,
         default=MoodTag.MERRY,
     )
 
+    objects = OwnerManager()
+
     class Meta:
         ordering = ['-date_added']
+        indexes = [
+            # Keyset pagination walks these in (date_added, id) order per owner.
+            models.Index(
+                fields=['owner', 'mood_tag', '-date_added', '-id'],
+                name='journal_owner_mood_date_idx',
+            ),
+            models.Index(
+                fields=['owner', '-date_added', '-id'],
+                name='journal_owner_date_idx',
+            ),
+            # Delta sync walks a user's changes in (updated_at, id) order.
+            models.Index(
+                fields=['owner', 'updated_at', 'id'],
+                name='journal_owner_updated_idx',
+            ),
+            # Partial index for covert listings; skipped on backends without
+            # partial index support.
+            models.Index(
+                fields=['owner', '-date_added', '-id'],
+                condition=models.Q(mood_tag='COVERT'),
+                name='journal_covert_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'"{self.title}"' # by {self.owner.username} on {self.date_added.strftime("%Y-%m-%d")}'
+
+
+class JournalTombstone(models.Model):
+    """
+    Records a deleted journal so delta sync can tell clients to drop it.
+    """
+    owner: 'User' = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='journal_tombstones', db_constraint=False,
+    )
+    journal_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OwnerManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at'], name='journal_tombstone_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"Journal {self.journal_id} deleted at {self.deleted_at}"
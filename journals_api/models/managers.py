@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class OwnerManager(models.Manager):
+    """
+    Manager of the per-owner journal tables, which live on the owner's shard
+    (see `journals_api.shards`).
+    """
+
+    def for_owner(self, owner):
+        """The rows of ``owner`` (a user or user id), read from and written to their shard."""
+        return self.db_manager(hints={"owner": owner}).filter(owner=owner)
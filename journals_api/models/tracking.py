@@ -0,0 +1,69 @@
+class DirtyFieldsMixin:
+    """
+    Remembers the field values an instance was loaded (or last saved) with.
+
+    A plain ``save()`` on a stored instance then writes only the fields that
+    changed, plus any ``auto_now`` fields, and runs no query (and sends no
+    signals) when nothing changed. Receivers see the fields written in
+    ``update_fields``. Passing ``update_fields``, ``force_insert`` or
+    ``force_update`` bypasses the tracking.
+
+    Writes that skip ``save()`` (``update()``, ``bulk_update()``) aren't seen;
+    a later ``save()`` may repeat them, which is harmless.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember()
+        return instance
+
+    def _tracked_fields(self):
+        return [field for field in self._meta.concrete_fields if not field.primary_key]
+
+    def _remember(self, fields=None):
+        """Records the current values of ``fields`` (names), or of every loaded field, as saved."""
+        deferred = self.get_deferred_fields()
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._tracked_fields():
+            if field.attname in deferred:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = getattr(self, field.attname)
+
+    @property
+    def changed_fields(self) -> set:
+        """Names of the fields whose value differs from the stored one (every field if unsaved)."""
+        loaded = self.__dict__.get("_loaded_values", {})
+        deferred = self.get_deferred_fields()
+        return {
+            field.name
+            for field in self._tracked_fields()
+            if field.attname not in deferred
+            and not getattr(field, "auto_now", False)
+            and (field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname))
+        }
+
+    def has_changed(self, field_name: str) -> bool:
+        return field_name in self.changed_fields
+
+    def save(self, *args, **kwargs):
+        tracked = not (
+            args
+            or self._state.adding
+            or kwargs.get("update_fields") is not None
+            or kwargs.get("force_insert")
+            or kwargs.get("force_update")
+        )
+        if tracked:
+            changed = self.changed_fields
+            if not changed:
+                return
+            auto_now = {field.name for field in self._tracked_fields() if getattr(field, "auto_now", False)}
+            kwargs["update_fields"] = sorted(changed | auto_now)
+        super().save(*args, **kwargs)
+        self._remember(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember(fields)
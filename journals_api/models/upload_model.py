@@ -0,0 +1,73 @@
+import uuid
+
+from django.db import models
+from django.contrib.auth.models import User
+
+
+class ImageUploadJob(models.Model):
+    """
+    Tracks an image upload that is processed in the background.
+    """
+    class Status(models.TextChoices):
+        """
+        Lifecycle of an upload job.
+        """
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCEEDED = 'SUCCEEDED', 'Succeeded'
+        FAILED = 'FAILED', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner: 'User' = models.ForeignKey(User, on_delete=models.CASCADE, related_name='image_uploads')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    spool_path = models.CharField(max_length=500, blank=True)
+    digest = models.CharField(max_length=64, blank=True)
+    # True when the URL came from the digest cache without uploading again.
+    deduplicated = models.BooleanField(default=False)
+    secure_url = models.URLField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.status})"
+
+    @property
+    def markdown_code(self):
+        """Markdown snippet for the uploaded image, once it is available."""
+        if not self.secure_url:
+            return None
+        return f"![alt text]({self.secure_url})"
+
+
+class UploadedImage(models.Model):
+    """
+    Maps the SHA-256 digest of an uploaded file to the URL the upload backend
+    returned for it, so identical files are only uploaded once.
+    ``owner`` is empty for entries shared by all users.
+    """
+    digest = models.CharField(max_length=64)
+    owner: 'User' = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='uploaded_images', null=True, blank=True,
+    )
+    secure_url = models.URLField(max_length=500)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'digest'], name='uploaded_image_owner_digest_uniq'),
+            models.UniqueConstraint(
+                fields=['digest'],
+                condition=models.Q(owner__isnull=True),
+                name='uploaded_image_global_digest_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'last_used_at'], name='uploaded_image_lru_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} -> {self.secure_url}"
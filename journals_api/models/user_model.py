@@ -4,8 +4,10 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.hashers import make_password, check_password
 
+from .tracking import DirtyFieldsMixin
+
 # Create your models here.
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     """
     Represents a user profile with additional information such as streak and PIN.
     """
@@ -14,12 +16,18 @@ class UserProfile(models.Model):
     longest_streak = models.IntegerField(default=0)
     last_content_date = models.DateField(null=True, blank=True)
     pin = models.CharField(max_length=500)
+    # Bumped on every write to the user's journals; drives ETag/Last-Modified.
+    journals_version = models.PositiveBigIntegerField(default=0)
+    journals_modified_at = models.DateTimeField(null=True, blank=True)
+    # Database alias holding the user's journals; empty means 'default'.
+    # Set by journals_api.shards.
+    journal_shard = models.CharField(max_length=100, blank=True, default="")
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
     def set_pin(self, raw_pin: str):
-        """Hashes and sets the user's PIN."""
+        """Hashes, sets and saves the user's PIN."""
         self.pin = make_password(raw_pin)
         self.save()
 
@@ -38,8 +46,13 @@ class UserProfile(models.Model):
 @receiver(post_save, sender=User)
 def create_covertuser(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
+        from ..shards import place
+
+        UserProfile.objects.create(user=instance, journal_shard=place(instance.id))
         
 @receiver(post_save, sender=User)
 def save_covertuser(sender, instance, created, **kwargs):
-    instance.user_profile.save()
+    # Saves changes made through ``user.user_profile``; a profile that wasn't
+    # loaded has none, and an unchanged one isn't written.
+    if not created and User.user_profile.is_cached(instance):
+        instance.user_profile.save()
@@ -0,0 +1,169 @@
+"""
+Per-request SQL query accounting and query budgets.
+
+Every database connection gets an execute wrapper that, while a request is
+being handled, counts its queries and their total time. The stats live in a
+context variable, so queries an async view runs through ``sync_to_async``
+are counted against the request that made them.
+
+`QueryBudgetMiddleware` ties the stats to the Ninja operation that handled
+the request (set by `track_operation`, installed on both APIs) and compares
+them with the budget the operation declares with `query_budget`:
+
+    @router.get("/")
+    @query_budget(4)
+    def list_journals(request): ...
+
+Over-budget requests are logged, or raise `QueryBudgetExceeded` when
+``QUERY_BUDGET_STRICT`` is on (as in the test suite). With
+``QUERY_BUDGET_HEADERS`` (defaults to ``DEBUG``) every response carries the
+numbers in ``X-Query-Count``, ``X-Query-Budget`` and ``Server-Timing``.
+Queries made while a streaming response is consumed aren't counted.
+"""
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ATTR = "query_budget"
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.operation = None
+
+    @property
+    def operation_name(self) -> Optional[str]:
+        if self.operation is None:
+            return None
+        view_func = self.operation.view_func
+        return f"{view_func.__module__.rsplit('.', 1)[-1]}.{view_func.__name__}"
+
+    @property
+    def budget(self) -> Optional[int]:
+        if self.operation is None:
+            return None
+        return getattr(self.operation.view_func, BUDGET_ATTR, None)
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def query_budget(queries: int):
+    """Declares the most queries one request to the decorated operation may run."""
+    def decorator(view_func):
+        setattr(view_func, BUDGET_ATTR, queries)
+        return view_func
+    return decorator
+
+
+def track_operation(run):
+    """
+    Ninja "view" decorator (runs around auth and validation) that records
+    which operation is handling the request.
+    """
+    operation = getattr(run, "__self__", None)
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(request, *args, **kwargs):
+            _attach(operation)
+            return await run(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(request, *args, **kwargs):
+        _attach(operation)
+        return run(request, *args, **kwargs)
+    return wrapper
+
+
+def _attach(operation):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.operation = operation
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats: QueryStats):
+        budget = stats.budget
+        if settings.QUERY_BUDGET_HEADERS:
+            response["X-Query-Count"] = str(stats.count)
+            if budget is not None:
+                response["X-Query-Budget"] = str(budget)
+            response["Server-Timing"] = f"db;dur={stats.duration * 1000:.2f}"
+
+        logger.debug(
+            "%s %s (%s): %d queries in %.2f ms",
+            request.method, request.path, stats.operation_name, stats.count, stats.duration * 1000,
+        )
+        if budget is not None and stats.count > budget:
+            message = (
+                f"{request.method} {request.path} ({stats.operation_name}) ran "
+                f"{stats.count} queries, over its budget of {budget}."
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
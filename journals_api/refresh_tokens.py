@@ -0,0 +1,143 @@
+"""
+Refresh token rotation and blacklist upkeep.
+
+Every refresh blacklists the presented token and issues a new one, so the
+``ninja_jwt.token_blacklist`` tables gain rows on every rotation. `rotate`
+keeps a refresh cheap however large they get:
+
+* Checking the blacklist and blacklisting are one step. Inserting the
+  ``BlacklistedToken`` row claims the token, and its unique constraint
+  rejects any second use (concurrent ones included), so there is no
+  separate membership query first.
+* A per-process LRU of recently blacklisted jtis
+  (``TOKEN_BLACKLIST_CACHE_SIZE``) rejects replayed tokens without touching
+  the database. Blacklisting is permanent for the rest of a token's
+  lifetime, so a hit is always right. Entries expire with their token, and
+  the LRU is cleared when blacklist rows are deleted by hand (e.g. in the
+  admin). A miss falls through to the database.
+
+``manage.py prune_token_blacklist`` deletes expired tokens in batches over
+an index on ``expires_at``. Expired tokens are rejected before the blacklist
+is consulted, so nothing needs them.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from ninja_jwt.exceptions import TokenError
+from ninja_jwt.settings import api_settings
+from ninja_jwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from ninja_jwt.tokens import RefreshToken
+from ninja_jwt.utils import aware_utcnow, datetime_from_epoch
+
+from .authentication import tokens_for_user
+
+
+class BlacklistCache:
+    """A bounded, thread-safe LRU of blacklisted jtis, each kept until its token expires."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, jti: str, expires: float):
+        with self._lock:
+            self._entries[jti] = expires
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, jti: str) -> bool:
+        with self._lock:
+            expires = self._entries.get(jti)
+            if expires is None:
+                return False
+            if expires <= time.time():
+                del self._entries[jti]
+                return False
+            self._entries.move_to_end(jti)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+recently_blacklisted = BlacklistCache(settings.TOKEN_BLACKLIST_CACHE_SIZE)
+
+
+class _RotatingRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        # Only the in-memory front; `rotate` claims the token in the database.
+        if self.payload[api_settings.JTI_CLAIM] in recently_blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+
+def rotate(raw_token: str) -> RefreshToken:
+    """
+    Blacklists ``raw_token`` and returns a new refresh token for its user.
+
+    Raises ``TokenError`` if the token is invalid, expired or was already
+    used, and ``User.DoesNotExist`` if its user is gone.
+    """
+    token = _RotatingRefreshToken(raw_token)
+    jti = token[api_settings.JTI_CLAIM]
+    exp = token["exp"]
+
+    try:
+        with transaction.atomic():
+            outstanding, _created = OutstandingToken.objects.select_related("user").get_or_create(
+                jti=jti,
+                defaults={"token": raw_token, "expires_at": datetime_from_epoch(exp)},
+            )
+            # Fails on the unique token_id if the token was already used.
+            BlacklistedToken.objects.create(token=outstanding)
+            user = outstanding.user or User.objects.get(id=token[api_settings.USER_ID_CLAIM])
+            new_token = tokens_for_user(user)
+            transaction.on_commit(lambda: recently_blacklisted.add(jti, exp))
+    except IntegrityError:
+        recently_blacklisted.add(jti, exp)
+        raise TokenError(_("Token is blacklisted"))
+    return new_token
+
+
+def prune_expired(before: Optional[datetime] = None, batch_size: int = 10_000) -> int:
+    """
+    Deletes outstanding tokens (and their blacklist rows) that expired
+    before ``before`` (default: now). Returns how many outstanding tokens
+    were removed.
+    """
+    if before is None:
+        before = aware_utcnow()
+    expired = OutstandingToken.objects.filter(expires_at__lt=before).order_by()
+
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            # Plain DELETEs: the rows are expired, so there's nothing for the
+            # signal below to invalidate, and the ORM's cascade collector
+            # would load every row first.
+            BlacklistedToken.objects.filter(token_id__in=ids)._raw_delete(BlacklistedToken.objects.db)
+            OutstandingToken.objects.filter(id__in=ids)._raw_delete(OutstandingToken.objects.db)
+        deleted += len(ids)
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def forget_unblacklisted_tokens(sender, instance, **kwargs):
+    # Rare (manual) event; another lookup will repopulate hot entries.
+    recently_blacklisted.clear()
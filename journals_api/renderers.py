@@ -0,0 +1,32 @@
+"""
+Response renderers for the NinjaAPI instances in ``penfolio.urls``.
+
+`ORJSONRenderer` needs the optional ``orjson`` package; when it isn't
+installed it falls back to Ninja's standard JSON renderer, so it is always
+safe to configure.
+"""
+from ninja.renderers import JSONRenderer
+from ninja.responses import NinjaJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Renders responses with orjson, which serializes dicts, lists and UUIDs
+    natively. Anything else goes through Ninja's encoder, including dates and
+    times, so they keep its format (milliseconds, ``Z`` for UTC) and the
+    output matches `JSONRenderer`'s apart from whitespace.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+    def __init__(self):
+        self._default = NinjaJSONEncoder().default
+
+    def render(self, request, data, *, response_status):
+        if orjson is None:
+            return super().render(request, data, response_status=response_status)
+        return orjson.dumps(data, default=self._default, option=self.options)
@@ -0,0 +1,165 @@
+"""
+Read replica routing with read-your-writes stickiness.
+
+``DATABASE_REPLICAS`` lists the aliases in ``DATABASES`` that replicate
+``default``. `ReplicaRouter` sends reads to one of them only in operations
+marked with `replica_reads`, and only when that is safe:
+
+    @router.get("/")
+    @query_budget(4)
+    @replica_reads
+    def list_journals(request): ...
+
+* Everything else (writes, unmarked operations, management commands, reads
+  inside a transaction on ``default``) stays on ``default``.
+* One replica is picked per request, so a page and its count agree.
+* Any write made while handling a request pins its user to ``default`` for
+  ``DATABASE_REPLICA_STICKY_SECONDS``. Their next reads then see their own
+  writes even if the replicas lag. The pins live in the
+  ``DATABASE_REPLICA_CACHE_ALIAS`` cache; use a shared backend when running
+  several worker processes.
+* The authenticating user lookup is always read from ``default``.
+* With ``JOURNAL_SHARDS`` set, `journals_api.shards.ShardRouter` routes the
+  journal tables first, so only the other tables are read from replicas.
+
+`route_database` is the Ninja "view" decorator (installed on both APIs) that
+keeps the per-request state.
+"""
+import functools
+import inspect
+import random
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_READS_ATTR = "replica_reads"
+
+
+def replica_reads(view_func):
+    """Marks a read-only operation whose queries may go to a read replica."""
+    setattr(view_func, REPLICA_READS_ATTR, True)
+    return view_func
+
+
+def _cache():
+    return caches[settings.DATABASE_REPLICA_CACHE_ALIAS]
+
+
+def _pin_key(user_id) -> str:
+    return f"replica:pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Sends ``user_id``'s reads to ``default`` for the next ``DATABASE_REPLICA_STICKY_SECONDS``."""
+    _cache().set(_pin_key(user_id), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id) -> bool:
+    return bool(_cache().get(_pin_key(user_id)))
+
+
+class RoutingState:
+    def __init__(self, request, replica_reads: bool):
+        self.request = request
+        self.replica_reads = replica_reads
+        self.read_alias = None
+        self.wrote = False
+
+    def _user_id(self):
+        return getattr(getattr(self.request, "auth", None), "pk", None)
+
+    def alias_for_read(self) -> Optional[str]:
+        if not self.replica_reads or not settings.DATABASE_REPLICAS:
+            return None
+        if self.read_alias is None:
+            user_id = self._user_id()
+            if user_id is None:
+                # Still authenticating.
+                return DEFAULT_DB_ALIAS
+            if self.wrote or is_pinned(user_id):
+                self.read_alias = DEFAULT_DB_ALIAS
+            else:
+                self.read_alias = random.choice(settings.DATABASE_REPLICAS)
+        return self.read_alias
+
+    def finish(self):
+        user_id = self._user_id()
+        if self.wrote and user_id is not None and settings.DATABASE_REPLICAS:
+            pin_to_primary(user_id)
+
+
+_current_state: ContextVar[Optional[RoutingState]] = ContextVar("database_routing", default=None)
+
+
+def request_user():
+    """The user authenticated for the request being handled, if any."""
+    state = _current_state.get()
+    if state is None:
+        return None
+    return getattr(state.request, "auth", None)
+
+
+def reads_from_replica() -> bool:
+    """Whether the request being handled has read from a replica."""
+    state = _current_state.get()
+    return state is not None and state.read_alias not in (None, DEFAULT_DB_ALIAS)
+
+
+def route_database(run):
+    """
+    Ninja "view" decorator (runs around auth and validation) that lets
+    `ReplicaRouter` see the operation and its user.
+    """
+    # Through any decorators added before this one, to ``Operation.run``.
+    operation = getattr(inspect.unwrap(run), "__self__", None)
+    view_func = getattr(operation, "view_func", None)
+    marked = getattr(view_func, REPLICA_READS_ATTR, False)
+
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_wrapper(request, *args, **kwargs):
+            state = RoutingState(request, marked)
+            token = _current_state.set(state)
+            try:
+                return await run(request, *args, **kwargs)
+            finally:
+                _current_state.reset(token)
+                state.finish()
+        return async_wrapper
+
+    @functools.wraps(run)
+    def wrapper(request, *args, **kwargs):
+        state = RoutingState(request, marked)
+        token = _current_state.set(state)
+        try:
+            return run(request, *args, **kwargs)
+        finally:
+            _current_state.reset(token)
+            state.finish()
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current_state.get()
+        if state is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return state.alias_for_read()
+
+    def db_for_write(self, model, **hints):
+        state = _current_state.get()
+        if state is not None:
+            state.wrote = True
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
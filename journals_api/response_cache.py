@@ -0,0 +1,192 @@
+"""
+Per-user response cache for the profile and journal list endpoints.
+
+Responses are stored in the ``RESPONSE_CACHE_ALIAS`` cache under versioned
+keys::
+
+    response:<user id>:<namespace>:<version>:<query string hash>
+
+Each (user, namespace) pair has a version of its own. Invalidating bumps it,
+so every cached page of that user in that namespace is orphaned at once and
+expires after ``RESPONSE_CACHE_TTL`` seconds. Nothing has to be deleted.
+Versions start from the clock, so a version that was evicted never comes
+back to an old value.
+
+Writes invalidate once their transaction commits:
+
+* ``journals``: every journal write (`etags.bump_journals_version`)
+* ``profile``: streak updates (`streaks`), and saves or deletes of the user
+  or their profile that touch a field the response shows
+
+A request reading from a lagging replica doesn't store what it read (see
+`replicas`). Hits and misses are counted per namespace in the same cache
+(`stats`, ``manage.py response_cache_stats``). Set ``RESPONSE_CACHE_TTL = 0``
+to turn the cache off.
+"""
+import hashlib
+import time
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models.user_model import UserProfile
+from .replicas import reads_from_replica
+
+JOURNALS = "journals"
+PROFILE = "profile"
+NAMESPACES = (JOURNALS, PROFILE)
+# The fields the profile response shows; saves of other fields keep it.
+USER_FIELDS = frozenset({"username", "email"})
+PROFILE_FIELDS = frozenset({"current_streak", "longest_streak", "last_content_date", "pin"})
+
+
+def enabled() -> bool:
+    return settings.RESPONSE_CACHE_TTL > 0
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id, namespace: str) -> str:
+    return f"response:{user_id}:{namespace}:version"
+
+
+def _key(user_id, namespace: str, version: int, request) -> str:
+    # The query string, order-insensitive; both APIs share entries.
+    query = "&".join(f"{name}={value}" for name, values in sorted(request.GET.lists()) for value in values)
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f"response:{user_id}:{namespace}:{version}:{digest}"
+
+
+def _stats_key(namespace: str, outcome: str) -> str:
+    return f"response:stats:{namespace}:{outcome}"
+
+
+def invalidate(user_id, *namespaces: str):
+    """Orphans the user's cached responses in ``namespaces`` (default: all). Runs on commit."""
+    if not enabled():
+        return
+    namespaces = namespaces or NAMESPACES
+    transaction.on_commit(lambda: _bump(user_id, namespaces))
+
+
+def _bump(user_id, namespaces):
+    cache = _cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(user_id, namespace))
+        except ValueError:
+            # No version yet (or evicted): the next read starts a new one.
+            pass
+
+
+def _count(namespace: str, outcome: str):
+    key = _stats_key(namespace, outcome)
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def _acount(namespace: str, outcome: str):
+    key = _stats_key(namespace, outcome)
+    cache = _cache()
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def cached(request, namespace: str, build: Callable[[], Any]):
+    """Returns the cached result of ``build()`` for this user and query, building it on a miss."""
+    if not enabled():
+        return build()
+    cache = _cache()
+    user_id = request.auth.pk
+    version_key = _version_key(user_id, namespace)
+    version = cache.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key, version, None)
+    key = _key(user_id, namespace, version, request)
+
+    result = cache.get(key)
+    if result is not None:
+        _count(namespace, "hits")
+        return result
+    _count(namespace, "misses")
+    result = build()
+    if not reads_from_replica():
+        cache.set(key, result, settings.RESPONSE_CACHE_TTL)
+    return result
+
+
+async def acached(request, namespace: str, build: Callable[[], Any]):
+    """Async counterpart of `cached`; ``build`` is a coroutine function."""
+    if not enabled():
+        return await build()
+    cache = _cache()
+    user_id = request.auth.pk
+    version_key = _version_key(user_id, namespace)
+    version = await cache.aget(version_key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aset(version_key, version, None)
+    key = _key(user_id, namespace, version, request)
+
+    result = await cache.aget(key)
+    if result is not None:
+        await _acount(namespace, "hits")
+        return result
+    await _acount(namespace, "misses")
+    result = await build()
+    if not reads_from_replica():
+        await cache.aset(key, result, settings.RESPONSE_CACHE_TTL)
+    return result
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Hits, misses and hit rate per namespace, across every process sharing the cache."""
+    cache = _cache()
+    report = {}
+    for namespace in NAMESPACES:
+        hits = cache.get(_stats_key(namespace, "hits"), 0)
+        misses = cache.get(_stats_key(namespace, "misses"), 0)
+        report[namespace] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return report
+
+
+def reset_stats():
+    _cache().delete_many([_stats_key(namespace, outcome) for namespace in NAMESPACES for outcome in ("hits", "misses")])
+
+
+def _shown(update_fields, fields) -> bool:
+    # ``update_fields`` is None for full saves and deletes.
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_responses(sender, instance, update_fields=None, **kwargs):
+    if _shown(update_fields, USER_FIELDS):
+        invalidate(instance.pk, PROFILE)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_responses(sender, instance, update_fields=None, **kwargs):
+    if _shown(update_fields, PROFILE_FIELDS):
+        invalidate(instance.user_id, PROFILE)
@@ -0,0 +1,191 @@
+"""
+Daily journal rollups and the stats built on them.
+
+`JournalDailyRollup` holds one row per (owner, day, mood tag). Like
+`counters`, it is adjusted in the same transaction as every journal write,
+and ``manage.py rebuild_journal_rollups`` recomputes it after writes that
+bypass the endpoints. Days are UTC, as for streaks.
+
+The stats (`heatmap`, `mood_distribution`, `longest_gaps`) read only the
+rollups, so their cost depends on the number of active days, not entries.
+Covert journals are left out of the stats.
+"""
+import heapq
+from collections import Counter
+from datetime import date, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+
+from . import shards
+from .models.counter_model import JournalDailyRollup
+from .models.journals_model import Journal
+
+COVERT = "COVERT"
+
+
+def adjust(owner_id: int, day: date, mood_tag: str, delta: int):
+    """Adds ``delta`` to the owner's rollup for ``day`` and ``mood_tag``."""
+    if not delta:
+        return
+    rollups = JournalDailyRollup.objects.for_owner(owner_id).filter(day=day, mood_tag=mood_tag)
+    if rollups.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic(using=rollups.db):
+            rollups.create(owner_id=owner_id, day=day, mood_tag=mood_tag, count=delta)
+    except IntegrityError:
+        # Created concurrently; the row exists now.
+        rollups.update(count=F("count") + delta)
+
+
+def apply(owner_id: int, deltas: Dict[Tuple[date, str], int]):
+    """Applies ``{(day, mood_tag): delta}``, one statement per rollup row."""
+    for (day, mood_tag), delta in deltas.items():
+        adjust(owner_id, day, mood_tag, delta)
+
+
+def journals_created(owner_id: int, journals):
+    apply(owner_id, Counter((journal.date_added.date(), journal.mood_tag) for journal in journals))
+
+
+def journal_created(owner_id: int, day: date, mood_tag: str):
+    adjust(owner_id, day, mood_tag, 1)
+
+
+def journal_deleted(owner_id: int, day: date, mood_tag: str):
+    adjust(owner_id, day, mood_tag, -1)
+
+
+def journal_mood_changed(owner_id: int, day: date, old_mood_tag: str, new_mood_tag: str):
+    if old_mood_tag == new_mood_tag:
+        return
+    adjust(owner_id, day, old_mood_tag, -1)
+    adjust(owner_id, day, new_mood_tag, 1)
+
+
+def rebuild(owner_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes rollups from the journal table, for the given owners or for
+    everyone, on each owner's shard. Returns the number of rollup rows written.
+    """
+    written = 0
+    for alias, ids in shards.partition(owner_ids):
+        journals = Journal.objects.using(alias)
+        rollups = JournalDailyRollup.objects.using(alias)
+        if ids is not None:
+            journals = journals.filter(owner_id__in=ids)
+            rollups = rollups.filter(owner_id__in=ids)
+
+        rows = [
+            JournalDailyRollup(owner_id=row["owner_id"], day=row["day"], mood_tag=row["mood_tag"], count=row["count"])
+            for row in (
+                journals.order_by()
+                .annotate(day=TruncDate("date_added", tzinfo=dt_timezone.utc))
+                .values("owner_id", "day", "mood_tag")
+                .annotate(count=Count("id"))
+            )
+        ]
+        with transaction.atomic(using=alias):
+            rollups.delete()
+            JournalDailyRollup.objects.using(alias).bulk_create(rows, batch_size=1000)
+        written += len(rows)
+    return written
+
+
+def _rollups_for(owner, start: Optional[date] = None, end: Optional[date] = None):
+    rollups = JournalDailyRollup.objects.for_owner(owner).filter(count__gt=0).exclude(mood_tag=COVERT)
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lte=end)
+    return rollups.order_by()
+
+
+def _heatmap_rows(owner, year: int):
+    return (
+        _rollups_for(owner, date(year, 1, 1), date(year, 12, 31))
+        .values("day")
+        .annotate(count=Sum("count"))
+        .order_by("day")
+    )
+
+
+def _heatmap(year: int, rows) -> Dict[str, Any]:
+    days = [{"day": row["day"], "count": row["count"]} for row in rows]
+    return {"year": year, "days": days, "total": sum(day["count"] for day in days)}
+
+
+def heatmap(owner, year: int) -> Dict[str, Any]:
+    """Entries per active day of ``year``; days without entries are omitted."""
+    return _heatmap(year, _heatmap_rows(owner, year))
+
+
+async def aheatmap(owner, year: int) -> Dict[str, Any]:
+    """Async counterpart of `heatmap`."""
+    return _heatmap(year, [row async for row in _heatmap_rows(owner, year)])
+
+
+def _mood_rows(owner, start: Optional[date], end: Optional[date]):
+    return (
+        _rollups_for(owner, start, end)
+        .annotate(month=TruncMonth("day"))
+        .values("month", "mood_tag")
+        .annotate(count=Sum("count"))
+        .order_by("month", "mood_tag")
+    )
+
+
+def _mood_distribution(start: Optional[date], end: Optional[date], rows) -> Dict[str, Any]:
+    totals = Counter()
+    months: Dict[date, Dict[str, int]] = {}
+    for row in rows:
+        totals[row["mood_tag"]] += row["count"]
+        months.setdefault(row["month"], {})[row["mood_tag"]] = row["count"]
+    return {
+        "start": start,
+        "end": end,
+        "totals": dict(totals),
+        "months": [{"month": month, "counts": counts} for month, counts in months.items()],
+    }
+
+
+def mood_distribution(owner, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """Entries per mood over ``start``..``end`` (inclusive), in total and per month."""
+    return _mood_distribution(start, end, _mood_rows(owner, start, end))
+
+
+async def amood_distribution(owner, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """Async counterpart of `mood_distribution`."""
+    return _mood_distribution(start, end, [row async for row in _mood_rows(owner, start, end)])
+
+
+def _active_days(owner):
+    return _rollups_for(owner).values_list("day", flat=True).distinct().order_by("day")
+
+
+def _longest_gaps(days: Iterable[date], limit: int) -> Dict[str, Any]:
+    def gaps():
+        previous = None
+        for day in days:
+            if previous is not None and day - previous > timedelta(days=1):
+                yield {
+                    "start": previous + timedelta(days=1),
+                    "end": day - timedelta(days=1),
+                    "days": (day - previous).days - 1,
+                }
+            previous = day
+
+    return {"gaps": heapq.nlargest(limit, gaps(), key=lambda gap: (gap["days"], gap["start"]))}
+
+
+def longest_gaps(owner, limit: int) -> Dict[str, Any]:
+    """The ``limit`` longest runs of days without entries between two active days."""
+    return _longest_gaps(_active_days(owner).iterator(), limit)
+
+
+async def alongest_gaps(owner, limit: int) -> Dict[str, Any]:
+    """Async counterpart of `longest_gaps`."""
+    return _longest_gaps([day async for day in _active_days(owner)], limit)
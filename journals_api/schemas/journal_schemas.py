@@ -1,8 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
-from typing import Generic, List, Optional, TypeVar
+from typing import Dict, Generic, List, Optional, TypeVar
+from uuid import UUID
 
 from ninja import Schema
+from pydantic import Field
 
 # This creates a generic Type Variable. It can be any type.
 T = TypeVar('T')
@@ -13,7 +15,8 @@ class PaginatedResponse(Schema, Generic[T]):
     Describes the inner 'data' object in your response.
     """
     items: List[T]
-    count: int
+    count: Optional[int] = None # Not computed in cursor mode
+    next_cursor: Optional[str] = None
 
 # === Input Schemas ===
 class JournalCreateSchema(Schema):
@@ -29,6 +32,12 @@ class JournalCreateSchema(Schema):
     content: str
     mood_tag: MoodTag
 
+class JournalImportSchema(JournalCreateSchema):
+    """
+    Schema for an imported journal entry; keeps the original date when given.
+    """
+    date_added: Optional[datetime] = None
+
 class JournalUpdateSchema(Schema):
     """
     Schema for updating a journal entry.
@@ -37,6 +46,30 @@ class JournalUpdateSchema(Schema):
     content: Optional[str] = None
     mood_tag: Optional[str] = None
 
+class JournalBulkUpdateItemSchema(JournalUpdateSchema):
+    """
+    Schema for one entry of a bulk update.
+    """
+    id: int
+
+class JournalBulkCreateSchema(Schema):
+    """
+    Schema for creating several journal entries at once.
+    """
+    items: List[JournalCreateSchema] = Field(..., min_length=1)
+
+class JournalBulkUpdateSchema(Schema):
+    """
+    Schema for updating several journal entries at once.
+    """
+    items: List[JournalBulkUpdateItemSchema] = Field(..., min_length=1)
+
+class JournalBulkDeleteSchema(Schema):
+    """
+    Schema for deleting several journal entries at once.
+    """
+    ids: List[int] = Field(..., min_length=1)
+
 class TweetInspoSchema(Schema):
     """
     Schema for tweet inspiration.
@@ -55,18 +88,169 @@ class JournalOutSchema(Schema):
     mood_tag: str
     is_covert: bool # A flag for the frontend
 
+class JournalListItemSchema(Schema):
+    """
+    Schema for a journal in a listing. Listings can project fields
+    (``fields=``/``view=summary``), so only the selected ones are present;
+    excerpt and content_length are the summary view's stand-ins for content.
+    """
+    id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+    excerpt: Optional[str] = None
+    content_length: Optional[int] = None
+    date_added: datetime
+    mood_tag: Optional[str] = None
+    is_covert: Optional[bool] = None
+
+class JournalSyncSchema(Schema):
+    """
+    Schema for a delta sync page. Covert journals come without content.
+    """
+    upserts: List[JournalOutSchema]
+    deletions: List[int]
+    next_since: str
+    has_more: bool
+
+class CovertUnlockSchema(Schema):
+    """
+    Schema for a covert unlock token.
+    """
+    unlock_token: str
+    expires_in: int # Seconds
+
+class JournalSearchResultSchema(Schema):
+    """
+    Schema for a ranked search hit. Carries a highlighted snippet instead of
+    the full content.
+    """
+    id: int
+    title: str
+    highlighted_title: str # Escaped HTML, matches wrapped in <mark>
+    snippet: str # Escaped HTML, matches wrapped in <mark>
+    date_added: datetime
+    mood_tag: str
+    is_covert: bool = False # Covert journals are never searched
+    rank: float
+
+class BulkItemResultSchema(Schema):
+    """
+    Schema for the outcome of one entry of a bulk request.
+    index is the entry's position in the request.
+    """
+    index: int
+    id: Optional[int] = None
+    status: str # created, updated, deleted, not_found or error
+    error: Optional[str] = None
+    journal: Optional[JournalOutSchema] = None
+
+class BulkResultSchema(Schema):
+    """
+    Schema for a bulk request's per-entry results.
+    """
+    results: List[BulkItemResultSchema]
+    succeeded: int
+    failed: int
+
 class TweetUrlSchema(Schema):
     """
     Schema for tweet URL.
     """
     tweet_url: str
 
-class ImageUploadOutSchema(Schema):
+class ImageUploadJobSchema(Schema):
+    """
+    Schema for a background image upload job.
+    image_url and markdown_code are set once the status is SUCCEEDED.
+    """
+    job_id: UUID
+    status: str
+    image_url: Optional[str] = None
+    markdown_code: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int
+
+    @staticmethod
+    def resolve_job_id(obj):
+        return obj.id
+
+    @staticmethod
+    def resolve_image_url(obj):
+        return obj.secure_url or None
+
+    @staticmethod
+    def resolve_error(obj):
+        return obj.error or None
+
+class ImportErrorSchema(Schema):
+    """
+    Schema for a record an import rejected.
+    """
+    index: int
+    source: str # Line number or file name in the archive
+    error: str
+
+class ImportResultSchema(Schema):
+    """
+    Schema for the outcome of a journal import.
+    """
+    created: int
+    failed: int
+    errors: List[ImportErrorSchema]
+    errors_truncated: bool
+
+class HeatmapDaySchema(Schema):
+    """
+    Schema for one day of a journaling heatmap.
+    """
+    day: date
+    count: int
+
+class HeatmapSchema(Schema):
+    """
+    Schema for a yearly journaling heatmap. Only days with entries are listed.
+    """
+    year: int
+    days: List[HeatmapDaySchema]
+    total: int
+
+class MoodMonthSchema(Schema):
+    """
+    Schema for one month of a mood distribution.
+    """
+    month: date # First day of the month
+    counts: Dict[str, int]
+
+class MoodDistributionSchema(Schema):
+    """
+    Schema for entries per mood over a date range, in total and per month.
+    """
+    start: Optional[date] = None
+    end: Optional[date] = None
+    totals: Dict[str, int]
+    months: List[MoodMonthSchema]
+
+class GapSchema(Schema):
+    """
+    Schema for a run of days without entries.
+    """
+    start: date
+    end: date
+    days: int
+
+class GapsSchema(Schema):
+    """
+    Schema for the longest gaps between entries, longest first.
+    """
+    gaps: List[GapSchema]
+
+class ImageUploadStatsSchema(Schema):
     """
-    Schema for image upload output.
+    Schema for image upload deduplication stats.
     """
-    image_url: str
-    markdown_code: str
+    uploads: int
+    deduplicated: int
+    hit_rate: float
 
 class ErrorSchema(Schema):
     """
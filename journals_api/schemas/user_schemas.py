@@ -1,6 +1,6 @@
 
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional
 
 from ninja import Schema
 from pydantic import EmailStr, field_validator
@@ -65,6 +65,22 @@ class PinSchema(Schema):
     """
     pin: str
 
+class CovertAccessSchema(Schema):
+    """
+    Schema for covert access: either the PIN or an unlock token from
+    /journals/covert/unlock.
+    """
+    pin: Optional[str] = None
+    unlock_token: Optional[str] = None
+
+class JournalExportSchema(CovertAccessSchema):
+    """
+    Schema for a journal export. Covert journals are included only when
+    asked for, with the PIN or an unlock token.
+    """
+    format: Literal["ndjson", "zip"] = "ndjson"
+    include_covert: bool = False
+
 class PasswordResetRequestSchema(Schema):
     """
     Schema for password reset request.
@@ -0,0 +1,227 @@
+"""
+Indexed full-text search over journal titles and content.
+
+SQLite uses an FTS5 external-content table that mirrors ``journals_api_journal``
+and is kept in sync by triggers, so every write path (including bulk ones) is
+covered. PostgreSQL uses a GIN index over a weighted ``tsvector`` expression.
+Other backends fall back to an unranked ``icontains`` scan. The index itself
+is defined in `search_index`.
+
+Highlighted titles and snippets are HTML: the journal text is escaped and
+only the ``<mark>`` tags around matches are markup.
+"""
+import html
+import re
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, List, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models.journals_model import Journal
+from .search_index import FTS_TABLE, POSTGRES_SEARCH_VECTOR
+
+JOURNAL_TABLE = Journal._meta.db_table
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# The database marks matches with these (private use) characters; `_markup`
+# turns them into tags once the text around them is escaped.
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+_MATCH_DELIMITERS = re.compile(f"([{MATCH_START}{MATCH_END}])")
+SNIPPET_WORDS = 24
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query)
+
+
+def _markup(text: str) -> str:
+    """
+    Escapes ``text`` and turns the match delimiters in it into ``<mark>`` tags.
+    Delimiters that came from the journal itself can't unbalance the tags.
+    """
+    parts, marking = [], False
+    for part in _MATCH_DELIMITERS.split(text):
+        if part == MATCH_START:
+            if not marking:
+                parts.append(HIGHLIGHT_START)
+            marking = True
+        elif part == MATCH_END:
+            if marking:
+                parts.append(HIGHLIGHT_END)
+            marking = False
+        else:
+            parts.append(html.escape(part))
+    if marking:
+        parts.append(HIGHLIGHT_END)
+    return "".join(parts)
+
+
+def search_journals(user, query: str, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Returns one page of ranked, non-covert matches for ``user`` and the total
+    number of matches. Each item carries a highlighted title and a content
+    snippet instead of the full content.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+
+    queries = _queries(_vendor(user.id), user.id, terms, offset, limit)
+    if queries is None:
+        return _search_fallback(user, terms, offset, limit)
+    (items_sql, items_params), (count_sql, count_params), finish = queries
+    items = _fetch(user.id, items_sql, items_params)
+    count = _fetch(user.id, count_sql, count_params)[0]["count"]
+    return finish(items), count
+
+
+async def asearch_journals(user, query: str, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Async counterpart of `search_journals`. Each raw query runs on the ORM's sync thread, as ORM queries do."""
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+
+    queries = _queries(await sync_to_async(_vendor)(user.id), user.id, terms, offset, limit)
+    if queries is None:
+        return await _asearch_fallback(user, terms, offset, limit)
+    (items_sql, items_params), (count_sql, count_params), finish = queries
+    items = await sync_to_async(_fetch)(user.id, items_sql, items_params)
+    count = (await sync_to_async(_fetch)(user.id, count_sql, count_params))[0]["count"]
+    return finish(items), count
+
+
+def _connection(owner_id: int):
+    # Raw SQL bypasses the router; ask it where the owner's journals are read from.
+    return connections[router.db_for_read(Journal, owner=owner_id)]
+
+
+def _vendor(owner_id: int) -> str:
+    return _connection(owner_id).vendor
+
+
+def _fetch(owner_id: int, sql: str, params: list) -> List[Dict[str, Any]]:
+    with _connection(owner_id).cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _queries(vendor: str, owner_id: int, terms: List[str], offset: int, limit: int):
+    """
+    ``((items sql, params), (count sql, params), finish)`` for an indexed
+    search on ``vendor``, where ``finish`` post-processes the fetched items;
+    None when the backend has no index.
+    """
+    if vendor == "sqlite":
+        return _sqlite_queries(owner_id, terms, offset, limit)
+    if vendor == "postgresql":
+        return _postgres_queries(owner_id, terms, offset, limit)
+    return None
+
+
+def _sqlite_queries(owner_id: int, terms: List[str], offset: int, limit: int):
+    # Quote every term (so user input can't inject FTS syntax) and prefix
+    # match it, which suits search-as-you-type. Scoping the match to the
+    # owner_id column keeps the candidate set to the user's own rows.
+    phrase = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    match = f'{{title content}} : ({phrase}) AND owner_id : "{int(owner_id)}"'
+    where = (
+        f"FROM {FTS_TABLE} JOIN {JOURNAL_TABLE} j ON j.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND j.owner_id = %s AND j.mood_tag != 'COVERT'"
+    )
+    items = (
+        f"SELECT j.id, j.title, j.date_added, j.mood_tag, "
+        f"highlight({FTS_TABLE}, 0, %s, %s) AS highlighted_title, "
+        f"snippet({FTS_TABLE}, 1, %s, %s, '…', {SNIPPET_WORDS}) AS snippet, "
+        f"bm25({FTS_TABLE}, 10.0, 1.0, 0.0) AS rank "
+        f"{where} ORDER BY rank LIMIT %s OFFSET %s",
+        [MATCH_START, MATCH_END, MATCH_START, MATCH_END,
+         match, owner_id, limit, offset],
+    )
+    count = (f"SELECT COUNT(*) AS count {where}", [match, owner_id])
+
+    def finish(items):
+        for item in items:
+            # bm25() is "lower is better"; expose it as "higher is better".
+            item["rank"] = -item["rank"]
+            item["date_added"] = _aware(item["date_added"])
+            item["highlighted_title"] = _markup(item["highlighted_title"])
+            item["snippet"] = _markup(item["snippet"])
+        return items
+
+    return items, count, finish
+
+
+def _aware(value):
+    # Raw SQLite rows come back as naive UTC datetimes (or strings).
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def _postgres_queries(owner_id: int, terms: List[str], offset: int, limit: int):
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+    options = f'StartSel="{MATCH_START}", StopSel="{MATCH_END}"'
+    where = (
+        f"FROM {JOURNAL_TABLE} j, to_tsquery('english', %s) query "
+        f"WHERE ({POSTGRES_SEARCH_VECTOR}) @@ query "
+        f"AND j.owner_id = %s AND j.mood_tag <> 'COVERT'"
+    )
+    items = (
+        f"SELECT j.id, j.title, j.date_added, j.mood_tag, "
+        f"ts_headline('english', j.title, query, %s) AS highlighted_title, "
+        f"ts_headline('english', j.content, query, %s) AS snippet, "
+        f"ts_rank(({POSTGRES_SEARCH_VECTOR}), query) AS rank "
+        f"{where} ORDER BY rank DESC, j.id DESC LIMIT %s OFFSET %s",
+        [f"{options}, HighlightAll=true", f"{options}, MaxWords={SNIPPET_WORDS}, MinWords=8",
+         tsquery, owner_id, limit, offset],
+    )
+    count = (f"SELECT COUNT(*) AS count {where}", [tsquery, owner_id])
+
+    def finish(items):
+        for item in items:
+            item["highlighted_title"] = _markup(item["highlighted_title"])
+            item["snippet"] = _markup(item["snippet"])
+        return items
+
+    return items, count, finish
+
+
+def _fallback_queryset(user, terms: List[str]):
+    queryset = Journal.objects.for_owner(user).exclude(mood_tag="COVERT")
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+    return queryset.order_by("-date_added", "-id")
+
+
+def _fallback_item(journal) -> Dict[str, Any]:
+    return {
+        "id": journal.id,
+        "title": journal.title,
+        "date_added": journal.date_added,
+        "mood_tag": journal.mood_tag,
+        "highlighted_title": html.escape(journal.title),
+        "snippet": html.escape(" ".join(journal.content.split()[:SNIPPET_WORDS])),
+        "rank": 0.0,
+    }
+
+
+def _search_fallback(user, terms: List[str], offset: int, limit: int):
+    queryset = _fallback_queryset(user, terms)
+    items = [_fallback_item(journal) for journal in queryset[offset:offset + limit]]
+    return items, queryset.count()
+
+
+async def _asearch_fallback(user, terms: List[str], offset: int, limit: int):
+    queryset = _fallback_queryset(user, terms)
+    items = [_fallback_item(journal) async for journal in queryset[offset:offset + limit]]
+    return items, await queryset.acount()
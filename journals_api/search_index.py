@@ -0,0 +1,91 @@
+"""
+Schema of the full-text search index (see `journals_api.search`).
+
+SQLite keeps an FTS5 external-content table in step with the journal table
+through triggers. SQLite drops a table's triggers whenever a migration
+rebuilds it (most field changes do), so migration 0003 creates the triggers
+and `reinstall_triggers` recreates any missing ones after every ``migrate``.
+Migrations that rebuild the journal table and then write journals in the
+same run should also reinstall them right away. PostgreSQL uses a GIN index
+over a weighted ``tsvector`` expression.
+
+The migrations import the SQL from here, so there is one definition.
+"""
+from django.db import connections
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+FTS_TABLE = "journals_api_journal_fts"
+
+SQLITE_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, content, owner_id, content='journals_api_journal', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+SQLITE_FTS_TRIGGERS = {
+    "journals_api_journal_fts_ai": f"""
+    CREATE TRIGGER IF NOT EXISTS journals_api_journal_fts_ai
+    AFTER INSERT ON journals_api_journal BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content, owner_id)
+        VALUES (new.id, new.title, new.content, new.owner_id);
+    END
+    """,
+    "journals_api_journal_fts_ad": f"""
+    CREATE TRIGGER IF NOT EXISTS journals_api_journal_fts_ad
+    AFTER DELETE ON journals_api_journal BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, owner_id)
+        VALUES ('delete', old.id, old.title, old.content, old.owner_id);
+    END
+    """,
+    # Mood or date changes don't touch the index.
+    "journals_api_journal_fts_au": f"""
+    CREATE TRIGGER IF NOT EXISTS journals_api_journal_fts_au
+    AFTER UPDATE OF title, content, owner_id ON journals_api_journal BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content, owner_id)
+        VALUES ('delete', old.id, old.title, old.content, old.owner_id);
+        INSERT INTO {FTS_TABLE}(rowid, title, content, owner_id)
+        VALUES (new.id, new.title, new.content, new.owner_id);
+    END
+    """,
+}
+
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+)
+POSTGRES_SEARCH_INDEX = (
+    "CREATE INDEX IF NOT EXISTS journals_api_journal_search_idx ON journals_api_journal "
+    f"USING GIN (({POSTGRES_SEARCH_VECTOR}))"
+)
+
+
+def missing_triggers(connection) -> list:
+    """Names of the search triggers missing on a SQLite ``connection`` that has the index."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name = %s OR type = 'trigger'", [FTS_TABLE])
+        found = {(kind, name) for kind, name in cursor.fetchall()}
+    if ("table", FTS_TABLE) not in found:
+        # Migrated to before 0003: there is no index to keep up.
+        return []
+    return [name for name in SQLITE_FTS_TRIGGERS if ("trigger", name) not in found]
+
+
+def reinstall_triggers(connection) -> list:
+    """Recreates the missing search triggers on ``connection``; returns their names."""
+    if connection.vendor != "sqlite":
+        return []
+    missing = missing_triggers(connection)
+    if missing:
+        with connection.cursor() as cursor:
+            for name in missing:
+                cursor.execute(SQLITE_FTS_TRIGGERS[name])
+            # Writes made without the triggers never reached the index.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return missing
+
+
+@receiver(post_migrate)
+def _reinstall_triggers(sender, using="default", **kwargs):
+    if sender.name == "journals_api":
+        reinstall_triggers(connections[using])
@@ -0,0 +1,258 @@
+"""
+Owner-based sharding of journal storage.
+
+``JOURNAL_SHARDS`` lists the aliases in ``DATABASES`` that hold journals. A
+user's journals live on one database together with the rows derived from
+them (counters, daily rollups, sync tombstones; the "sharded models"),
+recorded in ``UserProfile.journal_shard``. Users, profiles, tokens and
+uploads stay on ``default``. New users are placed by id (`place`); users
+from before sharding keep their journals on ``default`` until
+``manage.py rebalance_journal_shards`` moves them (`move_owner`).
+
+`ShardRouter` sends each query on a sharded model to its owner's database,
+so a single user's queries touch exactly one shard. The owner comes from:
+
+* an ``owner`` hint, set by ``Model.objects.for_owner(owner)``, which the
+  journal endpoints use;
+* a model instance hint (a loaded row keeps its database, a user's related
+  managers use the user's shard).
+
+With sharding on, a query that gives neither raises `ShardRoutingError`
+rather than guessing. Queries across owners (e.g. in management commands)
+pick a database with ``using()``; loop over `databases` (or `partition`) to
+cover every shard. Journal writes
+use `atomic`: one transaction on the shard, one on ``default`` for the
+profile (ETag version, streak). They commit one after the other, not
+atomically. If the second commit fails, the version and streak lag until
+the next write or a recompute. The shard's transaction also adds two
+statements (BEGIN, COMMIT) on top of the operations' query budgets.
+
+The owner foreign keys of the sharded models have no database constraints,
+since a user may live on another database than their rows; Django's
+``on_delete`` handling still cascades deletes.
+
+Journal ids stay unique across shards: `reserve_id_range` (run after
+``migrate``) starts each shard's ids at its own block, so a user's journals
+keep their ids when they move.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_migrate, pre_delete
+from django.dispatch import receiver
+
+from .models.counter_model import JournalCounter, JournalDailyRollup
+from .models.journals_model import Journal, JournalTombstone
+from .authentication import cached_user
+from .models.user_model import UserProfile
+
+SHARDED_MODELS = (Journal, JournalTombstone, JournalCounter, JournalDailyRollup)
+# Ids a shard may hand out before running into the next shard's range.
+ID_BLOCK = 10**12
+
+
+class ShardRoutingError(RuntimeError):
+    """A query on a sharded model named no owner to route it by."""
+
+
+def enabled() -> bool:
+    return bool(settings.JOURNAL_SHARDS)
+
+
+def databases() -> List[str]:
+    """Every database that can hold journals: ``default`` and the shards."""
+    return [DEFAULT_DB_ALIAS] + [alias for alias in settings.JOURNAL_SHARDS if alias != DEFAULT_DB_ALIAS]
+
+
+def place(user_id: int) -> str:
+    """The shard a user's journals belong on, or ``""`` (``default``) when sharding is off."""
+    if not enabled():
+        return ""
+    return settings.JOURNAL_SHARDS[user_id % len(settings.JOURNAL_SHARDS)]
+
+
+def _profile_shard(user) -> str:
+    try:
+        return user.user_profile.journal_shard or DEFAULT_DB_ALIAS
+    except UserProfile.DoesNotExist:
+        return DEFAULT_DB_ALIAS
+
+
+def shard_for(owner) -> str:
+    """The database holding the journals of ``owner`` (a user or user id)."""
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    if isinstance(owner, User):
+        return _profile_shard(owner)
+    # Users authenticated recently are cached with their profile; anyone else
+    # costs a query.
+    user = cached_user(owner)
+    if user is not None:
+        return _profile_shard(user)
+    shard = UserProfile.objects.filter(user_id=owner).values_list("journal_shard", flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def group_by_shard(owner_ids: Iterable[int]) -> Dict[str, List[int]]:
+    """``{alias: [owner ids]}`` for the given owners."""
+    owner_ids = list(owner_ids)
+    if not enabled():
+        return {DEFAULT_DB_ALIAS: owner_ids} if owner_ids else {}
+    if len(owner_ids) == 1:
+        return {shard_for(owner_ids[0]): owner_ids}
+    groups = defaultdict(list)
+    placed = UserProfile.objects.filter(user_id__in=owner_ids).values_list("user_id", "journal_shard")
+    shards = dict(placed)
+    for owner_id in owner_ids:
+        groups[shards.get(owner_id) or DEFAULT_DB_ALIAS].append(owner_id)
+    return dict(groups)
+
+
+def partition(owner_ids: Optional[Iterable[int]] = None):
+    """
+    ``(alias, owner ids)`` pairs covering the given owners, or
+    ``(alias, None)`` for every database when ``owner_ids`` is None.
+    """
+    if owner_ids is None:
+        return [(alias, None) for alias in databases()]
+    return list(group_by_shard(owner_ids).items())
+
+
+@contextmanager
+def atomic(owner):
+    """A transaction for a journal write: on ``default`` and, if elsewhere, the owner's shard."""
+    alias = shard_for(owner)
+    with transaction.atomic():
+        if alias == DEFAULT_DB_ALIAS:
+            yield
+        else:
+            with transaction.atomic(using=alias):
+                yield
+
+
+def _copy(queryset, target: str, keep_ids: bool, dates=()) -> int:
+    rows = list(queryset)
+    values = [[getattr(row, field) for field in dates] for row in rows]
+    if not keep_ids:
+        for row in rows:
+            row.pk = None
+    manager = queryset.model.objects.db_manager(target)
+    manager.bulk_create(rows, batch_size=1000)
+    if dates and rows:
+        # bulk_create overwrites auto_now(_add) fields; put the originals back.
+        for row, row_values in zip(rows, values):
+            for field, value in zip(dates, row_values):
+                setattr(row, field, value)
+        manager.bulk_update(rows, list(dates), batch_size=1000)
+    return len(rows)
+
+
+def move_owner(owner_id: int, target: str) -> int:
+    """
+    Moves a user's journals and derived rows to ``target`` and records the
+    new shard. Journals keep their ids. Returns the number of journals moved.
+
+    Runs in one transaction per database; a failed move leaves the user on
+    their current shard and can simply be repeated.
+    """
+    profile = UserProfile.objects.get(user_id=owner_id)
+    source = profile.journal_shard or DEFAULT_DB_ALIAS
+    if source == target:
+        return 0
+
+    with transaction.atomic(), transaction.atomic(using=source), transaction.atomic(using=target):
+        for model in SHARDED_MODELS:
+            # Leftovers of an earlier, interrupted move.
+            model.objects.using(target).filter(owner_id=owner_id).delete()
+        moved = _copy(Journal.objects.using(source).filter(owner_id=owner_id), target, True,
+                      ("date_added", "updated_at"))
+        _copy(JournalTombstone.objects.using(source).filter(owner_id=owner_id), target, False, ("deleted_at",))
+        _copy(JournalCounter.objects.using(source).filter(owner_id=owner_id), target, False)
+        _copy(JournalDailyRollup.objects.using(source).filter(owner_id=owner_id), target, False)
+        for model in SHARDED_MODELS:
+            model.objects.using(source).filter(owner_id=owner_id).delete()
+        profile.journal_shard = "" if target == DEFAULT_DB_ALIAS else target
+        # Also drops the cached user, whose profile names the old shard.
+        profile.save(update_fields=["journal_shard"])
+    return moved
+
+
+def reserve_id_range(alias: str):
+    """
+    Starts journal ids on shard ``alias`` at its own block: the n-th entry
+    of ``JOURNAL_SHARDS`` (from 1) hands out ids above ``n * ID_BLOCK``.
+    ``default`` keeps the ids from 1. Supports SQLite and PostgreSQL.
+    """
+    if alias == DEFAULT_DB_ALIAS or alias not in settings.JOURNAL_SHARDS:
+        return
+    start = (settings.JOURNAL_SHARDS.index(alias) + 1) * ID_BLOCK
+    table = Journal._meta.db_table
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [start, table])
+            if not cursor.rowcount:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {table})))",
+                [table, start],
+            )
+
+
+@receiver(post_migrate)
+def _reserve_id_range(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender.name == "journals_api":
+        reserve_id_range(using)
+
+
+def _delete_owner_rows(alias: str, owner_id: int):
+    for model in SHARDED_MODELS:
+        model.objects.using(alias).filter(owner_id=owner_id).delete()
+
+
+@receiver(pre_delete, sender=User)
+def _delete_sharded_rows(sender, instance, using, **kwargs):
+    # The cascade only reaches rows on the user's own database.
+    alias = shard_for(instance)
+    if alias != using:
+        transaction.on_commit(lambda: _delete_owner_rows(alias, instance.pk), using=using)
+
+
+class ShardRouter:
+    """Routes the sharded models to their owner's database (see module docstring)."""
+
+    def _route(self, model, hints):
+        if not enabled():
+            return None
+        instance = hints.get("instance")
+        if model not in SHARDED_MODELS:
+            # e.g. ``journal.owner``: users live on default.
+            if isinstance(instance, SHARDED_MODELS):
+                return DEFAULT_DB_ALIAS
+            return None
+        if "owner" in hints:
+            return shard_for(hints["owner"])
+        if isinstance(instance, SHARDED_MODELS):
+            return instance._state.db or shard_for(instance.owner_id)
+        if isinstance(instance, User):
+            return shard_for(instance)
+        raise ShardRoutingError(
+            f"Query on {model.__name__} without an owner: use {model.__name__}.objects.for_owner(owner), "
+            "or using() to pick a shard."
+        )
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if enabled() and {obj1._state.db, obj2._state.db} <= set(databases()):
+            return True
+        return None
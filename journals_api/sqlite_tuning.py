@@ -0,0 +1,68 @@
+"""
+SQLite connection tuning.
+
+With ``SQLITE_TUNING`` on, every new SQLite connection gets the PRAGMAs in
+``SQLITE_PRAGMAS``:
+
+    journal_mode=WAL      readers see the last commit while a writer works,
+                          instead of waiting on its lock
+    synchronous=NORMAL    with WAL, fsync at checkpoints rather than on
+                          every commit (durable against crashes of the app;
+                          a power loss can drop the last commits)
+    mmap_size             read pages through a memory map
+    cache_size            page cache per connection (negative: KiB)
+    busy_timeout          how long (ms) a connection waits for a lock
+                          before failing with "database is locked"
+
+A busy timeout can't help a transaction that read first and then tries to
+write after another connection committed. SQLite fails that one right away
+to protect its snapshot. That is why ``DATABASES`` also sets
+``"transaction_mode": "IMMEDIATE"``: every ``atomic()`` block takes the write
+lock when it begins, so writers queue behind each other.
+
+Tuning is off by default: ``journal_mode`` is stored in the database file,
+so it would also switch the development database tracked in the repository.
+Other backends are left alone.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_NAME = re.compile(r"^[a-z_]+$")
+_WORD = re.compile(r"^[A-Za-z]+$")
+
+
+def pragma_statements(pragmas) -> list:
+    """``PRAGMA name = value`` statements for ``{name: value}``, validated."""
+    statements = []
+    for name, value in pragmas.items():
+        if not _NAME.match(name):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS: invalid PRAGMA name {name!r}.")
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS[{name!r}] must be an integer or a word.")
+        if isinstance(value, str) and not _WORD.match(value):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS[{name!r}]: invalid value {value!r}.")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+def current_pragmas(connection, names) -> dict:
+    """Reads the given PRAGMAs back from ``connection``."""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            values[name] = cursor.fetchone()[0]
+        return values
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if not settings.SQLITE_TUNING or connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
@@ -0,0 +1,174 @@
+"""
+Journaling streaks.
+
+A streak is a run of consecutive days (UTC) with at least one journal.
+`compute_streaks` derives ``current_streak``, ``longest_streak`` and
+``last_content_date`` from the distinct entry days with one gaps-and-islands
+query: numbering a user's days in order and subtracting that number from the
+day gives the same value for every day of a run, so grouping by it yields the
+runs. ``current_streak`` is the length of the latest run, as before.
+
+New entries move the streak forward with `record_activity`, a single UPDATE
+built from ``F()`` expressions, so concurrent creates can't lose an increment.
+Changes that can shorten or split a run (deletes, imports of older entries)
+recompute the user's streak from scratch.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from . import response_cache, shards
+from .authentication import invalidate_cached_user
+from .models.journals_model import Journal
+from .models.user_model import UserProfile
+
+JOURNAL_TABLE = Journal._meta.db_table
+STREAK_FIELDS = ["current_streak", "longest_streak", "last_content_date"]
+
+# (current_streak, longest_streak, last_content_date)
+Streak = Tuple[int, int, Optional[date]]
+NO_STREAK: Streak = (0, 0, None)
+
+_DAY_SQL = {
+    "sqlite": "date(date_added)",
+    "postgresql": "(date_added AT TIME ZONE 'UTC')::date",
+}
+_ISLAND_SQL = {
+    "sqlite": "julianday(day) - ROW_NUMBER() OVER (PARTITION BY owner_id ORDER BY day)",
+    "postgresql": "day - (ROW_NUMBER() OVER (PARTITION BY owner_id ORDER BY day))::int",
+}
+_STREAKS_SQL = """
+WITH days AS (
+    SELECT DISTINCT owner_id, {day} AS day
+    FROM {table}
+    WHERE owner_id IN ({owners})
+),
+islands AS (
+    SELECT owner_id, day, {island} AS island
+    FROM days
+),
+runs AS (
+    SELECT owner_id, COUNT(*) AS length, MAX(day) AS last_day,
+           ROW_NUMBER() OVER (PARTITION BY owner_id ORDER BY MAX(day) DESC) AS recency
+    FROM islands
+    GROUP BY owner_id, island
+)
+SELECT owner_id,
+       MAX(CASE WHEN recency = 1 THEN length END) AS current_streak,
+       MAX(length) AS longest_streak,
+       MAX(last_day) AS last_content_date
+FROM runs
+GROUP BY owner_id
+"""
+
+
+def _as_date(value) -> date:
+    # SQLite's date() returns text.
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _streak_from_days(days: Iterable[date]) -> Streak:
+    current_streak = longest_streak = 0
+    last_content_date = None
+    for day in days:
+        if last_content_date == day - timedelta(days=1):
+            current_streak += 1
+        else:
+            current_streak = 1
+        longest_streak = max(longest_streak, current_streak)
+        last_content_date = day
+    return current_streak, longest_streak, last_content_date
+
+
+def compute_streaks(owner_ids: Iterable[int]) -> Dict[int, Streak]:
+    """Returns the streak of every given user that has journals, keyed by user id."""
+    streaks = {}
+    for alias, ids in shards.partition(owner_ids):
+        streaks.update(_compute_streaks(connections[alias], ids))
+    return streaks
+
+
+def _compute_streaks(connection, owner_ids) -> Dict[int, Streak]:
+    vendor = connection.vendor
+    if vendor not in _DAY_SQL:
+        journals = Journal.objects.using(connection.alias)
+        return {
+            owner_id: _streak_from_days(journals.filter(owner_id=owner_id).dates("date_added", "day").iterator())
+            for owner_id in owner_ids
+        }
+
+    sql = _STREAKS_SQL.format(
+        day=_DAY_SQL[vendor],
+        island=_ISLAND_SQL[vendor],
+        table=JOURNAL_TABLE,
+        owners=", ".join(["%s"] * len(owner_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, owner_ids)
+        return {
+            owner_id: (current_streak, longest_streak, _as_date(last_content_date))
+            for owner_id, current_streak, longest_streak, last_content_date in cursor.fetchall()
+        }
+
+
+def recompute(owner_ids: Iterable[int]) -> int:
+    """Rewrites the streak fields of the given users. Returns how many profiles were written."""
+    owner_ids = list(owner_ids)
+    streaks = compute_streaks(owner_ids)
+    profiles = list(UserProfile.objects.filter(user_id__in=owner_ids).only("id", "user_id"))
+    for profile in profiles:
+        profile.current_streak, profile.longest_streak, profile.last_content_date = (
+            streaks.get(profile.user_id, NO_STREAK)
+        )
+
+    user_ids = [profile.user_id for profile in profiles]
+    with transaction.atomic():
+        UserProfile.objects.bulk_update(profiles, STREAK_FIELDS)
+        # bulk_update skips the post_save receiver that drops the cached profile.
+        transaction.on_commit(lambda: _invalidate(user_ids))
+    return len(profiles)
+
+
+def _invalidate(user_ids):
+    for user_id in user_ids:
+        invalidate_cached_user(user_id)
+        response_cache.invalidate(user_id, response_cache.PROFILE)
+
+
+def record_activity(user_id: int, day: date) -> bool:
+    """
+    Counts ``day`` towards the user's streak, for content created on it.
+    Days on or before the last recorded one are left alone; returns whether
+    the streak moved.
+    """
+    extends = Case(
+        When(last_content_date=day - timedelta(days=1), then=F("current_streak") + 1),
+        default=Value(1),
+    )
+    updated = (
+        UserProfile.objects
+        .filter(Q(last_content_date__isnull=True) | Q(last_content_date__lt=day), user_id=user_id)
+        .update(
+            current_streak=extends,
+            longest_streak=Greatest(F("longest_streak"), extends),
+            last_content_date=day,
+        )
+    )
+    if updated:
+        transaction.on_commit(lambda: invalidate_cached_user(user_id))
+        response_cache.invalidate(user_id, response_cache.PROFILE)
+    return bool(updated)
+
+
+def journals_deleted(owner_id: int, days: Iterable[date]):
+    """Recomputes the streak if a delete left one of ``days`` without content."""
+    days = set(days)
+    remaining = set(
+        Journal.objects.for_owner(owner_id).filter(date_added__date__in=days)
+        .dates("date_added", "day")
+    )
+    if days - remaining:
+        recompute([owner_id])
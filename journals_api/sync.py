@@ -0,0 +1,127 @@
+"""
+Delta sync for offline clients.
+
+A sync token marks a point in a user's change history as ``(timestamp, id)``.
+`changes_since` returns journals whose ``updated_at`` is past the token, in
+``(updated_at, id)`` order, plus the ids of journals deleted in the same
+window (from `JournalTombstone`). Clients store ``next_since`` and send it
+back on the next sync.
+
+Covert journals are synced like any other, without their content, so a mood
+change to or from COVERT reaches the client as an ordinary upsert.
+
+The final page's token is set ``JOURNAL_SYNC_OVERLAP`` before the sync
+started, so changes from transactions still in flight aren't skipped; the
+overlap may resend a few entries, which clients apply idempotently.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from . import shards
+from .models.journals_model import Journal, JournalTombstone
+
+COVERT = "COVERT"
+
+
+def encode_sync_token(timestamp: datetime, after_id: int = 0) -> str:
+    raw = f"{timestamp.isoformat()}|{after_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str):
+    """Decodes a token built by `encode_sync_token` into ``(timestamp, after_id)``."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, after_id = raw.rsplit("|", 1)
+        timestamp = datetime.fromisoformat(timestamp)
+        if timezone.is_naive(timestamp):
+            raise ValueError("Sync token timestamps are timezone aware.")
+        return timestamp, int(after_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HttpError(400, "Invalid sync token.") from exc
+
+
+def record_deletions(owner_id: int, journal_ids: Iterable[int]):
+    """Writes tombstones for deleted journals. Call in the deleting transaction."""
+    JournalTombstone.objects.for_owner(owner_id).bulk_create(
+        [JournalTombstone(owner_id=owner_id, journal_id=journal_id) for journal_id in journal_ids]
+    )
+
+
+def prune_tombstones(older_than: Optional[datetime] = None) -> int:
+    """Deletes tombstones past the retention window. Returns how many were removed."""
+    if older_than is None:
+        older_than = timezone.now() - settings.JOURNAL_TOMBSTONE_RETENTION
+    deleted = 0
+    for alias in shards.databases():
+        deleted += JournalTombstone.objects.using(alias).filter(deleted_at__lt=older_than).delete()[0]
+    return deleted
+
+
+def _changes(user, token: Optional[str], started_at: datetime):
+    """The user's changed journals (in sync order) and tombstones after ``token``, and its timestamp."""
+    journals = Journal.objects.for_owner(user)
+    tombstones = JournalTombstone.objects.for_owner(user)
+
+    if token:
+        since, after_id = decode_sync_token(token)
+        if since < started_at - settings.JOURNAL_TOMBSTONE_RETENTION:
+            raise HttpError(410, "Sync token has expired, please run a full sync.")
+        journals = journals.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=after_id))
+        tombstones = tombstones.filter(deleted_at__gt=since)
+    else:
+        since = None
+    return journals.order_by("updated_at", "id"), tombstones, since
+
+
+def _page(upserts, limit: int, tombstones, started_at: datetime):
+    """Builds the page from up to ``limit + 1`` fetched upserts; returns it and the tombstones it covers."""
+    has_more = len(upserts) > limit
+    upserts = upserts[:limit]
+
+    if has_more:
+        last = upserts[-1]
+        # Deletions up to the last returned change; the rest come with the next page.
+        tombstones = tombstones.filter(deleted_at__lte=last.updated_at)
+        next_since = encode_sync_token(last.updated_at, last.id)
+    else:
+        next_since = encode_sync_token(started_at - settings.JOURNAL_SYNC_OVERLAP)
+
+    for journal in upserts:
+        journal.is_covert = (journal.mood_tag == COVERT)
+        if journal.is_covert:
+            journal.content = None
+
+    return {"upserts": upserts, "next_since": next_since, "has_more": has_more}, tombstones
+
+
+def changes_since(user, token: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    Returns up to ``limit`` changed journals after ``token`` and the deletions
+    in the same window. Without a token every journal is returned.
+    """
+    started_at = timezone.now()
+    journals, tombstones, since = _changes(user, token, started_at)
+    page, tombstones = _page(list(journals[: limit + 1]), limit, tombstones, started_at)
+    page["deletions"] = list(tombstones.values_list("journal_id", flat=True)) if since is not None else []
+    return page
+
+
+async def achanges_since(user, token: Optional[str], limit: int) -> Dict[str, Any]:
+    """Async counterpart of `changes_since`."""
+    started_at = timezone.now()
+    journals, tombstones, since = _changes(user, token, started_at)
+    page, tombstones = _page([journal async for journal in journals[: limit + 1]], limit, tombstones, started_at)
+    page["deletions"] = (
+        [journal_id async for journal_id in tombstones.values_list("journal_id", flat=True)]
+        if since is not None else []
+    )
+    return page
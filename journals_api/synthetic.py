@@ -0,0 +1,161 @@
+"""
+Synthetic users and journals for load tests and benchmarks.
+
+`generate` creates ``users`` accounts with ``journals_per_user`` entries each.
+Entry sizes follow a log-normal distribution (most entries are a few
+paragraphs, a few are very long), moods are mixed by ratio, and entries are
+spread over the last ``days`` days, so listings, search, streaks and stats
+see realistic data. A ``seed`` makes the data set reproducible.
+
+Rows are written with ``bulk_create``, ``batch_size`` at a time; counters,
+rollups and streaks are rebuilt once at the end. Every user gets the same
+password and PIN, hashed once.
+"""
+import math
+import random
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from . import counters, rollups, shards, streaks
+from .models.journals_model import Journal
+from .models.user_model import UserProfile
+
+DEFAULT_PASSWORD = "Synthetic-pass1!"
+DEFAULT_PIN = "1234"
+
+WORDS = (
+    "morning coffee walk rain sunlight quiet evening friend family work meeting "
+    "project deadline dinner book music garden city train window dream sleep "
+    "tired happy grateful anxious calm river mountain weekend plan memory letter "
+    "phone message kitchen bread tea laugh worry hope idea notes code bug release "
+    "run park dog cat street night stars cloud winter summer spring autumn"
+).split()
+
+# Median entry ~1,100 characters; the long tail reaches a few pages.
+CONTENT_MU = 7.0
+CONTENT_SIGMA = 0.8
+MIN_CONTENT = 40
+MAX_CONTENT = 20_000
+
+
+def _mood(rng: random.Random, covert_ratio: float, gloomy_ratio: float) -> str:
+    roll = rng.random()
+    if roll < covert_ratio:
+        return "COVERT"
+    if roll < covert_ratio + gloomy_ratio:
+        return "GLOOMY"
+    return "MERRY"
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(6, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def _content(rng: random.Random) -> str:
+    size = min(MAX_CONTENT, max(MIN_CONTENT, int(rng.lognormvariate(CONTENT_MU, CONTENT_SIGMA))))
+    paragraphs, length = [], 0
+    while length < size:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:size]
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize()
+
+
+def _create_users(prefix: str, count: int, password: str, pin: str) -> List[User]:
+    start = User.objects.filter(username__startswith=f"{prefix}-").count()
+    password_hash = make_password(password)
+    pin_hash = make_password(pin)
+    users = User.objects.bulk_create(
+        User(username=f"{prefix}-{n}", email=f"{prefix}-{n}@example.com", password=password_hash)
+        for n in range(start, start + count)
+    )
+    # bulk_create skips the post_save receiver that creates profiles.
+    UserProfile.objects.bulk_create(
+        UserProfile(user=user, pin=pin_hash, journal_shard=shards.place(user.id)) for user in users
+    )
+    return users
+
+
+def _journals_for(user: User, count: int, rng: random.Random, moods, days: int, now):
+    span = timedelta(days=days).total_seconds()
+    for _ in range(count):
+        # Weighted towards recent days, like a habit that stuck.
+        age = span * (1 - math.sqrt(rng.random()))
+        yield Journal(
+            owner=user,
+            title=_title(rng),
+            content=_content(rng),
+            mood_tag=_mood(rng, *moods),
+        ), now - timedelta(seconds=age)
+
+
+def _insert(entries):
+    by_shard = defaultdict(list)
+    for entry in entries:
+        # The users were just placed; no need to read their profiles back.
+        by_shard[shards.place(entry[0].owner_id) or DEFAULT_DB_ALIAS].append(entry)
+    for alias, shard_entries in by_shard.items():
+        journals = [journal for journal, _ in shard_entries]
+        with transaction.atomic(using=alias):
+            Journal.objects.using(alias).bulk_create(journals)
+            # date_added/updated_at are auto_now(_add), which bulk_create overwrites.
+            for journal, date_added in shard_entries:
+                journal.date_added = journal.updated_at = date_added
+            Journal.objects.using(alias).bulk_update(journals, ["date_added", "updated_at"])
+
+
+def generate(
+    users: int,
+    journals_per_user: int,
+    *,
+    covert_ratio: float = 0.1,
+    gloomy_ratio: float = 0.35,
+    days: int = 365,
+    seed: Optional[int] = None,
+    prefix: str = "synthetic",
+    password: str = DEFAULT_PASSWORD,
+    pin: str = DEFAULT_PIN,
+    batch_size: int = 1000,
+) -> Dict[str, object]:
+    """
+    Creates the users and their journals; entries that are neither covert nor
+    gloomy are merry. Returns ``{"users": [...], "journals": n}``.
+    """
+    if covert_ratio < 0 or gloomy_ratio < 0 or covert_ratio + gloomy_ratio > 1:
+        raise ValueError("Mood ratios must be non-negative and add up to at most 1.")
+    rng = random.Random(seed)
+    moods = (covert_ratio, gloomy_ratio)
+    now = timezone.now()
+
+    with transaction.atomic():
+        created_users = _create_users(prefix, users, password, pin)
+
+    created = 0
+    batch = []
+    for user in created_users:
+        for entry in _journals_for(user, journals_per_user, rng, moods, days, now):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                _insert(batch)
+                created += len(batch)
+                batch = []
+    if batch:
+        _insert(batch)
+        created += len(batch)
+
+    user_ids = [user.id for user in created_users]
+    counters.rebuild(user_ids)
+    rollups.rebuild(user_ids)
+    streaks.recompute(user_ids)
+    return {"users": created_users, "journals": created}
@@ -1,3 +1,2129 @@
-from django.test import TestCase
+"""
+Tests for journals_api.
 
-# Create your tests here.
+Query budget regression tests: every route is called on both APIs (``/api`` and ``/api/async``) with
+``QUERY_BUDGET_STRICT`` on, so a request that runs more queries than its
+operation declares with `journals_api.query_budget.query_budget` raises
+`QueryBudgetExceeded` and fails the test. Budgets are counted as in these
+tests: inside the test transaction, where each ``atomic()`` block adds a
+SAVEPOINT and RELEASE, and with an empty auth cache (so they include the
+user lookup).
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import date, datetime, time as time_of_day, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ninja.renderers import JSONRenderer
+from ninja_jwt.exceptions import TokenError
+from ninja_jwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from ninja_jwt.tokens import AccessToken
+
+from penfolio.urls import api, async_api
+
+from . import (bulk, counters, export, refresh_tokens, renderers, replicas, response_cache, rollups, search,
+               search_index, shards, sqlite_tuning, streaks, sync, synthetic, uploads)
+from .authentication import tokens_for_user
+from .imports import parse_markdown
+from .models.counter_model import JournalCounter, JournalDailyRollup
+from .models.journals_model import Journal, JournalTombstone
+from .models.upload_model import ImageUploadJob, UploadedImage
+from .models.user_model import UserProfile
+from .query_budget import BUDGET_ATTR, QueryBudgetExceeded
+from .schemas.journal_schemas import JournalBulkUpdateItemSchema, JournalCreateSchema
+
+PREFIXES = ("/api", "/api/async")
+
+
+@override_settings(
+    QUERY_BUDGET_STRICT=True,
+    QUERY_BUDGET_HEADERS=True,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("writer", "writer@example.com", "s3cret-pass")
+        self.user.user_profile.set_pin("1234")
+        self.journal = self.make_journal("Morning pages")
+        self.covert = self.make_journal("Secret", mood_tag="COVERT")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def make_journal(self, title, mood_tag="MERRY"):
+        journal = Journal.objects.create(owner=self.user, title=title, content=f"{title} content", mood_tag=mood_tag)
+        counters.journal_created(self.user.id, mood_tag)
+        rollups.journal_created(self.user.id, journal.date_added.date(), mood_tag)
+        return journal
+
+    def call(self, method, path, data=None, *, prefix, files=None, auth=True, expected=200, **extra):
+        """Calls the route and checks its status; strict mode enforces the budget."""
+        if files is not None:
+            extra.update(data=files)
+        elif data is not None:
+            extra.update(data=json.dumps(data), content_type="application/json")
+        if auth:
+            extra.update(self.auth)
+        caches[settings.AUTH_USER_CACHE_ALIAS].clear()
+        response = getattr(self.client, method)(prefix + path, **extra)
+        self.assertEqual(response.status_code, expected, getattr(response, "content", b""))
+        self.assertIn("X-Query-Budget", response)
+        return response
+
+    def each_api(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                yield prefix
+
+
+class QueryBudgetMiddlewareTests(QueryBudgetTestCase):
+    def test_every_operation_declares_a_budget(self):
+        for ninja_api in (api, async_api):
+            for _, router in ninja_api._routers:
+                for path, path_view in router.path_operations.items():
+                    for operation in path_view.operations:
+                        with self.subTest(path=path, methods=operation.methods):
+                            self.assertTrue(hasattr(operation.view_func, BUDGET_ATTR))
+
+    def test_headers_report_queries(self):
+        response = self.call("get", "/journals/", prefix="/api")
+        self.assertLessEqual(int(response["X-Query-Count"]), int(response["X-Query-Budget"]))
+        self.assertTrue(response["Server-Timing"].startswith("db;dur="))
+
+    def test_async_queries_are_counted(self):
+        response = self.call("get", "/journals/", prefix="/api/async")
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+
+    @override_settings(QUERY_BUDGET_HEADERS=False)
+    def test_headers_off(self):
+        response = self.client.get("/api/", **self.auth)
+        self.assertNotIn("X-Query-Count", response)
+
+    def test_over_budget_fails(self):
+        from .v1.journal_api import list_journals
+
+        budget = getattr(list_journals, BUDGET_ATTR)
+        setattr(list_journals, BUDGET_ATTR, 0)
+        try:
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/api/journals/", **self.auth)
+        finally:
+            setattr(list_journals, BUDGET_ATTR, budget)
+
+
+class AuthRouteBudgetTests(QueryBudgetTestCase):
+    def test_home(self):
+        self.call("get", "/", prefix="/api", auth=False)
+
+    def test_register(self):
+        for prefix in self.each_api():
+            name = f"new{len(prefix)}"
+            self.call("post", "/auth/register", {"username": name, "email": f"{name}@example.com", "password": "Pw-12345!"},
+                      prefix=prefix, auth=False)
+
+    def test_login(self):
+        for prefix in self.each_api():
+            self.call("post", "/auth/login", {"username": "writer", "password": "s3cret-pass"}, prefix=prefix, auth=False)
+
+    def test_token_refresh(self):
+        for prefix in self.each_api():
+            refresh = str(tokens_for_user(self.user))
+            self.call("post", "/auth/token/refresh", {"refresh": refresh}, prefix=prefix, auth=False)
+
+    def test_profile(self):
+        for prefix in self.each_api():
+            self.call("get", "/auth/profile", prefix=prefix)
+
+    def test_set_pin(self):
+        for prefix in self.each_api():
+            self.call("post", "/auth/profile/set-pin", {"pin": "4321"}, prefix=prefix)
+
+
+class JournalRouteBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        for prefix in self.each_api():
+            self.call("get", "/journals/", prefix=prefix)
+            self.call("get", "/journals/?view=summary&cursor=", prefix=prefix)
+            self.call("get", "/journals/?mood_tag=MERRY", prefix=prefix)
+
+    def test_list_not_modified(self):
+        for prefix in self.each_api():
+            etag = self.call("get", "/journals/", prefix=prefix)["ETag"]
+            self.call("get", "/journals/", prefix=prefix, expected=304, HTTP_IF_NONE_MATCH=etag)
+
+    def test_list_covert(self):
+        for prefix in self.each_api():
+            self.call("post", "/journals/covert", {"pin": "1234"}, prefix=prefix)
+
+    def test_covert_unlock(self):
+        for prefix in self.each_api():
+            token = self.call("post", "/journals/covert/unlock", {"pin": "1234"}, prefix=prefix).json()["data"]["unlock_token"]
+            self.call("post", "/journals/covert", {"unlock_token": token}, prefix=prefix)
+
+    def test_get(self):
+        for prefix in self.each_api():
+            self.call("get", f"/journals/{self.journal.id}", prefix=prefix)
+
+    def test_reveal(self):
+        for prefix in self.each_api():
+            self.call("post", f"/journals/{self.covert.id}/reveal", {"pin": "1234"}, prefix=prefix)
+
+    def test_create(self):
+        for prefix in self.each_api():
+            self.call("post", "/journals/", {"title": "New", "content": "Entry", "mood_tag": "GLOOMY"},
+                      prefix=prefix)
+
+    def test_update(self):
+        for prefix in self.each_api():
+            self.call("put", f"/journals/{self.journal.id}", {"title": "Renamed", "mood_tag": "GLOOMY"}, prefix=prefix)
+
+    def test_delete(self):
+        for prefix in self.each_api():
+            journal = self.make_journal("Doomed")
+            self.call("delete", f"/journals/{journal.id}", prefix=prefix, expected=204)
+
+    def test_sync(self):
+        for prefix in self.each_api():
+            token = self.call("get", "/journals/sync", prefix=prefix).json()["data"]["next_since"]
+            self.call("get", f"/journals/sync?since={token}", prefix=prefix)
+
+    def test_export(self):
+        for prefix in self.each_api():
+            self.call("post", "/journals/export", {"format": "ndjson", "include_covert": True, "pin": "1234"}, prefix=prefix)
+
+    def test_import(self):
+        records = "\n".join(
+            json.dumps({"title": f"Imported {i}", "content": "Text", "mood_tag": "MERRY"}) for i in range(3)
+        )
+        for prefix in self.each_api():
+            upload = SimpleUploadedFile("journals.ndjson", records.encode())
+            self.call("post", "/journals/import", prefix=prefix, files={"file": upload})
+
+    def test_bulk_create(self):
+        items = [{"title": f"Bulk {i}", "content": "Text", "mood_tag": "MERRY"} for i in range(5)]
+        for prefix in self.each_api():
+            self.call("post", "/journals/bulk", {"items": items}, prefix=prefix)
+
+    def test_bulk_update(self):
+        for prefix in self.each_api():
+            items = [{"id": self.make_journal(f"Bulk {i}").id, "mood_tag": "GLOOMY"} for i in range(5)]
+            self.call("put", "/journals/bulk", {"items": items}, prefix=prefix)
+
+    def test_bulk_delete(self):
+        for prefix in self.each_api():
+            ids = [self.make_journal(f"Bulk {i}").id for i in range(5)]
+            self.call("delete", "/journals/bulk", {"ids": ids}, prefix=prefix)
+
+    def test_stats(self):
+        for prefix in self.each_api():
+            self.call("get", "/journals/stats/heatmap", prefix=prefix)
+            self.call("get", "/journals/stats/moods", prefix=prefix)
+            self.call("get", "/journals/stats/gaps", prefix=prefix)
+
+    def test_search(self):
+        for prefix in self.each_api():
+            self.call("get", "/journals/search/?q=morning", prefix=prefix)
+
+    def test_upload_image(self):
+        image = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+        uploads.remember_image(self.user.id, hashlib.sha256(image).hexdigest(), "https://img.example.com/a.png")
+        for prefix in self.each_api():
+            upload = SimpleUploadedFile("a.png", image, content_type="image/png")
+            self.call("post", "/journals/upload-image", prefix=prefix, files={"file": upload}, expected=202)
+
+    def test_upload_stats(self):
+        for prefix in self.each_api():
+            self.call("get", "/journals/upload-image/stats", prefix=prefix)
+
+    def test_upload_status(self):
+        job = ImageUploadJob.objects.create(owner=self.user, digest="0" * 64)
+        for prefix in self.each_api():
+            self.call("get", f"/journals/upload-image/{job.id}", prefix=prefix)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ApiTestCase(TestCase):
+    """
+    Calls both APIs as a user. Requests run their on-commit callbacks (cache
+    invalidation) as they would outside the test transaction.
+    """
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user, self.auth = self.make_user("writer")
+        # Budgets are asserted by the route budget tests, which write one mood
+        # at a time. Mixed batches cost a counter and rollup update per mood
+        # (see `journals_api.bulk`), so they may go over without a warning.
+        silence = mock.patch.object(logging.getLogger("journals_api.query_budget"), "disabled", True)
+        silence.start()
+        self.addCleanup(silence.stop)
+
+    def make_user(self, name, pin=None):
+        user = User.objects.create_user(name, f"{name}@example.com", "s3cret-pass")
+        if pin is not None:
+            user.user_profile.set_pin(pin)
+        return user, {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+    def request(self, method, path, data=None, *, auth=None, **extra):
+        if data is not None:
+            extra.update(data=json.dumps(data), content_type="application/json")
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(path, **(self.auth if auth is None else auth), **extra)
+
+    def data(self, method, path, data=None, *, expected=200, **extra):
+        response = self.request(method, path, data, **extra)
+        self.assertEqual(response.status_code, expected, response.content)
+        return response.json()["data"]
+
+    def create(self, prefix, title="Entry", mood_tag="MERRY", **extra):
+        body = {"title": title, "content": f"{title} content", "mood_tag": mood_tag}
+        return self.data("post", f"{prefix}/journals/", body, **extra)["id"]
+
+    def import_records(self, prefix, records):
+        ndjson = "\n".join(json.dumps(record) for record in records)
+        upload = SimpleUploadedFile("journals.ndjson", ndjson.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"{prefix}/journals/import", {"file": upload}, **self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def write_each_way(self, prefix):
+        """
+        Changes the user's journals through every write path, yielding the
+        name of each step once it is done. The user needs a PIN.
+        """
+        journal_id = self.create(prefix, "Single")
+        yield "create"
+        self.data("put", f"{prefix}/journals/{journal_id}", {"title": "Renamed"})
+        yield "update"
+        self.data("put", f"{prefix}/journals/{journal_id}", {"mood_tag": "GLOOMY"})
+        yield "mood change"
+        self.data("put", f"{prefix}/journals/{journal_id}", {"mood_tag": "COVERT"})
+        yield "covert mood change"
+        self.data("put", f"{prefix}/journals/{journal_id}", {"mood_tag": "MERRY"})
+        yield "non-covert mood change"
+        created = self.data("post", f"{prefix}/journals/bulk", {"items": [
+            {"title": "Bulk merry", "content": "x", "mood_tag": "MERRY"},
+            {"title": "Bulk gloomy", "content": "x", "mood_tag": "GLOOMY"},
+            {"title": "Bulk covert", "content": "x", "mood_tag": "COVERT"},
+        ]})
+        bulk_ids = [result["id"] for result in created["results"]]
+        yield "bulk create"
+        self.data("put", f"{prefix}/journals/bulk", {"items": [
+            {"id": bulk_ids[0], "mood_tag": "GLOOMY"},
+            {"id": bulk_ids[2], "mood_tag": "MERRY"},
+            {"id": 0, "title": "Missing"},
+        ]})
+        yield "bulk update"
+        self.data("delete", f"{prefix}/journals/bulk", {"ids": [bulk_ids[1], 0]})
+        yield "bulk delete"
+        self.import_records(prefix, [
+            {"title": "Imported", "content": "x", "mood_tag": "GLOOMY"},
+            {"title": "Imported old", "content": "x", "mood_tag": "MERRY", "date_added": "2020-02-29T12:00:00+00:00"},
+            {"title": "Invalid", "content": "x", "mood_tag": "UNKNOWN"},
+        ])
+        yield "import"
+        self.request("delete", f"{prefix}/journals/{journal_id}")
+        yield "delete"
+
+
+class CursorPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        tied = timezone.now() - timezone.timedelta(days=1)
+        self.ids = [
+            Journal.objects.create(owner=self.user, title=f"Entry {n}", content="Text", mood_tag="MERRY").id
+            for n in range(7)
+        ]
+        # Five entries share a timestamp; only the id orders them.
+        Journal.objects.filter(id__in=self.ids[:5]).update(date_added=tied)
+        counters.rebuild([self.user.id])
+        self.expected = self.ids[5:][::-1] + self.ids[:5][::-1]
+
+    def walk(self, prefix, first_query):
+        page = self.data("get", f"{prefix}/journals/?{first_query}")
+        seen = [item["id"] for item in page["items"]]
+        while page["next_cursor"]:
+            page = self.data("get", f"{prefix}/journals/?page_size=2&cursor={page['next_cursor']}")
+            self.assertIsNone(page["count"])
+            seen += [item["id"] for item in page["items"]]
+        return seen
+
+    def test_cursor_walks_every_entry_once_across_ties(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.walk(prefix, "page_size=2"), self.expected)
+
+    def test_cursor_continues_from_a_numbered_page(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                page = self.data("get", f"{prefix}/journals/?page=2&page_size=2")
+                self.assertEqual(page["count"], 7)
+                self.assertEqual([item["id"] for item in page["items"]], self.expected[2:4])
+                self.assertEqual(self.walk(prefix, "page=2&page_size=2"), self.expected[2:])
+
+    def test_last_page_has_no_cursor(self):
+        page = self.data("get", "/api/journals/?page_size=7")
+        self.assertEqual(len(page["items"]), 7)
+        self.assertIsNone(page["next_cursor"])
+
+    def test_malformed_cursors_are_rejected(self):
+        bad = [
+            "not-a-cursor!",
+            base64.urlsafe_b64encode(b"yesterday|5").decode(),
+            base64.urlsafe_b64encode(b"2024-01-01T00:00:00+00:00|five").decode(),
+            base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        ]
+        for prefix in PREFIXES:
+            for cursor in bad:
+                with self.subTest(api=prefix, cursor=cursor):
+                    response = self.request("get", f"{prefix}/journals/?cursor={cursor}")
+                    self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(ApiTestCase):
+    def search(self, prefix, query):
+        return self.data("get", f"{prefix}/journals/search/?q={query}")
+
+    def test_journal_markup_is_escaped_around_highlights(self):
+        self.data("post", "/api/journals/", {
+            "title": "<b>Garden</b> notes",
+            "content": "Planted <script>alert(1)</script> garden beans & peas",
+            "mood_tag": "MERRY",
+        })
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                item = self.search(prefix, "garden")["items"][0]
+                self.assertEqual(item["title"], "<b>Garden</b> notes")
+                self.assertEqual(item["highlighted_title"], "&lt;b&gt;<mark>Garden</mark>&lt;/b&gt; notes")
+                self.assertIn("&lt;script&gt;alert(1)&lt;/script&gt; <mark>garden</mark>", item["snippet"])
+                # Delimiters typed into a journal mark nothing and don't leak.
+                self.assertIn(" <mark>beans</mark> &amp; peas", item["snippet"].replace("", ""))
+                self.assertEqual(item["snippet"].count("<mark>"), item["snippet"].count("</mark>"))
+                self.assertNotIn("<script>", item["snippet"])
+
+    def test_markup_balances_stray_delimiters(self):
+        self.assertEqual(search._markup("a<b>c"), "a<mark>&lt;b&gt;c</mark>")
+
+    def test_ranked_and_scoped_to_own_visible_journals(self):
+        self.create("/api", "Walk", mood_tag="MERRY")
+        self.data("post", "/api/journals/", {"title": "Errands", "content": "A long walk home", "mood_tag": "MERRY"})
+        Journal.objects.create(owner=self.user, title="Walk in secret", content="Hidden", mood_tag="COVERT")
+        other, other_auth = self.make_user("reader")
+        self.create("/api", "Walk elsewhere", auth=other_auth)
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                page = self.search(prefix, "walk")
+                self.assertEqual(page["count"], 2)
+                # A title match outranks a content match.
+                self.assertEqual([item["title"] for item in page["items"]], ["Walk", "Errands"])
+                self.assertFalse(any(item["is_covert"] for item in page["items"]))
+
+    def test_missing_triggers_are_reinstalled_after_migrate(self):
+        # What a migration that rebuilds the journal table leaves behind.
+        with connections["default"].cursor() as cursor:
+            for name in search_index.SQLITE_FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+        self.assertEqual(search_index.missing_triggers(connections["default"]), list(search_index.SQLITE_FTS_TRIGGERS))
+        self.create("/api", "Unindexed")
+        self.assertEqual(self.search("/api", "unindexed")["count"], 0)
+
+        emit_post_migrate_signal(0, False, "default")
+        self.assertEqual(search_index.missing_triggers(connections["default"]), [])
+        # The index was rebuilt, and new writes reach it again.
+        self.create("/api", "Indexed unindexed")
+        self.assertEqual(self.search("/api", "unindexed")["count"], 2)
+
+    def test_fallback_escapes(self):
+        self.data("post", "/api/journals/", {"title": "<i>Tea</i>", "content": "<img src=x> tea", "mood_tag": "MERRY"})
+        items, count = search._search_fallback(self.user, ["tea"], 0, 10)
+        self.assertEqual(count, 1)
+        self.assertEqual(items[0]["highlighted_title"], "&lt;i&gt;Tea&lt;/i&gt;")
+        self.assertEqual(items[0]["snippet"], "&lt;img src=x&gt; tea")
+
+    def test_async_fallback_matches_sync(self):
+        for title in ("Tea time", "More tea", "Coffee"):
+            self.create("/api", title)
+        expected = search._search_fallback(self.user, ["tea"], 0, 1)
+        self.assertEqual(async_to_sync(search._asearch_fallback)(self.user, ["tea"], 0, 1), expected)
+        self.assertEqual(expected[1], 2)
+
+
+@skipUnless(renderers.orjson is not None, "orjson is not installed")
+class RendererTests(SimpleTestCase):
+    def render(self, renderer, data):
+        return json.loads(renderer.render(None, data, response_status=200))
+
+    def test_orjson_renders_like_the_json_renderer(self):
+        data = {
+            "datetimes": [
+                datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+                datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+                datetime(2024, 1, 2, 3, 4, 5, 999, tzinfo=dt_timezone(timedelta(hours=5))),
+                datetime(2024, 1, 2, 3, 4, 5, 250000),
+            ],
+            "date": date(2024, 2, 29),
+            "time": time_of_day(23, 59, 59, 654321),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "decimal": Decimal("1.50"),
+            "nested": [{"count": 3, "ratio": 0.25, "flag": True, "missing": None}],
+        }
+        rendered = self.render(renderers.ORJSONRenderer(), data)
+        self.assertEqual(rendered, self.render(JSONRenderer(), data))
+        self.assertEqual(rendered["datetimes"][:3], [
+            "2024-01-02T03:04:05.123Z", "2024-01-02T03:04:05Z", "2024-01-02T03:04:05.000+05:00",
+        ])
+
+
+class AsyncParityTests(ApiTestCase):
+    """The async API shares the sync API's logic, so both answer alike."""
+
+    def setUp(self):
+        super().setUp()
+        self.user.user_profile.set_pin("1234")
+        self.journal = Journal.objects.create(owner=self.user, title="Open", content="Plain", mood_tag="MERRY")
+        self.covert = Journal.objects.create(owner=self.user, title="Hidden", content="Secret", mood_tag="COVERT")
+        counters.rebuild([self.user.id])
+
+    def both(self, method, path, data=None, **extra):
+        responses = [self.request(method, f"{prefix}{path}", data, **extra) for prefix in PREFIXES]
+        self.assertEqual(responses[0].status_code, responses[1].status_code, path)
+        if responses[0].content:
+            self.assertEqual(responses[0].json(), responses[1].json(), path)
+        return responses[0]
+
+    def test_covert_journal_detail_hides_content(self):
+        response = self.both("get", f"/journals/{self.covert.id}")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertTrue(data["is_covert"])
+        self.assertIsNone(data["content"])
+
+    def test_reads_match(self):
+        self.both("get", f"/journals/{self.journal.id}")
+        self.both("get", "/journals/?page_size=5")
+        self.both("get", "/journals/?mood_tag=MERRY")
+        self.both("post", "/journals/covert", {"pin": "1234"})
+        self.both("post", f"/journals/{self.covert.id}/reveal", {"pin": "1234"})
+        self.both("get", "/journals/stats/gaps")
+        self.both("get", "/journals/search/?q=open")
+        self.both("get", "/auth/profile")
+
+    def test_errors_match(self):
+        cases = [
+            ("get", "/journals/999999", None, 404),
+            ("post", f"/journals/{self.journal.id}/reveal", {"pin": "1234"}, 400),
+            ("post", f"/journals/{self.covert.id}/reveal", {"pin": "0000"}, 403),
+            ("post", "/journals/covert", {"unlock_token": "forged"}, 403),
+            ("post", "/journals/covert/unlock", {"pin": "0000"}, 403),
+            ("get", "/journals/?cursor=bad!", None, 400),
+            ("post", "/auth/register", {"username": "writer", "email": "new@example.com", "password": "Str0ng-Passw0rd!"}, 400),
+            ("post", "/auth/login", {"username": "writer", "password": "wrong"}, 401),
+            ("post", "/auth/token/refresh", {"refresh": "garbage"}, 401),
+        ]
+        for method, path, data, status in cases:
+            with self.subTest(path=path):
+                self.assertEqual(self.both(method, path, data).status_code, status)
+
+    def test_writes_match(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                _, auth = self.make_user(f"pinless{prefix.count('/')}")
+                body = {"title": "Hidden", "content": "x", "mood_tag": "COVERT"}
+                self.assertEqual(self.request("post", f"{prefix}/journals/", body, auth=auth).status_code, 403)
+                journal_id = self.create(prefix, "Draft")
+                updated = self.data("put", f"{prefix}/journals/{journal_id}", {"mood_tag": "COVERT"})
+                self.assertTrue(updated["is_covert"])
+                self.assertEqual(self.request("delete", f"{prefix}/journals/{journal_id}").status_code, 204)
+                self.assertFalse(Journal.objects.filter(id=journal_id).exists())
+
+
+class UploadRecoveryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("uploader", "uploader@example.com", "s3cret-pass")
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.spool = os.path.join(self.root, "spool")
+        settings_override = override_settings(
+            IMAGE_UPLOAD_EAGER=True,
+            IMAGE_UPLOAD_BACKEND="journals_api.uploads.LocalFileSystemBackend",
+            IMAGE_UPLOAD_SPOOL_DIR=self.spool,
+            MEDIA_ROOT=os.path.join(self.root, "media"),
+            IMAGE_DEDUP_SCOPE=None,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content=b"\x89PNG image"):
+        return uploads.accept_upload(self.user, SimpleUploadedFile("a.png", content, content_type="image/png"))
+
+    def spool_file(self, name, age=None):
+        os.makedirs(self.spool, exist_ok=True)
+        path = os.path.join(self.spool, name)
+        with open(path, "wb") as spooled:
+            spooled.write(b"image")
+        if age is not None:
+            stamp = (timezone.now() - age).timestamp()
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def test_committed_job_takes_and_returns_a_slot(self):
+        free = uploads._slots._value
+        with self.captureOnCommitCallbacks(execute=True):
+            job = self.upload()
+            self.assertEqual(uploads._slots._value, free)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.SUCCEEDED)
+        self.assertEqual(job.spool_path, "")
+        self.assertEqual(uploads._slots._value, free)
+
+    def test_rolled_back_job_holds_no_slot(self):
+        free = uploads._slots._value
+        with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.upload()
+                raise RuntimeError("rolled back")
+        self.assertEqual(callbacks, [])
+        self.assertEqual(uploads._slots._value, free)
+        self.assertFalse(ImageUploadJob.objects.exists())
+
+        # The spooled file is left behind; recovery removes it.
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+        self.assertEqual(uploads.recover_jobs(stale_after=timezone.timedelta(0))["removed"], 1)
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_full_queue_fails_the_job_on_commit(self):
+        with mock.patch.object(uploads, "_slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            with self.captureOnCommitCallbacks(execute=True):
+                job = self.upload()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageUploadJob.Status.FAILED)
+        self.assertIn("busy", job.error)
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_recover_jobs(self):
+        stale = timezone.now() - timezone.timedelta(hours=1)
+        requeue = ImageUploadJob.objects.create(
+            owner=self.user, status=ImageUploadJob.Status.RUNNING, spool_path=self.spool_file("kept.png"),
+        )
+        lost = ImageUploadJob.objects.create(owner=self.user, spool_path=os.path.join(self.spool, "gone.png"))
+        ImageUploadJob.objects.filter(id__in=[requeue.id, lost.id]).update(updated_at=stale)
+        fresh = ImageUploadJob.objects.create(owner=self.user, spool_path=self.spool_file("fresh.png"))
+        orphan = self.spool_file("orphan.png", age=timezone.timedelta(hours=1))
+        recent_orphan = self.spool_file("recent.png")
+
+        free = uploads._slots._value
+        with mock.patch.object(uploads, "shutdown") as shutdown:
+            out = io.StringIO()
+            call_command("recover_image_uploads", stdout=out)
+        shutdown.assert_called_once_with(wait=True)
+        self.assertIn("Requeued 1 job(s), failed 1, removed 1 spool file(s).", out.getvalue())
+        self.assertEqual(uploads._slots._value, free)
+
+        for job in (requeue, lost, fresh):
+            job.refresh_from_db()
+        self.assertEqual(requeue.status, ImageUploadJob.Status.SUCCEEDED)
+        self.assertTrue(requeue.secure_url.endswith("kept.png"))
+        self.assertEqual(lost.status, ImageUploadJob.Status.FAILED)
+        self.assertEqual(fresh.status, ImageUploadJob.Status.PENDING)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent_orphan))
+        self.assertTrue(os.path.exists(fresh.spool_path))
+
+
+@override_settings(
+    IMAGE_DEDUP_SCOPE="user",
+    IMAGE_DEDUP_TTL=None,
+    IMAGE_DEDUP_MAX_ENTRIES=500,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class DigestCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("uploader", "uploader@example.com", "s3cret-pass")
+        self.other = User.objects.create_user("other", "other@example.com", "s3cret-pass")
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool, True)
+        settings_override = override_settings(IMAGE_UPLOAD_SPOOL_DIR=spool)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, user, content):
+        with self.captureOnCommitCallbacks(execute=False):
+            return uploads.accept_upload(user, SimpleUploadedFile("a.png", content, content_type="image/png"))
+
+    def digest(self, content):
+        return hashlib.sha256(content).hexdigest()
+
+    def test_identical_upload_is_served_from_the_cache(self):
+        uploads.remember_image(self.user.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        job = self.upload(self.user, b"cat")
+        self.assertTrue(job.deduplicated)
+        self.assertEqual(job.status, ImageUploadJob.Status.SUCCEEDED)
+        self.assertEqual(job.secure_url, "https://img.example.com/cat.png")
+        self.assertEqual(UploadedImage.objects.get().hits, 1)
+
+        # Different bytes, or another user under the per-user scope, miss.
+        self.assertFalse(self.upload(self.user, b"dog").deduplicated)
+        self.assertFalse(self.upload(self.other, b"cat").deduplicated)
+
+    @override_settings(IMAGE_DEDUP_SCOPE="global")
+    def test_global_scope_is_shared(self):
+        uploads.remember_image(self.user.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        self.assertTrue(self.upload(self.other, b"cat").deduplicated)
+
+    @override_settings(IMAGE_DEDUP_SCOPE=None)
+    def test_disabled_cache_never_hits(self):
+        uploads.remember_image(self.user.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        self.assertFalse(UploadedImage.objects.exists())
+        self.assertFalse(self.upload(self.user, b"cat").deduplicated)
+
+    @override_settings(IMAGE_DEDUP_TTL=timezone.timedelta(days=1))
+    def test_expired_entries_miss_and_are_dropped(self):
+        digest = self.digest(b"cat")
+        uploads.remember_image(self.user.id, digest, "https://img.example.com/cat.png")
+        self.assertIsNotNone(uploads.lookup_cached_image(self.user.id, digest))
+
+        UploadedImage.objects.update(last_used_at=timezone.now() - timezone.timedelta(days=2))
+        self.assertIsNone(uploads.lookup_cached_image(self.user.id, digest))
+        self.assertFalse(UploadedImage.objects.exists())
+
+    @override_settings(IMAGE_DEDUP_TTL=timezone.timedelta(days=1))
+    def test_hits_renew_the_ttl(self):
+        digest = self.digest(b"cat")
+        uploads.remember_image(self.user.id, digest, "https://img.example.com/cat.png")
+        UploadedImage.objects.update(last_used_at=timezone.now() - timezone.timedelta(hours=23))
+        self.assertIsNotNone(uploads.lookup_cached_image(self.user.id, digest))
+        self.assertGreater(UploadedImage.objects.get().last_used_at, timezone.now() - timezone.timedelta(minutes=1))
+
+    @override_settings(IMAGE_DEDUP_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        for age, name in enumerate(["newer", "older"], start=1):
+            uploads.remember_image(self.user.id, self.digest(name.encode()), f"https://img.example.com/{name}.png")
+            UploadedImage.objects.filter(digest=self.digest(name.encode())).update(
+                last_used_at=timezone.now() - timezone.timedelta(hours=age)
+            )
+        # A hit makes "older" the most recently used, so "newer" goes first.
+        uploads.lookup_cached_image(self.user.id, self.digest(b"older"))
+        uploads.remember_image(self.user.id, self.digest(b"new"), "https://img.example.com/new.png")
+        self.assertEqual(
+            set(UploadedImage.objects.filter(owner=self.user).values_list("secure_url", flat=True)),
+            {"https://img.example.com/older.png", "https://img.example.com/new.png"},
+        )
+        # Other users' entries count against their own limit.
+        uploads.remember_image(self.other.id, self.digest(b"x"), "https://img.example.com/x.png")
+        self.assertEqual(UploadedImage.objects.filter(owner=self.user).count(), 2)
+
+    def test_invalidate_cached_images(self):
+        uploads.remember_image(self.user.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        uploads.remember_image(self.other.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        self.assertEqual(uploads.invalidate_cached_images(secure_url="https://img.example.com/cat.png"), 2)
+        with self.assertRaises(ValueError):
+            uploads.invalidate_cached_images()
+
+    def test_dedup_stats(self):
+        self.assertEqual(uploads.dedup_stats(self.user), {"uploads": 0, "deduplicated": 0, "hit_rate": 0.0})
+        uploads.remember_image(self.user.id, self.digest(b"cat"), "https://img.example.com/cat.png")
+        for content in (b"cat", b"cat", b"cat", b"dog"):
+            self.upload(self.user, content)
+        self.upload(self.other, b"dog")
+
+        self.assertEqual(uploads.dedup_stats(self.user), {"uploads": 4, "deduplicated": 3, "hit_rate": 0.75})
+        self.assertEqual(uploads.dedup_stats(), {"uploads": 5, "deduplicated": 3, "hit_rate": 0.6})
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                response = self.client.get(f"{prefix}/journals/upload-image/stats", **auth)
+                self.assertEqual(response.json(), {"uploads": 4, "deduplicated": 3, "hit_rate": 0.75})
+
+
+class AuthCacheTests(ApiTestCase):
+    def cached(self):
+        return caches[settings.AUTH_USER_CACHE_ALIAS].get(f"auth:user:{self.user.id}")
+
+    def warm(self):
+        for prefix in PREFIXES:
+            self.data("get", f"{prefix}/journals/")
+        self.assertIsNotNone(self.cached())
+
+    def test_tokens_carry_only_the_user_id(self):
+        refresh = tokens_for_user(self.user)
+        for token in (refresh, refresh.access_token):
+            self.assertEqual(token["user_id"], self.user.id)
+            self.assertNotIn("username", token.payload)
+            self.assertNotIn("email", token.payload)
+            self.assertNotIn(self.user.email, json.dumps(token.payload))
+
+    def test_user_is_cached(self):
+        self.warm()
+        with self.assertNumQueries(2):  # the page and its count; no user or profile lookup
+            self.data("get", "/api/journals/?mood_tag=MERRY")
+
+    def test_saving_the_user_invalidates(self):
+        self.warm()
+        self.user.email = "renamed@example.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertIsNone(self.cached())
+        for prefix in PREFIXES:
+            self.assertEqual(self.request("get", f"{prefix}/auth/profile").json()["email"], "renamed@example.com")
+
+    def test_saving_the_profile_invalidates(self):
+        self.warm()
+        self.user.user_profile.set_pin("1234")
+        self.assertIsNone(self.cached())
+        for prefix in PREFIXES:
+            # The cached user was loaded without a PIN.
+            self.data("post", f"{prefix}/journals/", {"title": "T", "content": "C", "mood_tag": "COVERT"})
+
+    def test_deactivating_the_user_invalidates(self):
+        self.warm()
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.cached())
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.request("get", f"{prefix}/journals/").status_code, 401)
+
+    def test_deleting_the_user_invalidates(self):
+        self.warm()
+        self.user.delete()
+        self.assertIsNone(self.cached())
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.request("get", f"{prefix}/journals/").status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_STATELESS=True)
+    def test_stateless_profile_reads_the_user_row(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                profile = self.request("get", f"{prefix}/auth/profile").json()
+                self.assertEqual((profile["username"], profile["email"]), ("writer", "writer@example.com"))
+        self.assertIsNone(self.cached())
+
+
+class CovertUnlockTokenTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.user_profile.set_pin("1234")
+        self.covert = Journal.objects.create(owner=self.user, title="Hidden", content="Secret", mood_tag="COVERT")
+
+    def unlock(self, prefix="/api", auth=None):
+        return self.data("post", f"{prefix}/journals/covert/unlock", {"pin": "1234"}, auth=auth)["unlock_token"]
+
+    def reveal(self, prefix, body, auth=None):
+        return self.request("post", f"{prefix}/journals/{self.covert.id}/reveal", body, auth=auth)
+
+    def assertRejected(self, body, auth=None):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.reveal(prefix, body, auth).status_code, 403)
+                self.assertEqual(self.request("post", f"{prefix}/journals/covert", body, auth=auth).status_code, 403)
+
+    def test_token_unlocks_list_and_reveal(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                token = self.unlock(prefix)
+                response = self.reveal(prefix, {"unlock_token": token})
+                self.assertEqual(response.json()["data"]["content"], "Secret")
+                listed = self.data("post", f"{prefix}/journals/covert", {"unlock_token": token})
+                self.assertEqual([item["id"] for item in listed["items"]], [self.covert.id])
+
+    def test_wrong_pin_gets_no_token(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                response = self.request("post", f"{prefix}/journals/covert/unlock", {"pin": "0000"})
+                self.assertEqual(response.status_code, 403)
+
+    def test_token_is_rejected_after_the_pin_changes(self):
+        token = self.unlock()
+        self.user.user_profile.set_pin("5678")
+        self.assertRejected({"unlock_token": token})
+
+    def test_token_is_rejected_after_the_same_pin_is_set_again(self):
+        # A new salt gives a new hash, so even re-setting the same PIN revokes tokens.
+        token = self.unlock()
+        self.user.user_profile.set_pin("1234")
+        self.assertRejected({"unlock_token": token})
+
+    def test_token_is_rejected_for_another_user(self):
+        token = self.unlock()
+        other, other_auth = self.make_user("reader", pin="1234")
+        theirs = Journal.objects.create(owner=other, title="Theirs", content="Private", mood_tag="COVERT")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                response = self.request("post", f"{prefix}/journals/{theirs.id}/reveal", {"unlock_token": token}, auth=other_auth)
+                self.assertEqual(response.status_code, 403)
+                # Nor can a token reach another user's journal through its owner's account.
+                self.assertEqual(self.reveal(prefix, {"unlock_token": token}, auth=other_auth).status_code, 404)
+
+    def test_token_is_rejected_after_expiry(self):
+        issued = time.time() - settings.COVERT_UNLOCK_TOKEN_LIFETIME.total_seconds() - 1
+        with mock.patch("django.core.signing.time.time", return_value=issued):
+            token = self.unlock()
+        self.assertRejected({"unlock_token": token})
+
+    def test_tampered_token_is_rejected(self):
+        token = self.unlock()
+        self.assertRejected({"unlock_token": token[:-1] + ("B" if token.endswith("A") else "A")})
+
+    def test_covert_read_without_pin_or_token_is_rejected(self):
+        self.assertRejected({})
+        self.assertRejected({"pin": ""})
+        self.assertRejected({"pin": "0000"})
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                # The detail route never returns covert content.
+                self.assertIsNone(self.data("get", f"{prefix}/journals/{self.covert.id}")["content"])
+                body = {"format": "ndjson", "include_covert": True}
+                self.assertEqual(self.request("post", f"{prefix}/journals/export", body).status_code, 403)
+
+    def test_token_is_not_an_access_token(self):
+        token = self.unlock()
+        response = self.request("get", "/api/journals/", auth={"HTTP_AUTHORIZATION": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 401)
+
+
+class CounterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.user_profile.set_pin("1234")
+
+    def assertCountersMatch(self, user=None):
+        user = user or self.user
+        counted = dict(
+            JournalCounter.objects.filter(owner=user).exclude(count=0).values_list("mood_tag", "count")
+        )
+        actual = dict(
+            Journal.objects.filter(owner=user).order_by().values("mood_tag")
+            .annotate(total=Count("id")).values_list("mood_tag", "total")
+        )
+        self.assertEqual(counted, actual)
+
+    def test_counters_follow_every_write_path(self):
+        for prefix in PREFIXES:
+            for step in self.write_each_way(prefix):
+                with self.subTest(api=prefix, step=step):
+                    self.assertCountersMatch()
+                    visible = Journal.objects.filter(owner=self.user).exclude(mood_tag="COVERT")
+                    self.assertEqual(self.data("get", f"{prefix}/journals/?page_size=1")["count"], visible.count())
+                    merry = visible.filter(mood_tag="MERRY").count()
+                    self.assertEqual(self.data("get", f"{prefix}/journals/?mood_tag=MERRY")["count"], merry)
+                    covert = self.data("post", f"{prefix}/journals/covert", {"pin": "1234"})["count"]
+                    self.assertEqual(covert, Journal.objects.filter(owner=self.user, mood_tag="COVERT").count())
+        self.assertTrue(Journal.objects.filter(owner=self.user).exists())
+
+    def test_rebuild_repairs_drift(self):
+        self.create("/api", "Kept")
+        other, _ = self.make_user("other")
+        Journal.objects.create(owner=other, title="Theirs", content="x", mood_tag="MERRY")
+        counters.rebuild([other.id])
+        # Writes behind the API's back, and a corrupted counter.
+        Journal.objects.create(owner=self.user, title="Shell", content="x", mood_tag="GLOOMY")
+        Journal.objects.filter(owner=self.user, title="Kept").update(mood_tag="COVERT")
+        JournalCounter.objects.filter(owner=self.user, mood_tag="MERRY").update(count=40)
+        JournalCounter.objects.filter(owner=other).update(count=7)
+
+        out = io.StringIO()
+        call_command("rebuild_journal_counters", user_ids=[self.user.id], stdout=out)
+        self.assertIn("Rebuilt 2 journal counter(s).", out.getvalue())
+        self.assertCountersMatch()
+        # Only the given users are rebuilt; a full rebuild fixes everyone.
+        self.assertEqual(counters.journal_count(other), 7)
+        call_command("rebuild_journal_counters", stdout=out)
+        self.assertCountersMatch(other)
+
+
+class BulkTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other, self.other_auth = self.make_user("other", pin="1234")
+
+    def seed(self, user, specs):
+        """Creates journals ``(days ago, mood)`` and rebuilds the derived data. Returns their ids."""
+        now = timezone.now()
+        ids = [
+            Journal.objects.create(owner=user, title=f"Seed {n}", content="x", mood_tag=mood).id
+            for n, (_, mood) in enumerate(specs)
+        ]
+        for journal_id, (days_ago, _) in zip(ids, specs):
+            Journal.objects.filter(id=journal_id).update(date_added=now - timezone.timedelta(days=days_ago))
+        counters.rebuild([user.id])
+        rollups.rebuild([user.id])
+        streaks.recompute([user.id])
+        return ids
+
+    def derived(self, user):
+        profile = UserProfile.objects.get(user=user)
+        return {
+            "counters": dict(JournalCounter.objects.filter(owner=user, count__gt=0).values_list("mood_tag", "count")),
+            "rollups": set(
+                JournalDailyRollup.objects.filter(owner=user, count__gt=0).values_list("day", "mood_tag", "count")
+            ),
+            "streak": (profile.current_streak, profile.longest_streak, profile.last_content_date),
+        }
+
+    def test_per_item_results(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                created = self.data("post", f"{prefix}/journals/bulk", {"items": [
+                    {"title": "One", "content": "x", "mood_tag": "MERRY"},
+                    {"title": "Hidden", "content": "x", "mood_tag": "COVERT"},  # no PIN
+                    {"title": "Two", "content": "x", "mood_tag": "GLOOMY"},
+                ]})
+                self.assertEqual((created["succeeded"], created["failed"]), (2, 1))
+                self.assertEqual([r["status"] for r in created["results"]], ["created", "error", "created"])
+                self.assertEqual([r["index"] for r in created["results"]], [0, 1, 2])
+                self.assertIn("PIN", created["results"][1]["error"])
+                self.assertEqual(created["results"][2]["journal"]["title"], "Two")
+                first, _, second = [r["id"] for r in created["results"]]
+
+                updated = self.data("put", f"{prefix}/journals/bulk", {"items": [
+                    {"id": first, "title": "One, edited"},
+                    {"id": 0, "title": "Missing"},
+                    {"id": second, "mood_tag": "COVERT"},
+                    {"id": first, "title": "Twice"},
+                ]})
+                self.assertEqual([r["status"] for r in updated["results"]], ["updated", "not_found", "error", "error"])
+                self.assertEqual((updated["succeeded"], updated["failed"]), (1, 3))
+                self.assertEqual(Journal.objects.get(id=first).title, "One, edited")
+                self.assertEqual(Journal.objects.get(id=second).mood_tag, "GLOOMY")
+
+                deleted = self.data("delete", f"{prefix}/journals/bulk", {"ids": [second, 0, first]})
+                self.assertEqual([r["status"] for r in deleted["results"]], ["deleted", "not_found", "deleted"])
+                self.assertEqual([r["id"] for r in deleted["results"]], [second, 0, first])
+                self.assertFalse(Journal.objects.filter(id__in=[first, second]).exists())
+
+    @override_settings(JOURNAL_BULK_MAX_ITEMS=2)
+    def test_oversized_batches_are_rejected(self):
+        items = [{"title": f"T{n}", "content": "x", "mood_tag": "MERRY"} for n in range(3)]
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.request("post", f"{prefix}/journals/bulk", {"items": items}).status_code, 400)
+        self.assertFalse(Journal.objects.exists())
+
+    def test_other_users_journals_are_not_found(self):
+        theirs = self.seed(self.other, [(0, "MERRY")])[0]
+        before = self.derived(self.other)
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                updated = self.data("put", f"{prefix}/journals/bulk", {"items": [{"id": theirs, "title": "Mine now"}]})
+                self.assertEqual(updated["results"][0]["status"], "not_found")
+                deleted = self.data("delete", f"{prefix}/journals/bulk", {"ids": [theirs]})
+                self.assertEqual(deleted["results"][0]["status"], "not_found")
+        journal = Journal.objects.get(id=theirs)
+        self.assertEqual(journal.title, "Seed 0")
+        self.assertEqual(self.derived(self.other), before)
+        self.assertFalse(JournalTombstone.objects.exists())
+
+    def test_a_failing_write_rolls_back_the_whole_batch(self):
+        ids = self.seed(self.user, [(0, "MERRY"), (1, "GLOOMY")])
+        before = self.derived(self.user)
+        version = UserProfile.objects.get(user=self.user).journals_version
+        create_items = [JournalCreateSchema(title=f"T{n}", content="x", mood_tag="MERRY") for n in range(3)]
+        update_items = [JournalBulkUpdateItemSchema(id=journal_id, mood_tag="GLOOMY") for journal_id in ids]
+        calls = [
+            lambda: bulk.bulk_create_journals(self.user, create_items),
+            lambda: bulk.bulk_update_journals(self.user, update_items),
+            lambda: bulk.bulk_delete_journals(self.user, ids),
+        ]
+        for call in calls:
+            # The last step of every batch fails after the journals were written.
+            with self.subTest(call=call), mock.patch.object(bulk.etags, "bump_journals_version", side_effect=OperationalError):
+                with self.assertRaises(OperationalError):
+                    call()
+                self.assertEqual(
+                    sorted(Journal.objects.filter(owner=self.user).values_list("id", "mood_tag")),
+                    [(ids[0], "MERRY"), (ids[1], "GLOOMY")],
+                )
+                self.assertEqual(self.derived(self.user), before)
+                self.assertFalse(JournalTombstone.objects.exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).journals_version, version)
+
+    def test_bulk_deltas_match_the_single_item_endpoints(self):
+        specs = [(0, "MERRY"), (1, "GLOOMY"), (1, "MERRY"), (2, "COVERT"), (5, "MERRY")]
+        self.user.user_profile.set_pin("1234")
+        single_ids = self.seed(self.user, specs)
+        bulk_ids = self.seed(self.other, specs)
+        self.assertEqual(self.derived(self.user), self.derived(self.other))
+
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                for title, mood in (("New merry", "MERRY"), ("New covert", "COVERT")):
+                    self.create(prefix, title, mood_tag=mood)
+                self.data("post", f"{prefix}/journals/bulk", {"items": [
+                    {"title": "New merry", "content": "x", "mood_tag": "MERRY"},
+                    {"title": "New covert", "content": "x", "mood_tag": "COVERT"},
+                ]}, auth=self.other_auth)
+                self.assertEqual(self.derived(self.user), self.derived(self.other))
+
+        changes = [(1, "COVERT"), (3, "GLOOMY"), (4, "GLOOMY")]
+        for position, mood in changes:
+            self.data("put", f"/api/journals/{single_ids[position]}", {"mood_tag": mood})
+        self.data("put", "/api/journals/bulk", {"items": [
+            {"id": bulk_ids[position], "mood_tag": mood} for position, mood in changes
+        ]}, auth=self.other_auth)
+        self.assertEqual(self.derived(self.user), self.derived(self.other))
+
+        # Deleting yesterday's entries breaks the streak for both.
+        for position in (1, 2, 4):
+            self.request("delete", f"/api/async/journals/{single_ids[position]}")
+        self.data("delete", "/api/async/journals/bulk", {"ids": [bulk_ids[p] for p in (1, 2, 4)]}, auth=self.other_auth)
+        derived = self.derived(self.user)
+        self.assertEqual(derived, self.derived(self.other))
+        self.assertEqual(derived["streak"][0], 1)
+        self.assertEqual(
+            JournalTombstone.objects.filter(owner=self.user).count(),
+            JournalTombstone.objects.filter(owner=self.other).count(),
+        )
+
+
+class SyncTests(ApiTestCase):
+    def sync(self, prefix, since=None, limit=100):
+        query = f"?limit={limit}" + (f"&since={since}" if since else "")
+        return self.data("get", f"{prefix}/journals/sync{query}")
+
+    def test_deletes_reach_the_next_sync_as_tombstones(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                single, first, second, kept = (self.create(prefix, f"Entry {n}") for n in range(4))
+                since = self.sync(prefix)["next_since"]
+                self.request("delete", f"{prefix}/journals/{single}")
+                self.data("delete", f"{prefix}/journals/bulk", {"ids": [first, second, 0]})
+
+                page = self.sync(prefix, since)
+                # The overlap may resend earlier deletions, so only these are checked.
+                self.assertLessEqual({single, first, second}, set(page["deletions"]))
+                self.assertNotIn(kept, page["deletions"])
+                self.assertFalse({single, first, second} & {journal["id"] for journal in page["upserts"]})
+
+    def test_full_sync_has_no_deletions(self):
+        journal_id = self.create("/api", "Doomed")
+        self.request("delete", f"/api/journals/{journal_id}")
+        page = self.sync("/api")
+        self.assertEqual((page["upserts"], page["deletions"]), ([], []))
+
+    def test_pages_through_journals_with_equal_timestamps(self):
+        ids = [self.create("/api", f"Entry {n}") for n in range(5)]
+        tied = timezone.now() - timezone.timedelta(minutes=1)
+        Journal.objects.filter(id__in=ids).update(updated_at=tied)
+        since = sync.encode_sync_token(tied - timezone.timedelta(seconds=1))
+
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                seen, pages, token = [], 0, since
+                while True:
+                    page = self.sync(prefix, token, limit=2)
+                    seen += [journal["id"] for journal in page["upserts"]]
+                    pages += 1
+                    token = page["next_since"]
+                    if not page["has_more"]:
+                        break
+                self.assertEqual(seen, sorted(ids))
+                self.assertEqual(pages, 3)
+
+    def test_covert_content_is_never_returned(self):
+        self.user.user_profile.set_pin("1234")
+        covert_id = Journal.objects.create(owner=self.user, title="Hidden", content="Secret", mood_tag="COVERT").id
+        plain_id = self.create("/api", "Plain")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                since = self.sync(prefix)["next_since"]
+                full = {journal["id"]: journal for journal in self.sync(prefix)["upserts"]}
+                self.assertIsNone(full[covert_id]["content"])
+                self.assertTrue(full[covert_id]["is_covert"])
+
+                # Entries turned covert since the last sync come without content too.
+                self.data("put", f"{prefix}/journals/{plain_id}", {"mood_tag": "COVERT"})
+                changed = {journal["id"]: journal for journal in self.sync(prefix, since)["upserts"]}
+                self.assertIsNone(changed[plain_id]["content"])
+                self.assertTrue(changed[plain_id]["is_covert"])
+                self.assertNotIn("Secret", json.dumps(changed))
+                self.data("put", f"{prefix}/journals/{plain_id}", {"mood_tag": "MERRY"})
+
+
+class EtagTests(ApiTestCase):
+    def revalidate(self, prefix, etag):
+        return self.request("get", f"{prefix}/journals/", HTTP_IF_NONE_MATCH=etag)
+
+    def test_every_write_changes_the_etag(self):
+        self.user.user_profile.set_pin("1234")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                etag = self.request("get", f"{prefix}/journals/")["ETag"]
+                seen = {etag}
+                for step in self.write_each_way(prefix):
+                    with self.subTest(step=step):
+                        response = self.revalidate(prefix, etag)
+                        self.assertEqual(response.status_code, 200)
+                        self.assertNotIn(response["ETag"], seen)
+                        etag = response["ETag"]
+                        seen.add(etag)
+                        self.assertEqual(self.revalidate(prefix, etag).status_code, 304)
+
+    def test_stale_etags_get_a_full_response(self):
+        self.create("/api", "Entry")
+        stale = self.request("get", "/api/journals/")["ETag"]
+        self.create("/api", "Another")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                response = self.revalidate(prefix, stale)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["data"]["count"], 2)
+                self.assertNotEqual(response["ETag"], stale)
+                self.assertEqual(self.revalidate(prefix, f'"other", {response["ETag"]}').status_code, 304)
+
+    def test_detail_etag_follows_the_journals_version(self):
+        journal_id = self.create("/api", "Entry")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                path = f"{prefix}/journals/{journal_id}"
+                etag = self.request("get", path)["ETag"]
+                self.assertEqual(self.request("get", path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.data("put", path, {"title": f"Renamed for {prefix}"})
+                response = self.request("get", path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["data"]["title"], f"Renamed for {prefix}")
+
+
+class ImportTests(ApiTestCase):
+    def rollup_days(self):
+        return set(JournalDailyRollup.objects.filter(owner=self.user, count__gt=0).values_list("day", "mood_tag", "count"))
+
+    def import_offset_record(self):
+        data = self.import_records("/api", [
+            {"title": "Offset", "content": "x", "mood_tag": "MERRY", "date_added": "2024-01-01T01:00:00+05:00"},
+        ])
+        self.assertEqual(data["created"], 1)
+        return Journal.objects.get(owner=self.user, title="Offset")
+
+    def assert_rollups_match_rebuild(self):
+        imported = self.rollup_days()
+        rollups.rebuild([self.user.id])
+        self.assertEqual(imported, self.rollup_days())
+
+    def test_offsets_are_bucketed_by_the_stored_day(self):
+        journal = self.import_offset_record()
+        self.assertEqual(journal.date_added, datetime(2023, 12, 31, 20, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.rollup_days(), {(date(2023, 12, 31), "MERRY", 1)})
+        self.assert_rollups_match_rebuild()
+
+    @override_settings(TIME_ZONE="Asia/Karachi")
+    def test_offsets_are_bucketed_by_the_utc_day_in_any_time_zone(self):
+        self.import_offset_record()
+        self.assertEqual(self.rollup_days(), {(date(2023, 12, 31), "MERRY", 1)})
+        self.assert_rollups_match_rebuild()
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class StreakTests(TestCase):
+    # Days before today, per scenario, with the expected (current, longest)
+    # streak: the current streak is the latest run, wherever it ends.
+    SCENARIOS = {
+        "single day": ([0], (1, 1)),
+        "ends today": ([0, 1, 2, 5, 6], (3, 3)),
+        "ends yesterday": ([1, 2, 5, 6, 7, 8], (2, 4)),
+        "ends long ago": ([30, 31, 40], (2, 2)),
+        "gaps": ([0, 2, 4, 6], (1, 1)),
+        "duplicate days": ([0, 0, 1, 1, 1, 3], (2, 2)),
+    }
+
+    def setUp(self):
+        self.today = timezone.now().date()
+
+    def make_user(self, name, days_ago):
+        """A user with a journal on each of ``days_ago``; repeated days get entries at both ends of the day."""
+        user = User.objects.create_user(name, f"{name}@example.com", "s3cret-pass")
+        seen = set()
+        for n, days in enumerate(days_ago):
+            day = self.today - timezone.timedelta(days=days)
+            hour = 23 if day in seen else 0
+            seen.add(day)
+            journal = Journal.objects.create(owner=user, title=f"Entry {n}", content="x", mood_tag="MERRY")
+            added = datetime(day.year, day.month, day.day, hour, 30, tzinfo=dt_timezone.utc)
+            Journal.objects.filter(id=journal.id).update(date_added=added)
+        return user
+
+    def python_streak(self, user):
+        days = Journal.objects.filter(owner=user).dates("date_added", "day")
+        return streaks._streak_from_days(days)
+
+    def test_sql_matches_python(self):
+        users = {name: self.make_user(name.replace(" ", "-"), days) for name, (days, _) in self.SCENARIOS.items()}
+        computed = streaks.compute_streaks([user.id for user in users.values()])
+        for name, (days, expected) in self.SCENARIOS.items():
+            with self.subTest(scenario=name):
+                user = users[name]
+                self.assertEqual(computed[user.id], self.python_streak(user))
+                current, longest, last = computed[user.id]
+                self.assertEqual((current, longest), expected)
+                self.assertEqual(last, self.today - timezone.timedelta(days=min(days)))
+
+    def test_users_without_journals_have_no_streak(self):
+        user = User.objects.create_user("empty", "empty@example.com", "s3cret-pass")
+        self.assertEqual(streaks.compute_streaks([user.id]), {})
+        self.assertEqual(streaks._streak_from_days([]), streaks.NO_STREAK)
+
+    def test_deletes_recompute_the_streak(self):
+        user = self.make_user("deleter", [0, 1, 1, 2, 3])
+        streaks.recompute([user.id])
+        newest_first = list(Journal.objects.filter(owner=user).order_by("-date_added"))
+        # One of yesterday's two entries keeps the run; the day before's only one splits it.
+        for journal, expected in ((newest_first[1], (4, 4)), (newest_first[3], (2, 2))):
+            day = journal.date_added.date()
+            with self.subTest(day=day):
+                journal.delete()
+                streaks.journals_deleted(user.id, [day])
+                profile = UserProfile.objects.get(user=user)
+                stored = (profile.current_streak, profile.longest_streak, profile.last_content_date)
+                self.assertEqual(stored, self.python_streak(user))
+                self.assertEqual(stored, streaks.compute_streaks([user.id])[user.id])
+                self.assertEqual(stored, (*expected, self.today))
+
+
+class StatsTests(ApiTestCase):
+    def seed(self, specs):
+        """Creates journals ``(day, mood)`` and rebuilds the rollups."""
+        for n, (day, mood) in enumerate(specs):
+            journal = Journal.objects.create(owner=self.user, title=f"Entry {n}", content="x", mood_tag=mood)
+            added = datetime(day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc)
+            Journal.objects.filter(id=journal.id).update(date_added=added)
+        rollups.rebuild([self.user.id])
+
+    def rollup_rows(self):
+        return set(JournalDailyRollup.objects.filter(owner=self.user, count__gt=0).values_list("day", "mood_tag", "count"))
+
+    def test_heatmap_rejects_years_out_of_range(self):
+        for prefix in PREFIXES:
+            for year in (0, 10000, -1):
+                with self.subTest(api=prefix, year=year):
+                    response = self.request("get", f"{prefix}/journals/stats/heatmap?year={year}")
+                    self.assertEqual(response.status_code, 422)
+            for year in (1, 9999):
+                with self.subTest(api=prefix, year=year):
+                    self.assertEqual(self.data("get", f"{prefix}/journals/stats/heatmap?year={year}")["total"], 0)
+
+    def test_stats(self):
+        self.seed([
+            (date(2024, 1, 1), "MERRY"),
+            (date(2024, 1, 1), "GLOOMY"),
+            (date(2024, 1, 2), "MERRY"),
+            (date(2024, 1, 10), "COVERT"),
+            (date(2024, 2, 5), "MERRY"),
+            (date(2024, 2, 8), "GLOOMY"),
+            (date(2023, 12, 31), "MERRY"),
+        ])
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                heatmap = self.data("get", f"{prefix}/journals/stats/heatmap?year=2024")
+                self.assertEqual(heatmap["year"], 2024)
+                self.assertEqual(heatmap["total"], 5)
+                self.assertEqual(
+                    [(day["day"], day["count"]) for day in heatmap["days"]],
+                    [("2024-01-01", 2), ("2024-01-02", 1), ("2024-02-05", 1), ("2024-02-08", 1)],
+                )
+                self.assertEqual(self.data("get", f"{prefix}/journals/stats/heatmap")["year"], timezone.now().year)
+
+                moods = self.data("get", f"{prefix}/journals/stats/moods?start=2024-01-01&end=2024-02-05")
+                self.assertEqual(moods["totals"], {"MERRY": 3, "GLOOMY": 1})
+                self.assertEqual(
+                    [(month["month"], month["counts"]) for month in moods["months"]],
+                    [("2024-01-01", {"GLOOMY": 1, "MERRY": 2}), ("2024-02-01", {"MERRY": 1})],
+                )
+                self.assertEqual(self.data("get", f"{prefix}/journals/stats/moods")["totals"], {"MERRY": 4, "GLOOMY": 2})
+
+                # Covert days don't count as active, so Jan 10 is part of a gap.
+                gaps = self.data("get", f"{prefix}/journals/stats/gaps?limit=2")["gaps"]
+                self.assertEqual(gaps, [
+                    {"start": "2024-01-03", "end": "2024-02-04", "days": 33},
+                    {"start": "2024-02-06", "end": "2024-02-07", "days": 2},
+                ])
+
+    def test_every_write_path_keeps_the_rollups_current(self):
+        self.user.user_profile.set_pin("1234")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                for step in self.write_each_way(prefix):
+                    with self.subTest(step=step):
+                        kept = self.rollup_rows()
+                        rollups.rebuild([self.user.id])
+                        self.assertEqual(kept, self.rollup_rows())
+
+        # Covert entries are kept in the rollups but left out of the stats.
+        visible = Journal.objects.filter(owner=self.user).exclude(mood_tag="COVERT")
+        this_year = timezone.now().year
+        heatmap = self.data("get", f"/api/journals/stats/heatmap?year={this_year}")
+        self.assertEqual(heatmap["total"], visible.filter(date_added__year=this_year).count())
+        self.assertEqual(self.data("get", "/api/journals/stats/heatmap?year=2020")["total"], 2)
+        moods = self.data("get", "/api/journals/stats/moods")["totals"]
+        self.assertEqual(moods, dict(visible.values_list("mood_tag").annotate(count=Count("id"))))
+
+    @override_settings(TIME_ZONE="Pacific/Kiritimati")
+    def test_rollup_days_are_utc_in_any_time_zone(self):
+        # UTC+14: most UTC days end on the next local day.
+        self.user.user_profile.set_pin("1234")
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                for step in self.write_each_way(prefix):
+                    with self.subTest(step=step):
+                        kept = self.rollup_rows()
+                        rollups.rebuild([self.user.id])
+                        self.assertEqual(kept, self.rollup_rows())
+
+        self.import_records("/api", [
+            {"title": "Noon", "content": "x", "mood_tag": "GLOOMY", "date_added": "2021-06-01T12:00:00+00:00"},
+        ])
+        self.assertIn((date(2021, 6, 1), "GLOOMY", 1), self.rollup_rows())
+        kept = self.rollup_rows()
+        rollups.rebuild([self.user.id])
+        self.assertEqual(kept, self.rollup_rows())
+
+
+class ExportTests(ApiTestCase):
+    FIELDS = ("title", "content", "mood_tag", "date_added")
+
+    def setUp(self):
+        super().setUp()
+        self.user.user_profile.set_pin("1234")
+        self.data("post", "/api/journals/", {"title": "First", "content": "Line one\nLine two", "mood_tag": "MERRY"})
+        self.data("post", "/api/journals/", {"title": 'Café "quoted"', "content": "Ünïcode ✓", "mood_tag": "GLOOMY"})
+        self.data("post", "/api/journals/", {"title": "Secret", "content": "Hidden", "mood_tag": "COVERT"})
+
+    def export(self, prefix, body, expected=200):
+        response = self.request("post", f"{prefix}/journals/export", body)
+        self.assertEqual(response.status_code, expected)
+        if expected != 200:
+            return None
+        if response.is_async:
+            return async_to_sync(self._aread)(response)
+        return b"".join(response.streaming_content)
+
+    async def _aread(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    def ndjson_rows(self, content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def markdown_files(self, content):
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            return {name: archive.read(name).decode() for name in archive.namelist()}
+
+    def stored(self, user, include_covert=True):
+        journals = Journal.objects.filter(owner=user).order_by("date_added", "id")
+        if not include_covert:
+            journals = journals.exclude(mood_tag="COVERT")
+        return list(journals.values_list(*self.FIELDS))
+
+    def test_ndjson_export(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                rows = self.ndjson_rows(self.export(prefix, {"format": "ndjson"}))
+                self.assertEqual([set(row) for row in rows], [set(export.EXPORT_FIELDS)] * 2)
+                self.assertEqual(
+                    [(row["title"], row["content"], row["mood_tag"], parse_datetime(row["date_added"])) for row in rows],
+                    self.stored(self.user, include_covert=False),
+                )
+
+    def test_zip_export(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                files = self.markdown_files(self.export(prefix, {"format": "zip"}))
+                self.assertEqual(len(files), 2)
+                for name, text in files.items():
+                    self.assertTrue(name.endswith(".md"), name)
+                    self.assertTrue(text.startswith("---\n"), text)
+                parsed = sorted((parse_markdown(text, name) for name, text in files.items()), key=lambda row: row["date_added"])
+                self.assertEqual(
+                    [(row["title"], row["content"], row["mood_tag"], parse_datetime(row["date_added"])) for row in parsed],
+                    self.stored(self.user, include_covert=False),
+                )
+
+    def test_covert_entries_need_the_pin_or_an_unlock_token(self):
+        token = self.data("post", "/api/journals/covert/unlock", {"pin": "1234"})["unlock_token"]
+        for prefix in PREFIXES:
+            for export_format in ("ndjson", "zip"):
+                with self.subTest(api=prefix, format=export_format):
+                    def titles(body):
+                        content = self.export(prefix, {"format": export_format, **body})
+                        if export_format == "ndjson":
+                            return {row["title"] for row in self.ndjson_rows(content)}
+                        return {parse_markdown(text, name)["title"] for name, text in self.markdown_files(content).items()}
+
+                    visible = {"First", 'Café "quoted"'}
+                    self.assertEqual(titles({}), visible)
+                    # Credentials alone don't opt in.
+                    self.assertEqual(titles({"pin": "1234"}), visible)
+                    self.assertEqual(titles({"include_covert": True, "pin": "1234"}), visible | {"Secret"})
+                    self.assertEqual(titles({"include_covert": True, "unlock_token": token}), visible | {"Secret"})
+                    self.export(prefix, {"format": export_format, "include_covert": True, "pin": "0000"}, expected=403)
+                    self.export(prefix, {"format": export_format, "include_covert": True, "unlock_token": "bogus"}, expected=403)
+
+    def test_round_trip(self):
+        for prefix in PREFIXES:
+            for export_format in ("ndjson", "zip"):
+                with self.subTest(api=prefix, format=export_format):
+                    content = self.export(prefix, {"format": export_format, "include_covert": True, "pin": "1234"})
+                    copy, auth = self.make_user(f"copy-{export_format}{prefix.replace('/', '-')}", pin="1234")
+                    upload = SimpleUploadedFile(f"export.{export_format}", content)
+                    with self.captureOnCommitCallbacks(execute=True):
+                        response = self.client.post(f"{prefix}/journals/import", {"file": upload}, **auth)
+                    self.assertEqual(response.status_code, 200, response.content)
+                    self.assertEqual(response.json()["data"]["created"], 3)
+                    self.assertEqual(self.stored(copy), self.stored(self.user))
+
+
+class ProjectionTests(ApiTestCase):
+    ALWAYS = {"id", "date_added", "mood_tag", "is_covert"}
+
+    def setUp(self):
+        super().setUp()
+        self.user.user_profile.set_pin("1234")
+        self.content = "word " * settings.JOURNAL_EXCERPT_LENGTH
+        for title, mood_tag in (("Long", "MERRY"), ("Hidden", "COVERT")):
+            self.data("post", "/api/journals/", {"title": title, "content": self.content, "mood_tag": mood_tag})
+
+    def items(self, prefix, query, covert=False):
+        if covert:
+            return self.data("post", f"{prefix}/journals/covert?{query}", {"pin": "1234"})["items"]
+        return self.data("get", f"{prefix}/journals/?{query}")["items"]
+
+    def test_summary_view(self):
+        for prefix in PREFIXES:
+            for covert in (False, True):
+                with self.subTest(api=prefix, covert=covert):
+                    [item] = self.items(prefix, "view=summary", covert)
+                    self.assertEqual(set(item), self.ALWAYS | {"title", "excerpt", "content_length"})
+                    self.assertEqual(item["excerpt"], self.content[:settings.JOURNAL_EXCERPT_LENGTH])
+                    self.assertEqual(item["content_length"], len(self.content))
+                    self.assertEqual(item["is_covert"], covert)
+
+    @override_settings(JOURNAL_EXCERPT_LENGTH=12)
+    def test_excerpt_length_is_configurable(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                [item] = self.items(prefix, "view=summary")
+                self.assertEqual(item["excerpt"], "word word wo")
+
+    def test_fields(self):
+        for prefix in PREFIXES:
+            for covert in (False, True):
+                with self.subTest(api=prefix, covert=covert):
+                    [item] = self.items(prefix, "fields=title", covert)
+                    self.assertEqual(set(item), self.ALWAYS | {"title"})
+                    [item] = self.items(prefix, "fields=content_length,excerpt&view=full", covert)
+                    self.assertEqual(set(item), self.ALWAYS | {"content_length", "excerpt"})
+
+    def test_full_view_is_the_default(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                [item] = self.items(prefix, "")
+                self.assertEqual(item["content"], self.content)
+                self.assertNotIn("excerpt", item)
+
+    def test_unknown_fields_are_rejected(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                response = self.request("get", f"{prefix}/journals/?fields=title,bogus")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("bogus", response.json()["detail"])
+                response = self.request("post", f"{prefix}/journals/covert?fields=bogus", {"pin": "1234"})
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SyntheticDataTests(TestCase):
+    def test_generate_journals_command(self):
+        call_command("generate_journals", users=3, journals=40, seed=7, covert_ratio=0.25, stdout=io.StringIO())
+
+        users = User.objects.filter(username__startswith="synthetic-").select_related("user_profile")
+        self.assertEqual(users.count(), 3)
+        for user in users:
+            journals = Journal.objects.filter(owner=user)
+            self.assertEqual(journals.count(), 40)
+            self.assertTrue(journals.filter(mood_tag="COVERT").exists())
+            self.assertTrue(user.check_password(synthetic.DEFAULT_PASSWORD))
+            self.assertTrue(user.user_profile.check_pin(synthetic.DEFAULT_PIN))
+            self.assertGreater(user.user_profile.longest_streak, 0)
+            self.assertEqual(counters.journal_count(user), 40)
+            # Entries are spread over past days, not all stamped "now".
+            self.assertGreater(len(journals.dates("date_added", "day")), 1)
+
+    def test_seed_is_reproducible(self):
+        def titles(prefix):
+            synthetic.generate(2, 10, seed=3, prefix=prefix)
+            return list(Journal.objects.filter(owner__username__startswith=prefix).order_by("id")
+                        .values_list("title", "mood_tag", "content"))
+
+        self.assertEqual(titles("first"), titles("second"))
+
+    def test_usernames_continue_after_existing_users(self):
+        synthetic.generate(2, 0)
+        synthetic.generate(1, 0)
+        self.assertEqual(
+            sorted(User.objects.filter(username__startswith="synthetic-").values_list("username", flat=True)),
+            ["synthetic-0", "synthetic-1", "synthetic-2"],
+        )
+        self.assertFalse(JournalCounter.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        refresh_tokens.recently_blacklisted.clear()
+        self.user = User.objects.create_user("writer", "writer@example.com", "s3cret-pass")
+        self.refresh = str(tokens_for_user(self.user))
+
+    def test_rotation_blacklists_the_old_token(self):
+        new_token = refresh_tokens.rotate(self.refresh)
+        self.assertEqual(new_token["user_id"], self.user.id)
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.user).count(), 1)
+        with self.assertRaises(TokenError):
+            refresh_tokens.rotate(self.refresh)
+
+    def test_replays_are_rejected_from_memory(self):
+        refresh_tokens.rotate(self.refresh)
+        with self.assertRaises(TokenError):
+            refresh_tokens.rotate(self.refresh)
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            refresh_tokens.rotate(self.refresh)
+
+    def test_removing_a_blacklist_entry_clears_the_cache(self):
+        refresh_tokens.rotate(self.refresh)
+        with self.assertRaises(TokenError):
+            refresh_tokens.rotate(self.refresh)
+        BlacklistedToken.objects.all().delete()
+        self.assertEqual(len(refresh_tokens.recently_blacklisted), 0)
+        refresh_tokens.rotate(self.refresh)
+
+    def test_refresh_route_rejects_reused_and_invalid_tokens(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                refresh = str(tokens_for_user(self.user))
+                url = f"{prefix}/auth/token/refresh"
+                for token, status in ((refresh, 200), (refresh, 401), ("garbage", 401)):
+                    response = self.client.post(url, {"refresh": token}, content_type="application/json")
+                    self.assertEqual(response.status_code, status)
+
+    def test_prune_deletes_only_expired_tokens(self):
+        now = timezone.now()
+        expired = OutstandingToken.objects.bulk_create(
+            OutstandingToken(user=self.user, jti=f"old-{i}", token="x", expires_at=now - timezone.timedelta(days=1))
+            for i in range(5)
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in expired[:3])
+        refresh_tokens.rotate(self.refresh)
+
+        self.assertEqual(refresh_tokens.prune_expired(batch_size=2), 5)
+        self.assertFalse(OutstandingToken.objects.filter(jti__startswith="old-").exists())
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+@override_settings(SQLITE_TUNING=True, SQLITE_PRAGMAS={**settings.SQLITE_PRAGMAS, "busy_timeout": 2000})
+class SQLiteTuningTests(SimpleTestCase):
+    """Runs on a scratch database file, outside the test database, with its own connections."""
+
+    alias = "sqlite_tuning"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, "tuning.sqlite3")
+        connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE entry (id INTEGER PRIMARY KEY, writer TEXT)")
+        connection.close()
+
+    def connect(self, transaction_mode=None):
+        settings_dict = {
+            **connections["default"].settings_dict,
+            "NAME": self.path,
+            "OPTIONS": {"transaction_mode": transaction_mode} if transaction_mode else {},
+        }
+        return DatabaseWrapper(settings_dict, alias=self.alias)
+
+    def test_new_connections_are_tuned(self):
+        connection = self.connect()
+        self.addCleanup(connection.close)
+        self.assertEqual(
+            sqlite_tuning.current_pragmas(connection, settings.SQLITE_PRAGMAS),
+            {**settings.SQLITE_PRAGMAS, "journal_mode": "wal", "synchronous": 1, "busy_timeout": 2000},
+        )
+
+    @override_settings(SQLITE_TUNING=False)
+    def test_tuning_can_be_turned_off(self):
+        connection = self.connect()
+        self.addCleanup(connection.close)
+        # setUp created the file tuned, so it stays in WAL; the rest is per connection.
+        self.assertEqual(sqlite_tuning.current_pragmas(connection, ["mmap_size", "cache_size"]),
+                         {"mmap_size": 0, "cache_size": -2000})
+
+    def test_invalid_pragmas_are_rejected(self):
+        for pragmas in ({"journal_mode; DROP": "WAL"}, {"journal_mode": "WAL; DROP"}, {"cache_size": 1.5}):
+            with self.subTest(pragmas=pragmas), self.assertRaises(ImproperlyConfigured):
+                sqlite_tuning.pragma_statements(pragmas)
+
+    def concurrent_writes(self, transaction_mode, writers=2):
+        """Each writer reads, waits for the others to have read too, then writes."""
+        barrier = threading.Barrier(writers, timeout=0.5)
+        errors = []
+
+        def write(name):
+            connections[self.alias] = connection = self.connect(transaction_mode)
+            try:
+                with transaction.atomic(using=self.alias):
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*) FROM entry")
+                        try:
+                            barrier.wait()
+                        except threading.BrokenBarrierError:
+                            # Held up at BEGIN until the others committed.
+                            pass
+                        cursor.execute("INSERT INTO entry (writer) VALUES (%s)", [name])
+            except OperationalError as exc:
+                errors.append(str(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(f"writer-{n}",)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM entry")
+            rows = cursor.fetchone()[0]
+        connection.close()
+        return rows, errors
+
+    def test_deferred_transactions_fail_to_upgrade_to_writes(self):
+        rows, errors = self.concurrent_writes("DEFERRED")
+        self.assertEqual(rows, 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("locked", errors[0])
+
+    def test_immediate_transactions_queue_concurrent_writers(self):
+        rows, errors = self.concurrent_writes("IMMEDIATE", writers=4)
+        self.assertEqual(errors, [])
+        self.assertEqual(rows, 4)
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica"],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    ``replica`` is a second SQLite file that only changes when `sync_replica`
+    copies the primary into it, so anything written since is "replication lag".
+    """
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        # A connection set on the handler directly (not in DATABASES), which
+        # the test framework allows without declaring it in ``databases``.
+        replica = DatabaseWrapper(
+            {**connections["default"].settings_dict, "NAME": os.path.join(tmpdir, "replica.sqlite3")},
+            alias="replica",
+        )
+        connections["replica"] = replica
+        self.addCleanup(connections.__delitem__, "replica")
+        self.addCleanup(replica.close)
+
+        caches["default"].clear()
+        self.user = User.objects.create_user("writer", "writer@example.com", "s3cret-pass")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.synced = self.make_journal("Replicated")
+        self.sync_replica()
+        self.lagging = self.make_journal("Not replicated yet")
+
+    def sync_replica(self):
+        primary, replica = connections["default"], connections["replica"]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def make_journal(self, title):
+        journal = Journal.objects.create(owner=self.user, title=title, content=f"{title} content", mood_tag="MERRY")
+        counters.journal_created(self.user.id, "MERRY")
+        rollups.journal_created(self.user.id, journal.date_added.date(), "MERRY")
+        return journal
+
+    def listed_titles(self, prefix):
+        response = self.client.get(f"{prefix}/journals/", **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [item["title"] for item in response.json()["data"]["items"]]
+
+    def test_marked_reads_go_to_a_replica(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                self.assertEqual(self.listed_titles(prefix), ["Replicated"])
+                response = self.client.get(f"{prefix}/journals/{self.lagging.id}", **self.auth)
+                self.assertEqual(response.status_code, 404)
+                response = self.client.get(f"{prefix}/journals/search/?q=replicated", **self.auth)
+                self.assertEqual(response.json()["data"]["count"], 1)
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                caches["default"].clear()
+                body = {"title": f"Written via {prefix}", "content": "Fresh.", "mood_tag": "MERRY"}
+                response = self.client.post(f"{prefix}/journals/", json.dumps(body), content_type="application/json", **self.auth)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(replicas.is_pinned(self.user.id))
+                self.assertIn(body["title"], self.listed_titles(prefix))
+                self.assertIn("Not replicated yet", self.listed_titles(prefix))
+
+                # Once the pin expires, reads go back to the replica.
+                caches["default"].clear()
+                self.assertEqual(self.listed_titles(prefix), ["Replicated"])
+
+    def test_other_reads_use_the_primary(self):
+        response = self.client.get("/api/journals/sync", **self.auth)
+        titles = [item["title"] for item in response.json()["data"]["upserts"]]
+        self.assertIn("Not replicated yet", titles)
+        self.assertEqual(Journal.objects.count(), 2)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.listed_titles("/api"), ["Not replicated yet", "Replicated"])
+        self.assertFalse(replicas.is_pinned(self.user.id))
+
+
+@override_settings(
+    JOURNAL_SHARDS=["shard_a", "shard_b"],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ShardingTests(TransactionTestCase):
+    """Two SQLite files as shards, next to ``default``."""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        primary = connections["default"]
+        primary.ensure_connection()
+        for alias in settings.JOURNAL_SHARDS:
+            shard = DatabaseWrapper(
+                {**primary.settings_dict, "NAME": os.path.join(tmpdir, f"{alias}.sqlite3")},
+                alias=alias,
+            )
+            connections[alias] = shard
+            self.addCleanup(connections.__delitem__, alias)
+            self.addCleanup(shard.close)
+            # The (still empty) schema, as migrate would create it.
+            shard.ensure_connection()
+            primary.connection.backup(shard.connection)
+            shards.reserve_id_range(alias)
+        caches["default"].clear()
+
+    def make_user(self, name):
+        user = User.objects.create_user(name, f"{name}@example.com", "s3cret-pass")
+        return user, {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+    def create(self, prefix, auth, title):
+        body = {"title": title, "content": f"{title} content", "mood_tag": "MERRY"}
+        response = self.client.post(f"{prefix}/journals/", json.dumps(body), content_type="application/json", **auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]["id"]
+
+    def rows(self, alias, user):
+        return {
+            model.__name__: model.objects.using(alias).filter(owner_id=user.id).count()
+            for model in shards.SHARDED_MODELS
+        }
+
+    def test_owner_foreign_keys_have_no_database_constraint(self):
+        # Migrated from tables that had them (0001 and later), unsharded.
+        for model in (Journal, JournalCounter, JournalDailyRollup, JournalTombstone):
+            with self.subTest(model=model.__name__), connections["default"].cursor() as cursor:
+                constraints = connections["default"].introspection.get_constraints(cursor, model._meta.db_table)
+                self.assertFalse([name for name, c in constraints.items() if c["foreign_key"] and c["columns"] == ["owner_id"]])
+        self.assertEqual(search_index.missing_triggers(connections["default"]), [])
+
+    def test_new_users_are_placed_on_a_shard(self):
+        first, _ = self.make_user("first")
+        second, _ = self.make_user("second")
+        self.assertEqual({shards.shard_for(first), shards.shard_for(second)}, {"shard_a", "shard_b"})
+
+    def test_a_users_requests_touch_only_their_shard(self):
+        user, auth = self.make_user("writer")
+        home = shards.shard_for(user)
+        other = "shard_b" if home == "shard_a" else "shard_a"
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                with CaptureQueriesContext(connections[home]) as on_home, \
+                        CaptureQueriesContext(connections[other]) as on_other:
+                    journal_id = self.create(prefix, auth, f"Sharded via {prefix}")
+                    listed = self.client.get(f"{prefix}/journals/", **auth).json()["data"]
+                    detail = self.client.get(f"{prefix}/journals/{journal_id}", **auth)
+                    found = self.client.get(f"{prefix}/journals/search/?q=sharded", **auth).json()["data"]
+                self.assertGreater(len(on_home), 0)
+                self.assertEqual(len(on_other), 0)
+                self.assertEqual(listed["count"], 1)
+                self.assertEqual(detail.status_code, 200)
+                self.assertEqual(found["count"], 1)
+                self.assertEqual(self.rows(home, user), {
+                    "Journal": 1, "JournalTombstone": 0, "JournalCounter": 1, "JournalDailyRollup": 1,
+                })
+                self.assertEqual(self.rows("default", user)["Journal"], 0)
+
+                # The shard's BEGIN and COMMIT come on top of the budget, which
+                # is sized for one database.
+                with self.assertLogs("journals_api.query_budget", "WARNING"):
+                    response = self.client.delete(f"{prefix}/journals/{journal_id}", **auth)
+                self.assertEqual(response.status_code, 204)
+                self.assertEqual(self.rows(home, user)["Journal"], 0)
+                self.assertEqual(self.rows(home, user)["JournalTombstone"], 1)
+                self.assertEqual(counters.journal_count(user), 0)
+                JournalTombstone.objects.using(home).all().delete()
+
+    def test_journal_ids_are_unique_across_shards(self):
+        ids = {}
+        for name in ("first", "second"):
+            user, auth = self.make_user(name)
+            ids[shards.shard_for(user)] = self.create("/api", auth, name)
+        self.assertEqual(ids["shard_a"] // shards.ID_BLOCK, 1)
+        self.assertEqual(ids["shard_b"] // shards.ID_BLOCK, 2)
+
+    def test_rebalance_moves_users_from_before_sharding(self):
+        user, auth = self.make_user("legacy")
+        UserProfile.objects.filter(user=user).update(journal_shard="")
+        caches["default"].clear()
+        ids = {self.create("/api", auth, f"Legacy {n}") for n in range(3)}
+        self.assertEqual(self.rows("default", user)["Journal"], 3)
+        before = self.client.get("/api/journals/", **auth).json()["data"]["items"]
+
+        out = io.StringIO()
+        call_command("rebalance_journal_shards", "--dry-run", stdout=out)
+        self.assertIn(f"User {user.id}: default -> {shards.place(user.id)}", out.getvalue())
+        self.assertEqual(self.rows("default", user)["Journal"], 3)
+
+        call_command("rebalance_journal_shards", stdout=io.StringIO())
+        target = shards.place(user.id)
+        self.assertEqual(UserProfile.objects.get(user=user).journal_shard, target)
+        self.assertEqual(self.rows("default", user), dict.fromkeys(self.rows("default", user), 0))
+        self.assertEqual(self.rows(target, user)["Journal"], 3)
+        self.assertEqual(set(Journal.objects.using(target).values_list("id", flat=True)), ids)
+        self.assertEqual(self.client.get("/api/journals/", **auth).json()["data"]["items"], before)
+        self.assertEqual(counters.rebuild(), 1)
+        self.assertEqual(counters.journal_count(User.objects.get(pk=user.pk)), 3)
+
+    def test_bulk_deletes_touch_only_the_owners_shard(self):
+        user, auth = self.make_user("bulk")
+        home = shards.shard_for(user)
+        other = "shard_b" if home == "shard_a" else "shard_a"
+        ids = [self.create("/api", auth, f"Bulk {n}") for n in range(3)]
+        body = json.dumps({"ids": ids})
+        # Over budget by the shard's BEGIN and COMMIT, as in the single delete.
+        with CaptureQueriesContext(connections[other]) as on_other, \
+                self.assertLogs("journals_api.query_budget", "WARNING"):
+            response = self.client.delete("/api/journals/bulk", body, content_type="application/json", **auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["succeeded"], 3)
+        self.assertEqual(len(on_other), 0)
+        self.assertEqual(self.rows(home, user)["Journal"], 0)
+        self.assertEqual(self.rows(home, user)["JournalTombstone"], 3)
+
+    def test_queries_without_an_owner_are_rejected(self):
+        user, _ = self.make_user("owner")
+        with self.assertRaises(shards.ShardRoutingError):
+            Journal.objects.filter(owner=user).count()
+        with self.assertRaises(shards.ShardRoutingError):
+            JournalCounter.objects.create(owner=user, mood_tag="MERRY")
+        self.assertEqual(Journal.objects.for_owner(user).count(), 0)
+        self.assertEqual(user.journals.count(), 0)
+
+    def test_cached_users_are_placed_without_a_query(self):
+        user, auth = self.make_user("cached")
+        with self.assertNumQueries(1):
+            home = shards.shard_for(user.id)
+        self.assertEqual(self.client.get("/api/journals/", **auth).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(shards.shard_for(user.id), home)
+
+    def test_deleting_a_user_deletes_their_sharded_rows(self):
+        user, auth = self.make_user("leaving")
+        self.create("/api", auth, "Goodbye")
+        home = shards.shard_for(user)
+        user.delete()
+        self.assertEqual(self.rows(home, user), dict.fromkeys(self.rows(home, user), 0))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ResponseCacheTests(TransactionTestCase):
+    """A TransactionTestCase, so invalidations run on commit as in production."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("writer", "writer@example.com", "s3cret-pass")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        Journal.objects.create(owner=self.user, title="Cached", content="Cached content", mood_tag="MERRY")
+
+    def get(self, path):
+        response = self.client.get(path, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, prefix, query=""):
+        return [item["title"] for item in self.get(f"{prefix}/journals/{query}")["data"]["items"]]
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self.assertEqual(self.titles("/api", "?page_size=5&view=summary"), ["Cached"])
+        with CaptureQueriesContext(connections["default"]) as queries:
+            # Parameter order doesn't matter, and both APIs share entries.
+            self.assertEqual(self.titles("/api/async", "?view=summary&page_size=5"), ["Cached"])
+            self.get("/api/auth/profile")
+            self.get("/api/async/auth/profile")
+        self.assertFalse([q for q in queries.captured_queries if "journals_api_journal" in q["sql"]])
+        self.assertEqual(response_cache.stats(), {
+            "journals": {"hits": 1, "misses": 1, "hit_rate": 0.5},
+            "profile": {"hits": 1, "misses": 1, "hit_rate": 0.5},
+        })
+
+    def test_journal_writes_invalidate_lists(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                before = self.titles(prefix)
+                body = {"title": f"New via {prefix}", "content": "Fresh.", "mood_tag": "MERRY"}
+                self.client.post(f"{prefix}/journals/", json.dumps(body), content_type="application/json", **self.auth)
+                self.assertEqual(self.titles(prefix), [body["title"]] + before)
+
+    def test_streak_updates_invalidate_the_profile(self):
+        self.assertEqual(self.get("/api/auth/profile")["profile"]["current_streak"], 0)
+        body = {"title": "Today", "content": "Keeps the streak.", "mood_tag": "MERRY"}
+        self.client.post("/api/journals/", json.dumps(body), content_type="application/json", **self.auth)
+        for prefix in PREFIXES:
+            self.assertEqual(self.get(f"{prefix}/auth/profile")["profile"]["current_streak"], 1)
+
+    def test_profile_writes_invalidate_the_profile(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                UserProfile.objects.filter(user=self.user).update(pin="")
+                response_cache.invalidate(self.user.id)
+                self.assertFalse(self.get(f"{prefix}/auth/profile")["profile"]["has_pin"])
+                self.client.post(f"{prefix}/auth/profile/set-pin", json.dumps({"pin": "4321"}),
+                                 content_type="application/json", **self.auth)
+                self.assertTrue(self.get(f"{prefix}/auth/profile")["profile"]["has_pin"])
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_disabled(self):
+        self.titles("/api")
+        Journal.objects.create(owner=self.user, title="Unannounced", content="Written directly.", mood_tag="MERRY")
+        self.assertEqual(self.titles("/api"), ["Unannounced", "Cached"])
+        self.assertEqual(response_cache.stats()["journals"]["misses"], 0)
+
+    def test_stats_command(self):
+        self.titles("/api")
+        self.titles("/api")
+        out = io.StringIO()
+        call_command("response_cache_stats", "--reset", stdout=out)
+        self.assertIn("journals: 1 hit(s), 1 miss(es), hit rate 50.0%", out.getvalue())
+        self.assertEqual(response_cache.stats()["journals"]["hits"], 0)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ChangeAwareSaveTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user("writer", "writer@example.com", "s3cret-pass")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.journal = Journal.objects.create(owner=self.user, title="Draft", content="Words.", mood_tag="MERRY")
+
+    def writes(self, queries, table):
+        return [q["sql"] for q in queries.captured_queries if q["sql"].startswith(f'UPDATE "{table}"')]
+
+    def test_unchanged_instances_are_not_saved(self):
+        journal = Journal.objects.get(pk=self.journal.pk)
+        profile = UserProfile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            journal.save()
+            profile.save()
+
+    def test_saves_write_only_changed_fields(self):
+        journal = Journal.objects.get(pk=self.journal.pk)
+        journal.title = "Final"
+        self.assertEqual(journal.changed_fields, {"title"})
+        with CaptureQueriesContext(connections["default"]) as queries:
+            journal.save()
+        [update] = self.writes(queries, "journals_api_journal")
+        self.assertIn('"title"', update)
+        self.assertIn('"updated_at"', update)
+        self.assertNotIn('"content"', update)
+        self.assertEqual(journal.changed_fields, set())
+        journal.refresh_from_db()
+        self.assertEqual(journal.title, "Final")
+
+    def test_user_saves_leave_the_profile_alone(self):
+        self.user.first_name = "Wren"
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.user.save()
+        self.assertEqual(self.writes(queries, "journals_api_userprofile"), [])
+        fresh = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connections["default"]) as queries:
+            fresh.save()
+        self.assertFalse([q for q in queries.captured_queries if "journals_api_userprofile" in q["sql"]])
+
+    def test_set_pin_writes_the_profile_once(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                with CaptureQueriesContext(connections["default"]) as queries:
+                    response = self.client.post(f"{prefix}/auth/profile/set-pin", json.dumps({"pin": "4321"}),
+                                                content_type="application/json", **self.auth)
+                self.assertEqual(response.status_code, 200)
+                [update] = self.writes(queries, "journals_api_userprofile")
+                self.assertIn('SET "pin" =', update)
+                self.assertNotIn("streak", update)
+
+    def test_updates_that_change_nothing_write_nothing(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                version = UserProfile.objects.get(user=self.user).journals_version
+                with CaptureQueriesContext(connections["default"]) as queries:
+                    response = self.client.put(f"{prefix}/journals/{self.journal.id}", json.dumps({"title": "Draft"}),
+                                               content_type="application/json", **self.auth)
+                    bulk = self.client.put(f"{prefix}/journals/bulk", json.dumps({"items": [{"id": self.journal.id, "title": "Draft"}]}),
+                                           content_type="application/json", **self.auth)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(bulk.json()["data"]["succeeded"], 1)
+                self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("UPDATE")])
+                self.assertEqual(UserProfile.objects.get(user=self.user).journals_version, version)
+
+    def test_updates_write_only_the_sent_changes(self):
+        for prefix in PREFIXES:
+            with self.subTest(api=prefix):
+                with CaptureQueriesContext(connections["default"]) as queries:
+                    response = self.client.put(f"{prefix}/journals/{self.journal.id}",
+                                               json.dumps({"title": f"Via {prefix}", "content": "Words."}),
+                                               content_type="application/json", **self.auth)
+                self.assertEqual(response.status_code, 200)
+                [update] = self.writes(queries, "journals_api_journal")
+                self.assertNotIn('"content"', update)
+                self.assertNotIn('"mood_tag"', update)
@@ -0,0 +1,367 @@
+"""
+Background image upload pipeline.
+
+`accept_upload` spools the incoming file to local disk, records an
+`ImageUploadJob` and hands it to a bounded worker pool, so the request returns
+as soon as the bytes are on disk. Workers push the file to the configured
+backend, retrying transient failures with exponential backoff.
+
+The backend is pluggable through ``IMAGE_UPLOAD_BACKEND``;
+`LocalFileSystemBackend` stands in for Cloudinary in tests and development.
+
+Files are hashed while they are spooled. When the same content was uploaded
+before (per user or globally, see ``IMAGE_DEDUP_SCOPE``) the job completes
+immediately with the cached URL and nothing is sent to the backend.
+
+The pool lives in the web process, so a restart abandons its queued and
+running jobs; `recover_jobs` (``manage.py recover_image_uploads``) requeues
+them and removes leftover spool files.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urljoin
+
+import cloudinary.exceptions
+import cloudinary.uploader
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models.upload_model import ImageUploadJob, UploadedImage
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    """Raised by upload backends. ``retryable`` marks transient failures."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class UploadQueueFull(Exception):
+    """Raised when the worker pool already has its maximum backlog."""
+
+
+class CloudinaryBackend:
+    """Uploads spooled files to Cloudinary."""
+
+    # Errors that will fail the same way no matter how often we retry.
+    permanent_errors = (
+        cloudinary.exceptions.BadRequest,
+        cloudinary.exceptions.AuthorizationRequired,
+        cloudinary.exceptions.NotAllowed,
+    )
+
+    def upload(self, path: str) -> str:
+        try:
+            result = cloudinary.uploader.upload(path)
+        except self.permanent_errors as exc:
+            raise UploadError(str(exc), retryable=False) from exc
+        except Exception as exc:
+            raise UploadError(str(exc)) from exc
+
+        secure_url = result.get('secure_url')
+        if not secure_url:
+            raise UploadError("Cloudinary did not return a secure URL.", retryable=False)
+        return secure_url
+
+
+class LocalFileSystemBackend:
+    """Copies spooled files under ``MEDIA_ROOT`` and serves them from ``MEDIA_URL``."""
+
+    def upload(self, path: str) -> str:
+        target_dir = Path(settings.MEDIA_ROOT) / "uploads"
+        target_dir.mkdir(parents=True, exist_ok=True)
+        name = os.path.basename(path)
+        shutil.copyfile(path, target_dir / name)
+        return urljoin(settings.MEDIA_URL, f"uploads/{name}")
+
+
+def get_upload_backend():
+    return import_string(settings.IMAGE_UPLOAD_BACKEND)()
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_UPLOAD_WORKERS,
+    thread_name_prefix="image-upload",
+)
+# Caps queued + running jobs so a burst of uploads can't fill the disk/memory.
+_slots = threading.BoundedSemaphore(settings.IMAGE_UPLOAD_WORKERS + settings.IMAGE_UPLOAD_QUEUE_SIZE)
+
+
+def shutdown(wait: bool = True):
+    """Stops the worker pool, by default after the queued jobs finish."""
+    _executor.shutdown(wait=wait)
+
+
+def spool_upload(file):
+    """
+    Streams an uploaded file to the spool directory, hashing it on the way.
+    Returns ``(path, sha256 hex digest)``.
+    """
+    spool_dir = Path(settings.IMAGE_UPLOAD_SPOOL_DIR)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    suffix = Path(file.name or "").suffix
+    fd, path = tempfile.mkstemp(dir=spool_dir, suffix=suffix)
+    digest = hashlib.sha256()
+    with os.fdopen(fd, "wb") as spooled:
+        for chunk in file.chunks():
+            digest.update(chunk)
+            spooled.write(chunk)
+    return path, digest.hexdigest()
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def accept_upload(owner, file) -> ImageUploadJob:
+    """
+    Spools ``file`` and queues it for upload, or completes it straight away
+    from the digest cache. Raises `UploadQueueFull` when the pool has no free
+    slot; called inside a transaction, the job is failed on commit instead.
+    """
+    path, digest = spool_upload(file)
+
+    cached_url = lookup_cached_image(owner.id, digest)
+    if cached_url is not None:
+        _discard(path)
+        return ImageUploadJob.objects.create(
+            owner=owner,
+            digest=digest,
+            secure_url=cached_url,
+            status=ImageUploadJob.Status.SUCCEEDED,
+            deduplicated=True,
+        )
+
+    if transaction.get_autocommit():
+        # The job is committed as soon as it is created: take the slot first so
+        # a full queue is reported to the client.
+        if not _slots.acquire(blocking=False):
+            _discard(path)
+            raise UploadQueueFull()
+        try:
+            job = ImageUploadJob.objects.create(owner=owner, spool_path=path, digest=digest)
+        except Exception:
+            _slots.release()
+            _discard(path)
+            raise
+        _start(job.id)
+        return job
+
+    # Inside a transaction the slot is only taken once it commits, so a
+    # rollback can't leak one; a full queue then fails the job instead.
+    job = ImageUploadJob.objects.create(owner=owner, spool_path=path, digest=digest)
+    transaction.on_commit(lambda: _submit(job.id, path))
+    return job
+
+
+def _cache_owner_id(owner_id):
+    """The owner cache entries are stored under, or None for the shared scope."""
+    return owner_id if settings.IMAGE_DEDUP_SCOPE == "user" else None
+
+
+def lookup_cached_image(owner_id, digest: str):
+    """Returns the cached URL for ``digest``, or None on a miss."""
+    if not settings.IMAGE_DEDUP_SCOPE:
+        return None
+
+    entry = UploadedImage.objects.filter(owner_id=_cache_owner_id(owner_id), digest=digest).first()
+    if entry is None:
+        return None
+
+    now = timezone.now()
+    ttl = settings.IMAGE_DEDUP_TTL
+    if ttl is not None and entry.last_used_at < now - ttl:
+        entry.delete()
+        return None
+
+    UploadedImage.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=now)
+    return entry.secure_url
+
+
+def remember_image(owner_id, digest: str, secure_url: str):
+    """Caches ``digest -> secure_url`` and evicts the least recently used entries."""
+    if not settings.IMAGE_DEDUP_SCOPE or not digest:
+        return
+
+    cache_owner_id = _cache_owner_id(owner_id)
+    try:
+        UploadedImage.objects.update_or_create(
+            owner_id=cache_owner_id,
+            digest=digest,
+            defaults={"secure_url": secure_url, "last_used_at": timezone.now()},
+        )
+    except IntegrityError:
+        # A concurrent upload of the same file got there first.
+        return
+
+    evicted = list(
+        UploadedImage.objects.filter(owner_id=cache_owner_id)
+        .order_by("-last_used_at")
+        .values_list("id", flat=True)[settings.IMAGE_DEDUP_MAX_ENTRIES:]
+    )
+    if evicted:
+        UploadedImage.objects.filter(id__in=evicted).delete()
+
+
+def invalidate_cached_images(*, digest: str = None, secure_url: str = None) -> int:
+    """
+    Drops cache entries by digest and/or URL, e.g. after an asset was deleted
+    from the upload backend. Returns the number of entries removed.
+    """
+    if digest is None and secure_url is None:
+        raise ValueError("Pass a digest or a secure_url to invalidate.")
+    entries = UploadedImage.objects.all()
+    if digest is not None:
+        entries = entries.filter(digest=digest)
+    if secure_url is not None:
+        entries = entries.filter(secure_url=secure_url)
+    deleted, _ = entries.delete()
+    return deleted
+
+
+def dedup_stats(owner=None):
+    """Upload counts and the digest cache hit rate, for one user or everyone."""
+    jobs = ImageUploadJob.objects.all()
+    if owner is not None:
+        jobs = jobs.filter(owner=owner)
+    totals = jobs.aggregate(
+        uploads=Count("id"),
+        deduplicated=Count("id", filter=Q(deduplicated=True)),
+    )
+    uploads = totals["uploads"]
+    return {
+        "uploads": uploads,
+        "deduplicated": totals["deduplicated"],
+        "hit_rate": totals["deduplicated"] / uploads if uploads else 0.0,
+    }
+
+
+def _submit(job_id, path: str):
+    """Starts a committed job if a slot is free, and fails it otherwise."""
+    if not _slots.acquire(blocking=False):
+        _discard(path)
+        ImageUploadJob.objects.filter(id=job_id).update(
+            status=ImageUploadJob.Status.FAILED,
+            error="Image upload service is busy, please retry shortly.",
+            spool_path="",
+            updated_at=timezone.now(),
+        )
+        return
+    _start(job_id)
+
+
+def _start(job_id):
+    """Runs a job on the pool (or inline when eager). The caller holds its slot."""
+    if settings.IMAGE_UPLOAD_EAGER:
+        _run_job(job_id)
+    else:
+        _executor.submit(_run_job, job_id)
+
+
+def _run_job(job_id):
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception("Image upload job %s crashed", job_id)
+    finally:
+        _slots.release()
+        if not settings.IMAGE_UPLOAD_EAGER:
+            # Worker threads outlive requests; don't let them hold stale connections.
+            close_old_connections()
+
+
+def process_job(job_id):
+    """Uploads one spooled file, retrying transient errors with backoff."""
+    job = ImageUploadJob.objects.get(id=job_id)
+    job.status = ImageUploadJob.Status.RUNNING
+    job.save(update_fields=["status", "updated_at"])
+
+    backend = get_upload_backend()
+    max_attempts = settings.IMAGE_UPLOAD_MAX_ATTEMPTS
+    while True:
+        job.attempts += 1
+        try:
+            job.secure_url = backend.upload(job.spool_path)
+            job.status = ImageUploadJob.Status.SUCCEEDED
+            job.error = ""
+            break
+        except UploadError as exc:
+            job.error = str(exc)
+            if not exc.retryable or job.attempts >= max_attempts:
+                job.status = ImageUploadJob.Status.FAILED
+                break
+            logger.warning("Image upload job %s failed (attempt %s): %s", job.id, job.attempts, exc)
+            time.sleep(settings.IMAGE_UPLOAD_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+
+    _discard(job.spool_path)
+    job.spool_path = ""
+    job.save(update_fields=["status", "secure_url", "error", "attempts", "spool_path", "updated_at"])
+
+    if job.status == ImageUploadJob.Status.SUCCEEDED:
+        remember_image(job.owner_id, job.digest, job.secure_url)
+    return job
+
+
+def recover_jobs(stale_after=timedelta(minutes=10)) -> dict:
+    """
+    Picks up jobs a restart left behind: PENDING or RUNNING jobs not touched
+    for ``stale_after`` are queued again if their spool file survived and
+    failed otherwise. Spool files no unfinished job refers to are deleted once
+    they are as old. Waits for a free slot per requeued job; call `shutdown`
+    afterwards to wait for them to finish.
+
+    Returns the number of jobs requeued and failed and of files removed.
+    """
+    cutoff = timezone.now() - stale_after
+    unfinished = [ImageUploadJob.Status.PENDING, ImageUploadJob.Status.RUNNING]
+    requeued = failed = 0
+    for job_id, path in list(
+        ImageUploadJob.objects.filter(status__in=unfinished, updated_at__lt=cutoff)
+        .order_by("created_at")
+        .values_list("id", "spool_path")
+    ):
+        claim = ImageUploadJob.objects.filter(id=job_id, status__in=unfinished, updated_at__lt=cutoff)
+        if path and os.path.exists(path):
+            # The conditional update keeps two recoveries from taking the same job.
+            if claim.update(status=ImageUploadJob.Status.PENDING, updated_at=timezone.now()):
+                _slots.acquire()
+                _start(job_id)
+                requeued += 1
+        elif claim.update(
+            status=ImageUploadJob.Status.FAILED,
+            error="The spooled file was lost before it was uploaded.",
+            spool_path="",
+            updated_at=timezone.now(),
+        ):
+            failed += 1
+
+    removed = 0
+    spool_dir = Path(settings.IMAGE_UPLOAD_SPOOL_DIR)
+    if spool_dir.is_dir():
+        in_use = set(
+            ImageUploadJob.objects.filter(status__in=unfinished).exclude(spool_path="").values_list("spool_path", flat=True)
+        )
+        for path in spool_dir.iterdir():
+            if not path.is_file() or str(path) in in_use:
+                continue
+            if path.stat().st_mtime < cutoff.timestamp():
+                _discard(str(path))
+                removed += 1
+    return {"requeued": requeued, "failed": failed, "removed": removed}
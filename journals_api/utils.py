@@ -1,29 +1,26 @@
-from datetime import timedelta
 from django.utils import timezone
 
-from journals_api.models.user_model import UserProfile
+from journals_api import streaks
 
 
 def update_streak_on_creation(user):
     """Updates the current and longest streak for a user when content is created."""
-    try:
-        user_profile = user.user_profile
-    except UserProfile.DoesNotExist:
-        return  # Should not happen due to signals, but for safety
+    update_streak_for_dates(user, [timezone.now().date()])
 
-    today = timezone.now().date()
 
-    if user_profile.last_content_date == today:
-        # User already created content today, no streak change
-        return
+def update_streak_for_dates(user, dates):
+    """
+    Updates the current and longest streak for a user from the days new
+    content was created on. Days on or before the last recorded content date
+    don't change the streak.
+    """
+    for day in sorted(set(dates)):
+        streaks.record_activity(user.id, day)
 
-    if user_profile.last_content_date == today - timedelta(days=1):
-        # Streak continues
-        user_profile.current_streak += 1
-    else:
-        # Streak broken or this is the first content
-        user_profile.current_streak = 1
 
-    user_profile.longest_streak = max(user_profile.longest_streak, user_profile.current_streak)
-    user_profile.last_content_date = today
-    user_profile.save()
+def recompute_streak(user):
+    """
+    Rebuilds the streak fields from every day the user has content on, for
+    changes `update_streak_for_dates` can't follow (imports of older entries).
+    """
+    streaks.recompute([user.id])
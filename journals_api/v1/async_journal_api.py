@@ -0,0 +1,270 @@
+"""
+Async versions of the journal endpoints in `journal_api`.
+
+Both share their logic in `journal_services`. The read views await its
+async versions, so their queries interleave with other requests' instead of
+holding the sync thread for the whole request. The write views run the sync
+logic through ``sync_to_async`` (so a write and its counter updates still
+share one transaction). PINs are checked on the bounded hasher pool, keeping
+the event loop free. Exports stream from an async iterator so ASGI doesn't
+buffer them.
+"""
+from datetime import date
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from ninja import File, Query, Router
+from ninja.files import UploadedFile
+
+from journals_api.schemas.base_schema import ResponseSchema
+from journals_api.schemas.user_schemas import (CovertAccessSchema,
+                                               JournalExportSchema, PinSchema)
+from journals_api.v1.utils import (CustomPageNumberPagination,
+                                   JournalProjection, create_api_response)
+
+from .. import etags, export, response_cache, uploads
+from ..authentication import AsyncJWTAuth
+from ..hashing import run_hasher
+from ..query_budget import query_budget
+from ..replicas import replica_reads
+from ..schemas.journal_schemas import (BulkResultSchema, CovertUnlockSchema,
+                                       GapsSchema, HeatmapSchema,
+                                       ImageUploadJobSchema,
+                                       ImageUploadStatsSchema,
+                                       ImportResultSchema,
+                                       JournalBulkCreateSchema,
+                                       JournalBulkDeleteSchema,
+                                       JournalBulkUpdateSchema,
+                                       JournalCreateSchema,
+                                       JournalListItemSchema, JournalOutSchema,
+                                       JournalSearchResultSchema,
+                                       JournalSyncSchema, JournalUpdateSchema,
+                                       MoodDistributionSchema,
+                                       PaginatedResponse)
+from . import journal_services as services
+
+router = Router(auth=AsyncJWTAuth())
+
+
+async def _verify_covert_access(user, payload: CovertAccessSchema):
+    # The profile is normally preloaded by the auth class, but stateless auth
+    # leaves it to a lazy (sync-only) lookup.
+    profile = await sync_to_async(services.covert_profile)(user)
+    await run_hasher(services.check_covert_access, profile, payload)
+
+
+@router.get("/", response=ResponseSchema[PaginatedResponse[JournalListItemSchema]], exclude_unset=True)
+@query_budget(4)
+@replica_reads
+async def list_journals(
+    request,
+    response: HttpResponse,
+    pagination: CustomPageNumberPagination.Input = Query(...),
+    projection: JournalProjection.Input = Query(...),
+    mood_tag: str = None,
+):
+    """
+    List journals for the authenticated user,
+    optionally filtered by mood tag.
+    """
+    not_modified = await etags.aconditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+
+    return await response_cache.acached(
+        request,
+        response_cache.JOURNALS,
+        lambda: services.alist_journals(request.auth, pagination, projection, mood_tag),
+    )
+
+
+@router.post("/covert", response=ResponseSchema[PaginatedResponse[JournalListItemSchema]], exclude_unset=True)
+@query_budget(4)
+async def list_covert_journals(
+    request,
+    payload: CovertAccessSchema,
+    pagination: CustomPageNumberPagination.Input = Query(...),
+    projection: JournalProjection.Input = Query(...),
+):
+    """List covert journals for the authenticated user after PIN or unlock token verification."""
+    await _verify_covert_access(request.auth, payload)
+    return await services.alist_covert_journals(request.auth, pagination, projection)
+
+
+@router.post("/covert/unlock", response=ResponseSchema[CovertUnlockSchema])
+@query_budget(2)
+async def unlock_covert_journals(request, payload: PinSchema):
+    """
+    Verifies the PIN once and returns a short-lived unlock token for the
+    covert list and reveal endpoints.
+    """
+    profile = await sync_to_async(services.covert_profile)(request.auth)
+    return await run_hasher(services.unlock_covert_journals, profile, payload.pin)
+
+
+@router.get("/{int:journal_id}", response=ResponseSchema[JournalOutSchema])
+@query_budget(3)
+@replica_reads
+async def get_journal(request, journal_id: int, response: HttpResponse):
+    """Get a specific journal entry for the authenticated user."""
+    not_modified = await etags.aconditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+
+    return await services.aget_journal(request.auth, journal_id)
+
+
+@router.post("/{int:journal_id}/reveal", response=ResponseSchema[JournalOutSchema])
+@query_budget(3)
+async def reveal_covert_journal(request, journal_id: int, payload: CovertAccessSchema):
+    """Reveals the content of a specific covert journal after PIN or unlock token verification."""
+    journal = await sync_to_async(services.get_covert_journal)(request.auth, journal_id)
+    await _verify_covert_access(request.auth, payload)
+    return create_api_response(journal, message="Journal retrieved", status_code=200)
+
+
+@router.post("/", response=ResponseSchema[JournalOutSchema])
+@query_budget(16)
+async def create_journal(request, payload: JournalCreateSchema):
+    """Create a new journal entry for the authenticated user."""
+    return await sync_to_async(services.create_journal)(request.auth, payload)
+
+
+@router.put("/{int:journal_id}", response=ResponseSchema[JournalOutSchema])
+@query_budget(18)
+async def update_journal(request, journal_id: int, payload: JournalUpdateSchema):
+    """Update an existing journal entry for the authenticated user."""
+    return await sync_to_async(services.update_journal)(request.auth, journal_id, payload)
+
+
+@router.delete("/{int:journal_id}", response={204: None})
+@query_budget(12)
+async def delete_journal(request, journal_id: int):
+    """Delete a specific journal entry for the authenticated user."""
+    await sync_to_async(services.delete_journal)(request.auth, journal_id)
+    return 204, None
+
+
+@router.get("/sync", response=ResponseSchema[JournalSyncSchema])
+@query_budget(4)
+async def sync_journals(request, since: str = None, limit: int = Query(100, ge=1, le=500)):
+    """
+    Return the journals changed and deleted since a previous sync's
+    ``next_since`` token, or every journal when no token is given.
+    """
+    return await services.async_journals(request.auth, since, limit)
+
+
+@router.post("/export")
+@query_budget(2)
+async def export_journals(request, payload: JournalExportSchema):
+    """
+    Stream all of the user's journals as NDJSON or a ZIP of Markdown files.
+    Covert journals are included only with ``include_covert`` and a valid PIN
+    or unlock token.
+    """
+    if payload.include_covert:
+        await _verify_covert_access(request.auth, payload)
+
+    content_type, _ = export.FORMATS[payload.format]
+    response = StreamingHttpResponse(
+        export.astream_export(export.aexport_rows(request.auth, payload.include_covert), payload.format),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{export.filename(payload.format)}"'
+    return response
+
+
+@router.post("/import", response=ResponseSchema[ImportResultSchema])
+@query_budget(14)
+async def import_journals(request, file: UploadedFile = File(...)):
+    """
+    Import journals from an NDJSON file or a ZIP of Markdown files (the
+    export formats). Valid records are created in batches; rejected ones are
+    reported with their line number or file name.
+    """
+    return await sync_to_async(services.import_journals)(request.auth, file)
+
+
+@router.get("/stats/heatmap", response=ResponseSchema[HeatmapSchema])
+@query_budget(3)
+@replica_reads
+async def journal_heatmap(request, year: int = Query(None, ge=1, le=9999)):
+    """Entries per day of ``year`` (the current year by default), for a calendar heatmap."""
+    return await services.ajournal_heatmap(request.auth, year or timezone.now().year)
+
+
+@router.get("/stats/moods", response=ResponseSchema[MoodDistributionSchema])
+@query_budget(3)
+@replica_reads
+async def journal_mood_distribution(request, start: date = None, end: date = None):
+    """Entries per mood between ``start`` and ``end`` (inclusive), in total and per month."""
+    return await services.ajournal_mood_distribution(request.auth, start, end)
+
+
+@router.get("/stats/gaps", response=ResponseSchema[GapsSchema])
+@query_budget(3)
+@replica_reads
+async def journal_gaps(request, limit: int = Query(5, ge=1, le=50)):
+    """The longest runs of days without entries."""
+    return await services.ajournal_gaps(request.auth, limit)
+
+
+@router.post("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(10)
+async def bulk_create_journals(request, payload: JournalBulkCreateSchema):
+    """Create several journal entries in one transaction, with a result per entry."""
+    return await sync_to_async(services.bulk_create_journals)(request.auth, payload.items)
+
+
+@router.put("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(18)
+async def bulk_update_journals(request, payload: JournalBulkUpdateSchema):
+    """Update several journal entries in one transaction, with a result per entry."""
+    return await sync_to_async(services.bulk_update_journals)(request.auth, payload.items)
+
+
+@router.delete("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(12)
+async def bulk_delete_journals(request, payload: JournalBulkDeleteSchema):
+    """Delete several journal entries in one transaction, with a result per id."""
+    return await sync_to_async(services.bulk_delete_journals)(request.auth, payload.ids)
+
+
+@router.get("/search/", response=ResponseSchema[PaginatedResponse[JournalSearchResultSchema]])
+@query_budget(4)
+@replica_reads
+async def search_journals(
+    request,
+    q: str = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1),
+):
+    """Search journals by title or content for the authenticated user, excluding covert journals."""
+    return await services.asearch_journals(request.auth, q, page, page_size)
+
+
+@router.post("/upload-image", response={202: ImageUploadJobSchema})
+@query_budget(5)
+async def upload_image(request, file: UploadedFile = File(...)):
+    """
+    Accepts an image for upload and returns a job to poll.
+    The upload to Cloudinary happens in the background.
+    """
+    return 202, await sync_to_async(services.upload_image)(request.auth, file)
+
+
+@router.get("/upload-image/stats", response=ImageUploadStatsSchema)
+@query_budget(3)
+async def get_upload_stats(request):
+    """Returns how many of the user's uploads were served from the digest cache."""
+    return await sync_to_async(uploads.dedup_stats)(request.auth)
+
+
+@router.get("/upload-image/{uuid:job_id}", response=ImageUploadJobSchema)
+@query_budget(3)
+async def get_upload_status(request, job_id: UUID):
+    """Returns the status of an image upload job, with the URL once it has succeeded."""
+    return await sync_to_async(services.get_upload_status)(request.auth, job_id)
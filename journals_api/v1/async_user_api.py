@@ -0,0 +1,78 @@
+"""
+Async versions of the auth endpoints in `user_api`.
+
+Both share their logic in `user_services`, which these views run through
+``sync_to_async``. Password and PIN hashing run on the bounded hasher pool so
+PBKDF2 never blocks the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from ninja import Router
+from ninja.errors import HttpError
+
+from .. import response_cache
+from ..authentication import AsyncJWTAuth
+from ..hashing import run_hasher
+from ..query_budget import query_budget
+from ..schemas.user_schemas import (LoginSchema,
+                                    PinSchema, RefreshSchema,
+                                    RegisterSchema, UserSchema)
+from . import user_services as services
+
+
+router = Router()
+
+
+@router.post("/register", response=UserSchema)
+@query_budget(8)
+async def register(request, payload: RegisterSchema):
+    """Register a new user with username, email and password."""
+    await sync_to_async(services.check_registration)(payload.username, payload.email)
+    password_hash = await run_hasher(make_password, payload.password)
+    return await sync_to_async(services.register)(payload.username, payload.email, password_hash)
+
+
+@router.post("/login")
+@query_budget(4)
+async def login(request, payload: LoginSchema):
+    """
+    Authenticate user and return JWT tokens.
+
+    Mirrors ``ModelBackend.authenticate``: an unknown username still pays for
+    one hash so response timing doesn't reveal which usernames exist.
+    """
+    user = await User.objects.filter(username=payload.username).afirst()
+
+    if user is None:
+        await run_hasher(User().set_password, payload.password)
+        raise HttpError(401, "Invalid credentials or user not active.")
+
+    if not await run_hasher(user.check_password, payload.password) or not user.is_active:
+        raise HttpError(401, "Invalid credentials or user not active.")
+
+    return await sync_to_async(services.login)(user)
+
+
+@router.post("/token/refresh")
+@query_budget(6)
+async def token_refresh(request, payload: RefreshSchema):
+    """Get a new access and refresh token (token rotation)."""
+    return await sync_to_async(services.token_refresh)(payload.refresh)
+
+
+@router.get("/profile", auth=AsyncJWTAuth(), response=UserSchema)
+@query_budget(3)
+async def get_profile(request):
+    """Get the authenticated user's profile."""
+    return await response_cache.acached(
+        request, response_cache.PROFILE, lambda: sync_to_async(services.get_profile)(request.auth)
+    )
+
+
+@router.post("/profile/set-pin", auth=AsyncJWTAuth())
+@query_budget(3)
+async def set_pin(request, payload: PinSchema):
+    """Set or update the user's PIN."""
+    pin_hash = await run_hasher(make_password, payload.pin)
+    return await sync_to_async(services.set_pin)(request.auth, pin_hash)
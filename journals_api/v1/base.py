@@ -1,9 +1,12 @@
 from ninja import Router
 
+from ..query_budget import query_budget
+
 
 router = Router()
 
 @router.get("/")
+@query_budget(1)
 def Home(request):
   """Home endpoint to check if the API is running."""
   return {"message": "Welcome to the Journals API!"}
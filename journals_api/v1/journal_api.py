@@ -1,24 +1,38 @@
-from typing import List
+from datetime import date
+from uuid import UUID
 
-import cloudinary.uploader
-from django.db.models import Q
-from django.shortcuts import get_object_or_404
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from ninja import File, Query, Router
-from ninja.errors import HttpError
 from ninja.files import UploadedFile
-from ninja_jwt.authentication import JWTAuth
 
 from journals_api.schemas.base_schema import ResponseSchema
-from journals_api.schemas.user_schemas import PinSchema
-from journals_api.v1.utils import CustomPageNumberPagination, create_api_response
+from journals_api.schemas.user_schemas import (CovertAccessSchema,
+                                               JournalExportSchema, PinSchema)
+from journals_api.v1.utils import (CustomPageNumberPagination,
+                                   JournalProjection, create_api_response)
 
-from ..models.journals_model import Journal
-from ..schemas.journal_schemas import (ImageUploadOutSchema,
-                                       JournalCreateSchema, JournalOutSchema,
-                                       JournalUpdateSchema, PaginatedResponse)
-from ..utils import update_streak_on_creation
+from .. import etags, export, response_cache, uploads
+from ..authentication import CachedJWTAuth
+from ..query_budget import query_budget
+from ..replicas import replica_reads
+from ..schemas.journal_schemas import (BulkResultSchema, CovertUnlockSchema,
+                                       GapsSchema, HeatmapSchema,
+                                       ImageUploadJobSchema,
+                                       ImageUploadStatsSchema,
+                                       ImportResultSchema,
+                                       JournalBulkCreateSchema,
+                                       JournalBulkDeleteSchema,
+                                       JournalBulkUpdateSchema,
+                                       JournalCreateSchema,
+                                       JournalListItemSchema, JournalOutSchema,
+                                       JournalSearchResultSchema,
+                                       JournalSyncSchema, JournalUpdateSchema,
+                                       MoodDistributionSchema,
+                                       PaginatedResponse)
+from . import journal_services as services
 
-router = Router(auth=JWTAuth())
+router = Router(auth=CachedJWTAuth())
 
 
 @router.get(
@@ -26,204 +40,232 @@ router = Router(auth=JWTAuth())
     response=
         ResponseSchema[
             PaginatedResponse[
-                JournalOutSchema
+                JournalListItemSchema
             ]
         ],
+    exclude_unset=True,
 )
+@query_budget(4)
+@replica_reads
 def list_journals(
     request,
+    response: HttpResponse,
     pagination: CustomPageNumberPagination.Input = Query(...),
+    projection: JournalProjection.Input = Query(...),
     mood_tag: str = None,
 ):
     """
     List journals for the authenticated user,
     optionally filtered by mood tag.
     """
-    user = request.auth
-    queryset = Journal.objects.filter(
-        owner=user
-    )
-
-    if mood_tag and mood_tag.upper() != "COVERT":
-        queryset = queryset.filter(
-            mood_tag=mood_tag
-        )
-    else:
-        queryset = queryset.exclude(
-            mood_tag="COVERT"
-        )
-
-    ordered_queryset = queryset.order_by(
-        "-date_added"
-    )
-    
-    paginator = CustomPageNumberPagination()
+    not_modified = etags.conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
 
-    response_data = paginator.paginate_queryset(
-        queryset=ordered_queryset,
-        pagination_in=pagination,
-        message="Journals retrieved successfully",
+    return response_cache.cached(
+        request,
+        response_cache.JOURNALS,
+        lambda: services.list_journals(request.auth, pagination, projection, mood_tag),
     )
 
-    items = response_data.get("items", [])
-    for journal in items:
-        journal.is_covert = (getattr(journal, "mood_tag", None) == "COVERT")
-
-    return create_api_response(response_data, message="Journals retrieved successfully", status_code=200)
-
 
 @router.post("/covert", 
     response=ResponseSchema[
             PaginatedResponse[
-                JournalOutSchema
+                JournalListItemSchema
             ]
-        ],)
-def list_covert_journals(request,  payload: PinSchema, pagination: CustomPageNumberPagination.Input = Query(...)):
-    """List covert journals for the authenticated user after PIN verification."""
-    queryset = Journal.objects.filter(
-        owner=request.auth,
-        mood_tag="COVERT"
-    )
-    try:
-        profile = request.auth.user_profile
-        if not profile.check_pin(payload.pin):
-            raise HttpError(403, "Incorrect PIN")
-    except AttributeError:
-        raise HttpError(403, "User profile not found, cannot check PIN.")
-        
-    ordered_queryset = queryset.order_by(
-        "-date_added"
-    )
-    
-    paginator = CustomPageNumberPagination()
+        ],
+    exclude_unset=True,)
+@query_budget(4)
+def list_covert_journals(
+    request,
+    payload: CovertAccessSchema,
+    pagination: CustomPageNumberPagination.Input = Query(...),
+    projection: JournalProjection.Input = Query(...),
+):
+    """List covert journals for the authenticated user after PIN or unlock token verification."""
+    services.verify_covert_access(request.auth, payload)
+    return services.list_covert_journals(request.auth, pagination, projection)
 
-    response_data = paginator.paginate_queryset(
-        queryset=ordered_queryset,
-        pagination_in=pagination,
-        message="Journals retrieved successfully",
-    )
 
-    items = response_data.get("items", [])
-    for journal in items:
-        journal.is_covert = (getattr(journal, "mood_tag", None) == "COVERT")
-        
-    return create_api_response(response_data, message="Journal retrieved", status_code=200)
+@router.post("/covert/unlock", response=ResponseSchema[CovertUnlockSchema])
+@query_budget(2)
+def unlock_covert_journals(request, payload: PinSchema):
+    """
+    Verifies the PIN once and returns a short-lived unlock token for the
+    covert list and reveal endpoints.
+    """
+    return services.unlock_covert_journals(services.covert_profile(request.auth), payload.pin)
 
-@router.get("/{journal_id}", response=ResponseSchema[JournalOutSchema])
-def get_journal(request, journal_id: int):
+
+@router.get("/{int:journal_id}", response=ResponseSchema[JournalOutSchema])
+@query_budget(3)
+@replica_reads
+def get_journal(request, journal_id: int, response: HttpResponse):
     """Get a specific journal entry for the authenticated user."""
-    journal = get_object_or_404(Journal, id=journal_id, owner=request.auth)
-    
-    # For covert journals, don't return content. The frontend must call /reveal
-    if journal.mood_tag == 'COVERT':
-        return JournalOutSchema(
-            id=journal.id,
-            title=journal.title,
-            date_added=journal.date_added,
-            mood_tag='COVERT',
-            is_covert=True,
-        )
-    
-    # Set is_covert field for non-covert journals
-    journal.is_covert = False
-    return create_api_response(journal, message="Journal retrieved", status_code=200)
+    not_modified = etags.conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
 
-@router.post("/{journal_id}/reveal", response=ResponseSchema[JournalOutSchema])
-def reveal_covert_journal(request, journal_id: int, payload: PinSchema):
-    """Reveals the content of a specific covert journal after PIN verification."""
-    journal = get_object_or_404(Journal, id=journal_id, owner=request.auth)
-    if journal.mood_tag != 'COVERT':
-        raise HttpError(400, "This is not a covert journal.")
-        
-    try:
-        profile = request.auth.user_profile
-        if not profile.check_pin(payload.pin):
-            raise HttpError(403, "Incorrect PIN")
-    except AttributeError:
-        raise HttpError(403, "User profile not found, cannot check PIN.")
-    
-    journal.is_covert = (journal.mood_tag == 'COVERT')
-        
+    return services.get_journal(request.auth, journal_id)
+
+
+@router.post("/{int:journal_id}/reveal", response=ResponseSchema[JournalOutSchema])
+@query_budget(3)
+def reveal_covert_journal(request, journal_id: int, payload: CovertAccessSchema):
+    """Reveals the content of a specific covert journal after PIN or unlock token verification."""
+    journal = services.get_covert_journal(request.auth, journal_id)
+    services.verify_covert_access(request.auth, payload)
     return create_api_response(journal, message="Journal retrieved", status_code=200)
 
+
 @router.post("/", response=ResponseSchema[JournalOutSchema])
+@query_budget(16)
 def create_journal(request, payload: JournalCreateSchema):
     """Create a new journal entry for the authenticated user."""
-    user = request.auth
-    if payload.mood_tag == 'COVERT':
-        try:
-            if not user.user_profile.pin:
-                raise HttpError(403, "A PIN must be set in your profile to create a Covert journal.")
-        except AttributeError:
-            raise HttpError(403, "User profile not found. Cannot create a Covert journal.")
-
-    journal = Journal.objects.create(owner=user, **payload.dict())
-    update_streak_on_creation(user) # Your streak logic
-    journal.is_covert = (journal.mood_tag == 'COVERT')
-    return create_api_response(journal, message="Created", status_code=201) #201, journal
-
-@router.put("/{journal_id}", response=ResponseSchema[JournalOutSchema])
+    return services.create_journal(request.auth, payload)
+
+
+@router.put("/{int:journal_id}", response=ResponseSchema[JournalOutSchema])
+@query_budget(18)
 def update_journal(request, journal_id: int, payload: JournalUpdateSchema):
     """Update an existing journal entry for the authenticated user."""
-    journal = get_object_or_404(Journal, id=journal_id, owner=request.auth)
-    
-    # If changing mood_tag to COVERT, check for PIN
-    if payload.mood_tag == 'COVERT' and journal.mood_tag != 'COVERT':
-        try:
-            if not request.auth.user_profile.pin:
-                raise HttpError(403, "A PIN must be set in your profile to set a journal as Covert.")
-        except AttributeError:
-            raise HttpError(403, "User profile not found. Cannot set journal as Covert.")
-
-    for attr, value in payload.dict(exclude_unset=True).items():
-        setattr(journal, attr, value)
-    journal.save()
-    journal.is_covert = (journal.mood_tag == 'COVERT')
-    return create_api_response(journal, message="Journal updated", status_code=200)
-
-@router.delete("/{journal_id}", response={204: None})
+    return services.update_journal(request.auth, journal_id, payload)
+
+
+@router.delete("/{int:journal_id}", response={204: None})
+@query_budget(12)
 def delete_journal(request, journal_id: int):
     """Delete a specific journal entry for the authenticated user."""
-    journal = get_object_or_404(Journal, id=journal_id, owner=request.auth)
-    journal.delete()
+    services.delete_journal(request.auth, journal_id)
     return 204, None
 
-@router.get("/search/", response=ResponseSchema[List[JournalOutSchema]])
-def search_journals(request, q: str = None):
+
+@router.get("/sync", response=ResponseSchema[JournalSyncSchema])
+@query_budget(4)
+def sync_journals(request, since: str = None, limit: int = Query(100, ge=1, le=500)):
+    """
+    Return the journals changed and deleted since a previous sync's
+    ``next_since`` token, or every journal when no token is given.
+    """
+    return services.sync_journals(request.auth, since, limit)
+
+
+@router.post("/export")
+@query_budget(2)
+def export_journals(request, payload: JournalExportSchema):
+    """
+    Stream all of the user's journals as NDJSON or a ZIP of Markdown files.
+    Covert journals are included only with ``include_covert`` and a valid PIN
+    or unlock token.
+    """
+    if payload.include_covert:
+        services.verify_covert_access(request.auth, payload)
+
+    content_type, _ = export.FORMATS[payload.format]
+    response = StreamingHttpResponse(
+        export.stream_export(export.export_rows(request.auth, payload.include_covert), payload.format),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{export.filename(payload.format)}"'
+    return response
+
+
+@router.post("/import", response=ResponseSchema[ImportResultSchema])
+@query_budget(14)
+def import_journals(request, file: UploadedFile = File(...)):
+    """
+    Import journals from an NDJSON file or a ZIP of Markdown files (the
+    export formats). Valid records are created in batches; rejected ones are
+    reported with their line number or file name.
+    """
+    return services.import_journals(request.auth, file)
+
+
+@router.get("/stats/heatmap", response=ResponseSchema[HeatmapSchema])
+@query_budget(3)
+@replica_reads
+def journal_heatmap(request, year: int = Query(None, ge=1, le=9999)):
+    """Entries per day of ``year`` (the current year by default), for a calendar heatmap."""
+    return services.journal_heatmap(request.auth, year or timezone.now().year)
+
+
+@router.get("/stats/moods", response=ResponseSchema[MoodDistributionSchema])
+@query_budget(3)
+@replica_reads
+def journal_mood_distribution(request, start: date = None, end: date = None):
+    """Entries per mood between ``start`` and ``end`` (inclusive), in total and per month."""
+    return services.journal_mood_distribution(request.auth, start, end)
+
+
+@router.get("/stats/gaps", response=ResponseSchema[GapsSchema])
+@query_budget(3)
+@replica_reads
+def journal_gaps(request, limit: int = Query(5, ge=1, le=50)):
+    """The longest runs of days without entries."""
+    return services.journal_gaps(request.auth, limit)
+
+
+@router.post("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(10)
+def bulk_create_journals(request, payload: JournalBulkCreateSchema):
+    """Create several journal entries in one transaction, with a result per entry."""
+    return services.bulk_create_journals(request.auth, payload.items)
+
+
+@router.put("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(18)
+def bulk_update_journals(request, payload: JournalBulkUpdateSchema):
+    """Update several journal entries in one transaction, with a result per entry."""
+    return services.bulk_update_journals(request.auth, payload.items)
+
+
+@router.delete("/bulk", response=ResponseSchema[BulkResultSchema])
+@query_budget(12)
+def bulk_delete_journals(request, payload: JournalBulkDeleteSchema):
+    """Delete several journal entries in one transaction, with a result per id."""
+    return services.bulk_delete_journals(request.auth, payload.ids)
+
+
+@router.get(
+    "/search/",
+    response=ResponseSchema[
+        PaginatedResponse[
+            JournalSearchResultSchema
+        ]
+    ],
+)
+@query_budget(4)
+@replica_reads
+def search_journals(
+    request,
+    q: str = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1),
+):
     """Search journals by title or content for the authenticated user, excluding covert journals."""
-    if not q:
-        return []
-    query = Q(title__icontains=q) | Q(content__icontains=q)
-    results = Journal.objects.filter(
-        query,
-        owner=request.auth
-    ).exclude(
-        mood_tag='COVERT'
-    ).distinct()
-
-    # Set is_covert field for each journal
-    for journal in results:
-        journal.is_covert = False
-    return create_api_response(results, message="Search results retrieved", status_code=200)
-
-
-@router.post("/upload-image", response=ImageUploadOutSchema)
+    return services.search_journals(request.auth, q, page, page_size)
+
+
+@router.post("/upload-image", response={202: ImageUploadJobSchema})
+@query_budget(5)
 def upload_image(request, file: UploadedFile = File(...)):
-    """Uploads an image to Cloudinary and returns the URL."""
-    try:
-        result = cloudinary.uploader.upload(file)
-        image_url = result.get('secure_url')
-        if not image_url:
-            raise HttpError(500, "Image upload failed: Cloudinary did not return a secure URL.")
-        
-        return {
-            "image_url": image_url,
-            "markdown_code": f"![alt text]({image_url})"
-        }
-    except cloudinary.exceptions.Error as exc:
-        # Log the actual error for debugging, but return a generic message to the user.
-        raise HttpError(503, "Image upload service is currently unavailable.") from exc
-    except Exception as exc:
-        # Catch any other unexpected errors during the upload process.
-        raise HttpError(500, "An unexpected error occurred during image upload.") from exc
+    """
+    Accepts an image for upload and returns a job to poll.
+    The upload to Cloudinary happens in the background.
+    """
+    return 202, services.upload_image(request.auth, file)
+
+
+@router.get("/upload-image/stats", response=ImageUploadStatsSchema)
+@query_budget(3)
+def get_upload_stats(request):
+    """Returns how many of the user's uploads were served from the digest cache."""
+    return uploads.dedup_stats(request.auth)
+
 
+@router.get("/upload-image/{uuid:job_id}", response=ImageUploadJobSchema)
+@query_budget(3)
+def get_upload_status(request, job_id: UUID):
+    """Returns the status of an image upload job, with the URL once it has succeeded."""
+    return services.get_upload_status(request.auth, job_id)
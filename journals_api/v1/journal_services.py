@@ -0,0 +1,302 @@
+"""
+Logic behind the journal endpoints, shared by `journal_api` and
+`async_journal_api`.
+
+Each function does one endpoint's work synchronously and raises `HttpError`
+for client errors. The sync views call them directly. The read endpoints
+also have ``a``-prefixed async versions built on the async ORM, which the
+async views await; the async views run the rest through ``sync_to_async``,
+except `check_covert_access`, which runs on the hasher pool because checking
+a PIN is CPU bound.
+"""
+import zipfile
+
+from django.conf import settings
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from ninja.errors import HttpError
+
+from .. import (bulk, counters, covert, etags, imports, rollups, search, shards,
+                streaks, sync, uploads)
+from ..models.journals_model import Journal
+from ..models.upload_model import ImageUploadJob
+from ..utils import update_streak_on_creation
+from .utils import (CustomPageNumberPagination, JournalProjection,
+                    create_api_response, flag_covert_rows)
+
+COVERT = "COVERT"
+
+
+def check_batch_size(size: int):
+    if size > settings.JOURNAL_BULK_MAX_ITEMS:
+        raise HttpError(400, f"A batch may contain at most {settings.JOURNAL_BULK_MAX_ITEMS} entries.")
+
+
+def covert_profile(user):
+    """The user's profile, for checking their PIN or unlock token."""
+    try:
+        return user.user_profile
+    except AttributeError:
+        raise HttpError(403, "User profile not found, cannot check PIN.")
+
+
+def check_covert_access(profile, payload):
+    """Accepts an unlock token (cheap) or falls back to checking the PIN."""
+    if payload.unlock_token:
+        if not covert.check_unlock_token(profile, payload.unlock_token):
+            raise HttpError(403, "Unlock token is invalid or has expired.")
+    elif not profile.check_pin(payload.pin):
+        raise HttpError(403, "Incorrect PIN")
+
+
+def verify_covert_access(user, payload):
+    check_covert_access(covert_profile(user), payload)
+
+
+def unlock_covert_journals(profile, pin: str):
+    """Checks ``pin`` and returns the unlock token response."""
+    if not profile.check_pin(pin):
+        raise HttpError(403, "Incorrect PIN")
+    data = {
+        "unlock_token": covert.issue_unlock_token(profile),
+        "expires_in": int(settings.COVERT_UNLOCK_TOKEN_LIFETIME.total_seconds()),
+    }
+    return create_api_response(data, message="Covert journals unlocked", status_code=200)
+
+
+def _require_pin_set(user, message: str, missing_message: str):
+    try:
+        if not user.user_profile.pin:
+            raise HttpError(403, message)
+    except AttributeError:
+        raise HttpError(403, missing_message)
+
+
+def _ordered(queryset, projection):
+    return JournalProjection().apply(queryset.order_by("-date_added", "-id"), projection)
+
+
+def _page(queryset, pagination, projection, counter):
+    response_data = CustomPageNumberPagination().paginate_queryset(
+        queryset=_ordered(queryset, projection),
+        pagination_in=pagination,
+        counter=counter,
+    )
+    flag_covert_rows(response_data["items"])
+    return response_data
+
+
+async def _apage(queryset, pagination, projection, counter):
+    response_data = await CustomPageNumberPagination().apaginate_queryset(
+        queryset=_ordered(queryset, projection),
+        pagination_in=pagination,
+        counter=counter,
+    )
+    flag_covert_rows(response_data["items"])
+    return response_data
+
+
+def _journals_filter(user, mood_tag: str = None):
+    """The non-covert journals query for ``list_journals`` and the arguments for counting it."""
+    queryset = Journal.objects.for_owner(user)
+    if mood_tag and mood_tag.upper() != COVERT:
+        return queryset.filter(mood_tag=mood_tag), {"mood_tag": mood_tag}
+    return queryset.exclude(mood_tag=COVERT), {"exclude_covert": True}
+
+
+def list_journals(user, pagination, projection, mood_tag: str = None):
+    """One page of the user's non-covert journals, optionally of one mood."""
+    queryset, count_filter = _journals_filter(user, mood_tag)
+    counter = lambda: counters.journal_count(user, **count_filter)
+    response_data = _page(queryset, pagination, projection, counter)
+    return create_api_response(response_data, message="Journals retrieved successfully", status_code=200)
+
+
+async def alist_journals(user, pagination, projection, mood_tag: str = None):
+    queryset, count_filter = _journals_filter(user, mood_tag)
+    counter = lambda: counters.ajournal_count(user, **count_filter)
+    response_data = await _apage(queryset, pagination, projection, counter)
+    return create_api_response(response_data, message="Journals retrieved successfully", status_code=200)
+
+
+def list_covert_journals(user, pagination, projection):
+    """One page of the user's covert journals. Access must already be verified."""
+    queryset = Journal.objects.for_owner(user).filter(mood_tag=COVERT)
+    counter = lambda: counters.journal_count(user, mood_tag=COVERT)
+    response_data = _page(queryset, pagination, projection, counter)
+    return create_api_response(response_data, message="Journal retrieved", status_code=200)
+
+
+async def alist_covert_journals(user, pagination, projection):
+    queryset = Journal.objects.for_owner(user).filter(mood_tag=COVERT)
+    counter = lambda: counters.ajournal_count(user, mood_tag=COVERT)
+    response_data = await _apage(queryset, pagination, projection, counter)
+    return create_api_response(response_data, message="Journal retrieved", status_code=200)
+
+
+def _journal_response(journal):
+    journal.is_covert = (journal.mood_tag == COVERT)
+    # Covert content is only returned by /reveal.
+    if journal.is_covert:
+        journal.content = None
+    return create_api_response(journal, message="Journal retrieved", status_code=200)
+
+
+def get_journal(user, journal_id: int):
+    return _journal_response(get_object_or_404(Journal.objects.for_owner(user), id=journal_id))
+
+
+async def aget_journal(user, journal_id: int):
+    return _journal_response(await aget_object_or_404(Journal.objects.for_owner(user), id=journal_id))
+
+
+def get_covert_journal(user, journal_id: int):
+    """The covert journal to reveal. Access is checked by the caller afterwards."""
+    journal = get_object_or_404(Journal.objects.for_owner(user), id=journal_id)
+    if journal.mood_tag != COVERT:
+        raise HttpError(400, "This is not a covert journal.")
+    journal.is_covert = True
+    return journal
+
+
+def create_journal(user, payload):
+    if payload.mood_tag == COVERT:
+        _require_pin_set(
+            user,
+            "A PIN must be set in your profile to create a Covert journal.",
+            "User profile not found. Cannot create a Covert journal.",
+        )
+
+    with shards.atomic(user):
+        journal = Journal.objects.for_owner(user).create(owner=user, **payload.dict())
+        counters.journal_created(user.id, journal.mood_tag)
+        rollups.journal_created(user.id, journal.date_added.date(), journal.mood_tag)
+        etags.bump_journals_version(user.id)
+        update_streak_on_creation(user)
+    journal.is_covert = (journal.mood_tag == COVERT)
+    return create_api_response(journal, message="Created", status_code=201)
+
+
+def update_journal(user, journal_id: int, payload):
+    journal = get_object_or_404(Journal.objects.for_owner(user), id=journal_id)
+    if payload.mood_tag == COVERT and journal.mood_tag != COVERT:
+        _require_pin_set(
+            user,
+            "A PIN must be set in your profile to set a journal as Covert.",
+            "User profile not found. Cannot set journal as Covert.",
+        )
+
+    old_mood_tag = journal.mood_tag
+    for attr, value in payload.dict(exclude_unset=True).items():
+        setattr(journal, attr, value)
+    # Resending the stored values writes nothing and keeps the ETag.
+    if journal.changed_fields:
+        with shards.atomic(journal.owner_id):
+            journal.save()
+            counters.journal_mood_changed(journal.owner_id, old_mood_tag, journal.mood_tag)
+            rollups.journal_mood_changed(journal.owner_id, journal.date_added.date(), old_mood_tag, journal.mood_tag)
+            etags.bump_journals_version(journal.owner_id)
+    journal.is_covert = (journal.mood_tag == COVERT)
+    return create_api_response(journal, message="Journal updated", status_code=200)
+
+
+def delete_journal(user, journal_id: int):
+    journal = get_object_or_404(Journal.objects.for_owner(user), id=journal_id)
+    with shards.atomic(journal.owner_id):
+        journal_id = journal.id
+        journal.delete()
+        counters.journal_deleted(journal.owner_id, journal.mood_tag)
+        rollups.journal_deleted(journal.owner_id, journal.date_added.date(), journal.mood_tag)
+        sync.record_deletions(journal.owner_id, [journal_id])
+        etags.bump_journals_version(journal.owner_id)
+        streaks.journals_deleted(journal.owner_id, [journal.date_added.date()])
+
+
+def sync_journals(user, since: str, limit: int):
+    data = sync.changes_since(user, since, limit)
+    return create_api_response(data, message="Changes retrieved", status_code=200)
+
+
+async def async_journals(user, since: str, limit: int):
+    data = await sync.achanges_since(user, since, limit)
+    return create_api_response(data, message="Changes retrieved", status_code=200)
+
+
+def import_journals(user, file):
+    try:
+        data = imports.import_file(user, file)
+    except zipfile.BadZipFile as exc:
+        raise HttpError(400, "The archive is not a valid ZIP file.") from exc
+    return create_api_response(data, message="Journals imported", status_code=200)
+
+
+def journal_heatmap(user, year: int):
+    data = rollups.heatmap(user, year)
+    return create_api_response(data, message="Heatmap retrieved", status_code=200)
+
+
+async def ajournal_heatmap(user, year: int):
+    data = await rollups.aheatmap(user, year)
+    return create_api_response(data, message="Heatmap retrieved", status_code=200)
+
+
+def journal_mood_distribution(user, start, end):
+    data = rollups.mood_distribution(user, start, end)
+    return create_api_response(data, message="Mood distribution retrieved", status_code=200)
+
+
+async def ajournal_mood_distribution(user, start, end):
+    data = await rollups.amood_distribution(user, start, end)
+    return create_api_response(data, message="Mood distribution retrieved", status_code=200)
+
+
+def journal_gaps(user, limit: int):
+    data = rollups.longest_gaps(user, limit)
+    return create_api_response(data, message="Gaps retrieved", status_code=200)
+
+
+async def ajournal_gaps(user, limit: int):
+    data = await rollups.alongest_gaps(user, limit)
+    return create_api_response(data, message="Gaps retrieved", status_code=200)
+
+
+def bulk_create_journals(user, items):
+    check_batch_size(len(items))
+    data = bulk.bulk_create_journals(user, items)
+    return create_api_response(data, message="Journals created", status_code=200)
+
+
+def bulk_update_journals(user, items):
+    check_batch_size(len(items))
+    data = bulk.bulk_update_journals(user, items)
+    return create_api_response(data, message="Journals updated", status_code=200)
+
+
+def bulk_delete_journals(user, ids):
+    check_batch_size(len(ids))
+    data = bulk.bulk_delete_journals(user, ids)
+    return create_api_response(data, message="Journals deleted", status_code=200)
+
+
+def search_journals(user, q: str, page: int, page_size: int):
+    page_size = min(page_size, CustomPageNumberPagination().max_page_size)
+    items, count = search.search_journals(user, q or "", offset=(page - 1) * page_size, limit=page_size)
+    return create_api_response({"items": items, "count": count}, message="Search results retrieved", status_code=200)
+
+
+async def asearch_journals(user, q: str, page: int, page_size: int):
+    page_size = min(page_size, CustomPageNumberPagination().max_page_size)
+    items, count = await search.asearch_journals(user, q or "", offset=(page - 1) * page_size, limit=page_size)
+    return create_api_response({"items": items, "count": count}, message="Search results retrieved", status_code=200)
+
+
+def upload_image(user, file) -> ImageUploadJob:
+    try:
+        return uploads.accept_upload(user, file)
+    except uploads.UploadQueueFull as exc:
+        raise HttpError(503, "Image upload service is busy, please retry shortly.") from exc
+    except OSError as exc:
+        raise HttpError(500, "An unexpected error occurred during image upload.") from exc
+
+
+def get_upload_status(user, job_id) -> ImageUploadJob:
+    return get_object_or_404(ImageUploadJob, id=job_id, owner=user)
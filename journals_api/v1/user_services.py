@@ -0,0 +1,88 @@
+"""
+Logic behind the auth endpoints, shared by `user_api` and `async_user_api`.
+
+Hashing passwords and PINs is left to the views, so the async ones can run
+it on the hasher pool; these functions take the finished hash. The async
+views call them through ``sync_to_async``.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from ninja.errors import HttpError
+from ninja_jwt.exceptions import TokenError
+
+from .. import refresh_tokens
+from ..authentication import tokens_for_user
+from ..models.user_model import UserProfile
+from ..schemas.user_schemas import UserProfileSchema
+
+
+def check_registration(username: str, email: str):
+    """Rejects taken usernames and emails before the password is hashed."""
+    if User.objects.filter(Q(username=username) | Q(email=email)).exists():
+        raise HttpError(400, "Username or email already exists.")
+
+
+def register(username: str, email: str, password_hash: str):
+    # Hash before calling this: atomic() holds SQLite's write lock
+    # (transaction_mode IMMEDIATE), and PBKDF2 would keep it for its duration.
+    try:
+        with transaction.atomic():
+            user = User.objects.create(
+                username=User.normalize_username(username),
+                email=User.objects.normalize_email(email),
+                password=password_hash,
+                is_active=True
+            )
+            profile, _ = UserProfile.objects.get_or_create(user=user)
+    except IntegrityError as exc:
+        raise HttpError(400, "Username or email already exists.") from exc
+
+    return {"id": user.id, "username": user.username, "email": user.email, "profile": profile}
+
+
+def login(user):
+    """The login response for an authenticated ``user``: their profile and a new token pair."""
+    refresh = tokens_for_user(user)
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    user_data = {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "profile": UserProfileSchema.from_orm(profile)
+    }
+    return {
+        "user": user_data,
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+    }
+
+
+def token_refresh(refresh: str):
+    try:
+        new_refresh_token = refresh_tokens.rotate(refresh)
+    except TokenError as exc:
+        raise HttpError(401, str(exc))
+    except User.DoesNotExist:
+        # This case is unlikely if the token is valid but is good for robustness.
+        raise HttpError(401, "User associated with this token not found.")
+
+    return {
+        "refresh": str(new_refresh_token),
+        "access": str(new_refresh_token.access_token),
+    }
+
+
+def get_profile(user):
+    # The user row is joined in: stateless auth leaves the username and email
+    # out of ``user``.
+    profile, _ = UserProfile.objects.select_related("user").get_or_create(user_id=user.id)
+    user = profile.user
+    return {"id": user.id, "username": user.username, "email": user.email, "profile": profile}
+
+
+def set_pin(user, pin_hash: str):
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    profile.pin = pin_hash
+    profile.save()
+    return {"message": "PIN has been set successfully."}
@@ -1,6 +1,12 @@
-from typing import Any, Optional, Dict
-from django.db.models import QuerySet
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Literal, Optional, Dict
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Length, Substr
 from ninja import Schema
+from ninja.errors import HttpError
 from ninja.pagination import PaginationBase
 from pydantic import Field
 
@@ -11,18 +17,28 @@ class CustomPageNumberPagination(PaginationBase):
     
     This class is intended to be used MANUALLY within a view, not with the
     @paginate decorator.
+
+    Two modes are supported:
+    - page mode (``page``/``page_size``): OFFSET slicing plus a COUNT.
+    - cursor mode (``cursor``): keyset pagination on ``(date_added, id)``.
+      Every page costs the same regardless of depth and no COUNT is run.
+
+    Every page carries a ``next_cursor``, so a client can start in page mode
+    and switch to cursor mode from the first page onwards.
+
+    Views that know the total without counting (see `journals_api.counters`)
+    pass it as ``counter``; it is only called in page mode.
     """
     class Input(Schema):
         page: int = Field(1, ge=1, description="Page number")
         page_size: Optional[int] = Field(5, ge=1, description="Number of items per page") # A default is good practice
+        cursor: Optional[str] = Field(None, description="Opaque cursor taken from a previous page's next_cursor")
 
-    # The __init__ can be simplified if you pass the message from the view
     def __init__(self, page_size: int = 5, max_page_size: int = 100, **kwargs: Any):
         self.page_size = page_size
         self.max_page_size = max_page_size
         super().__init__(**kwargs)
 
-    # ... (the _get_page_size method is unchanged) ...
     def _get_page_size(self, requested_page_size: Optional[int]) -> int:
         if requested_page_size is None:
             return self.page_size
@@ -32,19 +48,149 @@ class CustomPageNumberPagination(PaginationBase):
         self,
         queryset: QuerySet,
         pagination_in: Input,
-        message: str = "Operation successful",
+        counter: Optional[Callable[[], int]] = None,
     ) -> Dict[str, Any]:
-        
+        """
+        Paginate a queryset ordered by ``-date_added, -id``.
+        """
         page_size = self._get_page_size(pagination_in.page_size)
+
+        if pagination_in.cursor:
+            queryset = self._after_cursor(queryset, pagination_in.cursor)
+            # Fetch one extra row to know whether another page exists.
+            items = list(queryset[: page_size + 1])
+            return self._cursor_page(items, page_size)
+
         offset = (pagination_in.page - 1) * page_size
-        
-        paginated_data = {
-            "items": queryset[offset : offset + page_size],
-            "count": self._items_count(queryset),
+        items = list(queryset[offset : offset + page_size])
+        count = counter() if counter is not None else self._items_count(queryset)
+        return self._numbered_page(items, offset, count)
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet,
+        pagination_in: Input,
+        counter: Optional[Callable[[], Awaitable[int]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async counterpart of `paginate_queryset`.
+        """
+        page_size = self._get_page_size(pagination_in.page_size)
+
+        if pagination_in.cursor:
+            queryset = self._after_cursor(queryset, pagination_in.cursor)
+            items = [item async for item in queryset[: page_size + 1]]
+            return self._cursor_page(items, page_size)
+
+        offset = (pagination_in.page - 1) * page_size
+        items = [item async for item in queryset[offset : offset + page_size]]
+        count = await counter() if counter is not None else await queryset.acount()
+        return self._numbered_page(items, offset, count)
+
+    @staticmethod
+    def _after_cursor(queryset: QuerySet, cursor: str) -> QuerySet:
+        date_added, pk = decode_cursor(cursor)
+        return queryset.filter(
+            Q(date_added__lt=date_added) | Q(date_added=date_added, id__lt=pk)
+        )
+
+    @staticmethod
+    def _numbered_page(items: list, offset: int, count: int) -> Dict[str, Any]:
+        has_next = offset + len(items) < count
+        return {
+            "items": items,
+            "count": count,
+            "next_cursor": encode_cursor(items[-1]) if has_next and items else None,
         }
 
-        return paginated_data
-    
+    @staticmethod
+    def _cursor_page(items: list, page_size: int) -> Dict[str, Any]:
+        has_next = len(items) > page_size
+        items = items[:page_size]
+        return {
+            "items": items,
+            "count": None,
+            "next_cursor": encode_cursor(items[-1]) if has_next else None,
+        }
+
+
+def encode_cursor(journal) -> str:
+    """Builds an opaque cursor pointing just after the given journal (instance or ``.values()`` row)."""
+    if isinstance(journal, dict):
+        date_added, pk = journal["date_added"], journal["id"]
+    else:
+        date_added, pk = journal.date_added, journal.id
+    raw = f"{date_added.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Decodes a cursor built by `encode_cursor` into ``(date_added, id)``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_added, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(date_added), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HttpError(400, "Invalid pagination cursor.") from exc
+
+
+
+# Columns of JournalOutSchema, for list endpoints that read rows with .values().
+JOURNAL_LIST_FIELDS = ("id", "title", "content", "date_added", "mood_tag")
+
+
+class JournalProjection:
+    """
+    Field projection for journal listings.
+
+    ``view=summary`` swaps ``content`` for a database-computed ``excerpt``
+    (the first ``JOURNAL_EXCERPT_LENGTH`` characters) and ``content_length``,
+    so the content column never leaves the database. ``fields=`` picks
+    columns explicitly. ``id``, ``date_added``, ``mood_tag`` and
+    ``is_covert`` are always returned; pagination and covert handling need
+    them.
+    """
+    class Input(Schema):
+        fields: Optional[str] = Field(None, description="Comma separated fields to return, e.g. title,excerpt")
+        view: Literal["full", "summary"] = Field("full", description="summary returns an excerpt instead of content")
+
+    ALWAYS = ("id", "date_added", "mood_tag", "is_covert")
+    SUMMARY = ("title", "excerpt", "content_length")
+    SELECTABLE = frozenset(JOURNAL_LIST_FIELDS + ("is_covert", "excerpt", "content_length"))
+
+    def apply(self, queryset: QuerySet, projection_in: Input) -> QuerySet:
+        """Returns ``queryset.values(...)`` with the selected columns."""
+        if projection_in.fields:
+            requested = {name.strip() for name in projection_in.fields.split(",") if name.strip()}
+            unknown = requested - self.SELECTABLE
+            if unknown:
+                raise HttpError(
+                    400,
+                    f"Unknown fields: {', '.join(sorted(unknown))}. "
+                    f"Choose from: {', '.join(sorted(self.SELECTABLE))}.",
+                )
+        elif projection_in.view == "summary":
+            requested = set(self.SUMMARY)
+        else:
+            return queryset.values(*JOURNAL_LIST_FIELDS)
+
+        annotations = {}
+        if "excerpt" in requested:
+            annotations["excerpt"] = Substr("content", 1, settings.JOURNAL_EXCERPT_LENGTH)
+        if "content_length" in requested:
+            annotations["content_length"] = Length("content")
+        columns = [name for name in JOURNAL_LIST_FIELDS if name in requested or name in self.ALWAYS]
+        return queryset.values(*columns, **annotations)
+
+
+def flag_covert_rows(rows):
+    """Sets ``is_covert`` on ``.values()`` rows, in place."""
+    for row in rows:
+        row["is_covert"] = (row["mood_tag"] == "COVERT")
+    return rows
+
+
 def create_api_response(data, message="Request was successfully", status_code=200):
     """
     Creates a consistent API response dictionary.
@@ -62,4 +208,4 @@ def create_api_response(data, message="Request was successfully", status_code=20
         "status": "success" if 200 <= status_code < 300 else "error",
         "message": message,
         "data": data,
-    }
\ No newline at end of file
+    }
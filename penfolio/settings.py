@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -36,6 +37,53 @@ NINJA_JWT = {
     'UPDATE_LAST_LOGIN': False,
 }
 
+# Authenticated users (with their profile) are cached by journals_api.authentication.
+# Use a shared cache backend when running several worker processes, otherwise
+# a change made through one worker reaches the others only after the TTL.
+AUTH_USER_CACHE_ALIAS = 'default'
+
+# Seconds a cached user stays valid.
+AUTH_USER_CACHE_TTL = 60
+
+# Trust the token's user id and skip the user lookup entirely. Deactivating a
+# user then only takes effect once their access token expires.
+AUTH_USER_CACHE_STATELESS = False
+
+# How long a covert unlock token (journals_api.covert) stays valid.
+COVERT_UNLOCK_TOKEN_LIFETIME = timedelta(minutes=10)
+
+# Largest number of entries accepted by the bulk journal endpoints.
+JOURNAL_BULK_MAX_ITEMS = 500
+
+# Characters of content returned as the excerpt by summary listings.
+JOURNAL_EXCERPT_LENGTH = 200
+
+# Deleted journals are reported to delta sync clients for this long; older
+# sync tokens must run a full sync.
+JOURNAL_TOMBSTONE_RETENTION = timedelta(days=30)
+
+# How far the last page's sync token is set back so changes committed while
+# a sync was running aren't missed.
+JOURNAL_SYNC_OVERLAP = timedelta(seconds=5)
+
+# Rows fetched per database round trip by the streaming export.
+JOURNAL_EXPORT_CHUNK_SIZE = 500
+
+# Entries inserted per transaction by journal imports, and how many rejected
+# records an import reports in detail.
+JOURNAL_IMPORT_BATCH_SIZE = 500
+JOURNAL_IMPORT_MAX_ERRORS = 1000
+
+# Recently blacklisted refresh token ids kept in memory per process, so
+# replayed tokens are rejected without a query (journals_api.refresh_tokens).
+TOKEN_BLACKLIST_CACHE_SIZE = 10_000
+
+# Query accounting (journals_api.query_budget): send X-Query-Count and
+# Server-Timing headers, and raise instead of logging when an operation runs
+# more queries than its declared budget.
+QUERY_BUDGET_HEADERS = DEBUG
+QUERY_BUDGET_STRICT = False
+
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -75,6 +123,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "journals_api.query_budget.QueryBudgetMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -105,6 +154,16 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'penfolio.wsgi.application'
 
+ASGI_APPLICATION = 'penfolio.asgi.application'
+
+# Dotted path to the renderer used by the API. ORJSONRenderer renders the same
+# JSON as ninja.renderers.JSONRenderer, faster; it needs the optional orjson
+# package and otherwise falls back to JSONRenderer.
+API_RENDERER = 'journals_api.renderers.ORJSONRenderer'
+
+# Size of the thread pool the async views use for PBKDF2 password/PIN checks.
+PASSWORD_HASHER_WORKERS = 4
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -113,6 +172,63 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # atomic() takes SQLite's write lock up front, so concurrent writers
+        # wait (the busy timeout) instead of failing with
+        # "database is locked" when a read turns into a write.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    }
+}
+
+# Aliases in DATABASES that are read replicas of 'default', e.g.
+#     DATABASES['replica'] = {'ENGINE': ..., 'NAME': ...}
+#     DATABASE_REPLICAS = ['replica']
+# Operations marked with journals_api.replicas.replica_reads read from one of
+# them; everything else uses 'default'.
+DATABASE_ROUTERS = ['journals_api.shards.ShardRouter', 'journals_api.replicas.ReplicaRouter']
+DATABASE_REPLICAS = []
+
+# After a user writes, their reads stay on 'default' for this many seconds,
+# so they see their own changes while the replicas catch up. Keep it above
+# the usual replication lag.
+DATABASE_REPLICA_STICKY_SECONDS = 5
+
+# Cache holding those pins; use a shared backend with several worker processes.
+DATABASE_REPLICA_CACHE_ALIAS = 'default'
+
+# Per-user response cache for the profile and journal list endpoints
+# (journals_api.response_cache): seconds an entry lives, and the cache it is
+# kept in. Use a shared backend with several worker processes. 0 turns it off.
+RESPONSE_CACHE_TTL = 300
+RESPONSE_CACHE_ALIAS = 'default'
+
+# Aliases in DATABASES that hold users' journals (journals_api.shards). New
+# users are spread over them by id; `manage.py rebalance_journal_shards` moves
+# existing users to match. Empty keeps every journal on 'default'. Only ever
+# append: a shard's position picks the range its journal ids come from.
+JOURNAL_SHARDS = []
+
+# Applied to every new SQLite connection by journals_api.sqlite_tuning when
+# SQLITE_TUNING is on. It is off here because journal_mode is stored in the
+# database file: tuning would switch the tracked development db.sqlite3 to
+# WAL. Turn it on in deployments. Set SQLITE_PRAGMAS to {} to keep SQLite's
+# defaults.
+SQLITE_TUNING = False
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB, i.e. 64 MiB per connection
+    'busy_timeout': 5000,  # ms
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -153,6 +269,42 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = '/media/'
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Background image uploads (journals_api.uploads)
+
+# Dotted path to the upload backend. Use
+# 'journals_api.uploads.LocalFileSystemBackend' to keep files under MEDIA_ROOT.
+IMAGE_UPLOAD_BACKEND = 'journals_api.uploads.CloudinaryBackend'
+
+IMAGE_UPLOAD_SPOOL_DIR = Path(tempfile.gettempdir()) / 'penfolio-upload-spool'
+
+IMAGE_UPLOAD_WORKERS = 4
+
+# Jobs allowed to wait for a worker before uploads are rejected with 503.
+IMAGE_UPLOAD_QUEUE_SIZE = 100
+
+IMAGE_UPLOAD_MAX_ATTEMPTS = 4
+
+# Seconds before the first retry; doubles on every further attempt.
+IMAGE_UPLOAD_RETRY_BACKOFF = 1.0
+
+# Process jobs inline (on commit) instead of on the worker pool.
+IMAGE_UPLOAD_EAGER = False
+
+# Reuse the URL of identical (same SHA-256) uploads: 'user' shares it only
+# between one user's uploads, 'global' across all users, None disables it.
+IMAGE_DEDUP_SCOPE = 'user'
+
+# Cache entries kept per scope; the least recently used are evicted first.
+IMAGE_DEDUP_MAX_ENTRIES = 500
+
+# Entries unused for this long are treated as misses (None keeps them forever).
+IMAGE_DEDUP_TTL = timedelta(days=90)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,21 +14,44 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
+from django.utils.module_loading import import_string
 from ninja import NinjaAPI
 from journals_api.v1.journal_api import router as journals_router
+from journals_api.v1.async_journal_api import router as async_journals_router
 from journals_api.v1.base import router as base_router
 from journals_api.v1.user_api import router as users_router
+from journals_api.v1.async_user_api import router as async_users_router
+from journals_api.query_budget import track_operation
+from journals_api.replicas import route_database
 
-api = NinjaAPI(title="MyJournal API")
+api = NinjaAPI(title="MyJournal API", renderer=import_string(settings.API_RENDERER)())
+api.add_decorator(track_operation, mode="view")
+api.add_decorator(route_database, mode="view")
 
 api.add_router("/", base_router, tags=["Home"])
 api.add_router("/journals/", journals_router, tags=["Journals"])
 api.add_router("/auth/", users_router, tags=["Users & Auth"])
 
+# Same endpoints, served by async views. Run under ASGI (penfolio.asgi) to
+# get the benefit; under WSGI they still work but each request gets its own
+# event loop.
+async_api = NinjaAPI(
+    title="MyJournal API (async)",
+    urls_namespace="async-api",
+    renderer=import_string(settings.API_RENDERER)(),
+)
+async_api.add_decorator(track_operation, mode="view")
+async_api.add_decorator(route_database, mode="view")
+
+async_api.add_router("/journals/", async_journals_router, tags=["Journals"])
+async_api.add_router("/auth/", async_users_router, tags=["Users & Auth"])
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/async/", async_api.urls),
     path("api/", api.urls),
 ]
 